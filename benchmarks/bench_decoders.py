@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+# Microbenchmarks and golden-fixture checks for the pure decoding helpers.
+#
+# Every benchmark first checks its output against the golden fixtures in
+# benchmarks/fixtures, so a faster decoder can't silently change results for any MoCA
+# version. Timings are compared against benchmarks/baseline.json.
+#
+#   python benchmarks/bench_decoders.py            # check, time, compare with the baseline
+#   python benchmarks/bench_decoders.py --check    # golden checks only
+#   python benchmarks/bench_decoders.py --record   # check, time and save a new baseline
+#
+# The fixtures are moca11 (three MoCA 1.1 nodes), moca20 (MoCA 2.0 including the 50 MHz
+# rate path), moca25 (four MoCA 2.5 nodes on a sparse node bitmask) and mixed (2.5 NC
+# with 2.0 and 1.1 nodes), plus helpers.json with edge cases for the small helpers.
+
+import os
+import sys
+import json
+import timeit
+import argparse
+import platform
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+NETWORK_FIXTURES = ['moca11', 'moca20', 'moca25', 'mixed']
+
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from gocoax.decode import byte2ascii, hex2mac, soc_version_string, counter64, decode_device_info, calculate_phy_rates
+
+# Function to load a fixture file
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, f"{name}.json"), 'r') as f:
+        return json.load(f)
+
+# Function to turn a fixture's per-node dicts into the lists calculate_phy_rates() takes
+def phy_inputs(fixture):
+    phy = fixture['phy']
+    net_info = [phy['net_info'].get(str(node_id)) for node_id in range(16)]
+    fmr_info = [phy['fmr_info'].get(str(node_id)) for node_id in range(16)]
+    return phy['local_info'], net_info, fmr_info
+
+# Function to compare a result with its golden value, recording any mismatch
+def expect(failures, label, actual, expected):
+    if actual != expected:
+        failures.append(f"{label}: expected {expected!r}, got {actual!r}")
+
+# Function to check every decoder against the golden fixtures; returns a list of failures
+def check_golden(helpers, networks):
+    failures = []
+    for hex_str, expected in helpers['byte2ascii']:
+        expect(failures, f"byte2ascii({hex_str!r})", byte2ascii(hex_str), expected)
+    for hi, lo, expected in helpers['hex2mac']:
+        expect(failures, f"hex2mac({hi:#x}, {lo:#x})", hex2mac(hi, lo), expected)
+    for words, index, expected in helpers['counter64']:
+        expect(failures, f"counter64({words!r}, {index})", counter64(words, index), expected)
+
+    for name, fixture in networks.items():
+        expected = fixture['expected']
+        device_status = decode_device_info(fixture['device_info'])
+        expect(failures, f"{name}: decode_device_info", device_status, expected['device_status'])
+        soc_version = expected['device_status']['soc_version'].split('.', 1)[1]
+        expect(failures, f"{name}: soc_version_string", soc_version_string(fixture['device_info']['localInfo']), soc_version)
+        phy_rates = calculate_phy_rates(*phy_inputs(fixture))
+        expect(failures, f"{name}: calculate_phy_rates", phy_rates, expected['phy_rates'])
+    return failures
+
+# Function to build the benchmarks: name -> (callable, calls per run)
+def build_benchmarks(helpers, networks):
+    soc_words = [hex_str for hex_str, _ in helpers['byte2ascii']]
+    macs = [(hi, lo) for hi, lo, _ in helpers['hex2mac']]
+    frame_info = networks['moca25']['device_info']['frameInfo']
+    counter_indexes = [12, 30, 48, 66, 84, 102]
+
+    benchmarks = {
+        'byte2ascii': (lambda: [byte2ascii(word) for word in soc_words], len(soc_words)),
+        'hex2mac': (lambda: [hex2mac(hi, lo) for hi, lo in macs], len(macs)),
+        'counter64': (lambda: [counter64(frame_info, index) for index in counter_indexes], len(counter_indexes)),
+    }
+    for name, fixture in networks.items():
+        local_info = fixture['device_info']['localInfo']
+        device_info = fixture['device_info']
+        inputs = phy_inputs(fixture)
+        benchmarks[f"soc_version_string[{name}]"] = (lambda local_info=local_info: soc_version_string(local_info), 1)
+        benchmarks[f"decode_device_info[{name}]"] = (lambda device_info=device_info: decode_device_info(device_info), 1)
+        benchmarks[f"calculate_phy_rates[{name}]"] = (lambda inputs=inputs: calculate_phy_rates(*inputs), 1)
+    return benchmarks
+
+# Function to time a benchmark; returns the best time per call in microseconds
+def time_benchmark(func, calls, repeat=5):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number / calls * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark and check the MoCA decoding helpers.')
+    parser.add_argument('--check', action='store_true', help='Only run the golden fixture checks')
+    parser.add_argument('--record', action='store_true', help='Save the timings as the new baseline')
+    parser.add_argument('--filter', '-k', type=str, help='Only run benchmarks whose name contains this string')
+    args = parser.parse_args()
+
+    helpers = load_fixture('helpers')
+    networks = {name: load_fixture(name) for name in NETWORK_FIXTURES}
+
+    failures = check_golden(helpers, networks)
+    if failures:
+        print("Golden fixture check FAILED:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("Golden fixture check passed.")
+    if args.check:
+        sys.exit(0)
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH) and not args.record:
+        with open(BASELINE_PATH, 'r') as f:
+            baseline = json.load(f).get('results', {})
+
+    results = {}
+    print(f"\n{'Benchmark':<40}{'us/call':>10}{'baseline':>10}{'change':>9}")
+    for name, (func, calls) in build_benchmarks(helpers, networks).items():
+        if args.filter and args.filter not in name:
+            continue
+        us = time_benchmark(func, calls)
+        results[name] = round(us, 3)
+        if name in baseline:
+            change = f"{(us / baseline[name] - 1) * 100:+.1f}%"
+            print(f"{name:<40}{us:>10.3f}{baseline[name]:>10.3f}{change:>9}")
+        else:
+            print(f"{name:<40}{us:>10.3f}{'-':>10}{'-':>9}")
+
+    if args.record:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            }, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline saved to {BASELINE_PATH}")
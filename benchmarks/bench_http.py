@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+# Per-request overhead of the HTTP engines (see gocoax/httpengine.py).
+#
+# Serves the moca25 fixture from a local keep-alive HTTP server in a separate process,
+# checks that both engines fetch the same data, then times single localInfo POSTs and
+# whole polls (status and PHY rates) through a GoCoaxClient with each engine. The CPU
+# time is the polling thread's own, so it shows the client-side cost per request
+# without the server's; the wall time includes the loopback round trip.
+#
+#   python benchmarks/bench_http.py                  # 2000 requests and 200 polls per engine
+#   python benchmarks/bench_http.py --requests 10000 --polls 0
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_PATH = os.path.join(BENCH_DIR, 'fixtures', 'moca25.json')
+
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+from gocoax.api import endpoints, post_endpoint, retrieve_device_info, get_phy_rates
+from gocoax.client import GoCoaxClient, ENGINES
+from gocoax.ratelimit import RequestLimiter
+
+# Function to map the fixture onto the adapter's endpoint paths: path -> data, with the
+# fmrInfo responses keyed by node mask
+def fixture_responses(fixture):
+    device_info = fixture['device_info']
+    responses = {endpoints['ChipID' if name == 'chipId' else name]: data for name, data in device_info.items()}
+    responses[endpoints['localInfo']] = fixture['phy']['local_info']
+    net_info = {int(node_id): data for node_id, data in fixture['phy']['net_info'].items()}
+    fmr_info = {1 << int(node_id): data for node_id, data in fixture['phy']['fmr_info'].items()}
+    return responses, net_info, fmr_info
+
+# Function to build the request handler of a stand-in adapter serving the fixture, with
+# HTTP/1.1 keep-alive
+def adapter_handler():
+    with open(FIXTURE_PATH, 'r') as f:
+        responses, net_info, fmr_info = fixture_responses(json.load(f))
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True   # headers and body are written separately
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Set-Cookie', 'csrf_token=bench; Path=/')
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def do_POST(self):
+            args = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}').get('data', [])
+            if self.path == endpoints['netInfo']:
+                data = net_info[args[0]]
+            elif self.path == endpoints['fmrInfo']:
+                data = fmr_info[args[0]]
+            else:
+                data = responses.get(self.path, [])
+            body = json.dumps({'data': data}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+# Function to run the stand-in adapter until the process is terminated
+def serve(port_queue):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), adapter_handler())
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+# Function to build a client for the stand-in with an unlimited request rate
+def make_client(port, engine):
+    return GoCoaxClient(f'127.0.0.1:{port}', 'admin', 'bench', limiter=RequestLimiter(rate=0), engine=engine)
+
+# Function to fetch everything a poll fetches
+def full_poll(client):
+    device_info = retrieve_device_info(client.session, client.base_url)
+    phy_rates = get_phy_rates(client.session, client.base_url)
+    return device_info, phy_rates
+
+# Function to run fn 'count' times; returns (CPU, wall) microseconds per call
+def measure(fn, count):
+    cpu, wall = time.thread_time(), time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.thread_time() - cpu) / count * 1e6, (time.perf_counter() - wall) / count * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the per-request overhead of the HTTP engines.')
+    parser.add_argument('--requests', type=int, default=2000, help='localInfo requests per engine (default: 2000)')
+    parser.add_argument('--polls', type=int, default=200, help='Whole polls per engine (default: 200)')
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(port_queue,), daemon=True)
+    server.start()
+    try:
+        port = port_queue.get(timeout=10)
+        clients = {engine: make_client(port, engine) for engine in ENGINES}
+
+        # Both engines have to see the same data before their timings mean anything
+        polls = {engine: full_poll(client) for engine, client in clients.items()}
+        if len({json.dumps(poll, sort_keys=True) for poll in polls.values()}) != 1:
+            print("The engines fetched different data.")
+            sys.exit(1)
+        print("Both engines fetched the same data.")
+
+        results = {}
+        print(f"\n{'Benchmark':<28}{'CPU us':>10}{'wall us':>10}{'CPU vs requests':>17}")
+        for label, count, fn in (
+            ('localInfo POST', args.requests, lambda client: post_endpoint(client.session, client.base_url, 'localInfo')),
+            ('full poll', args.polls, full_poll),
+        ):
+            if count <= 0:
+                continue
+            for engine, client in clients.items():
+                for _ in range(min(count, 50)):
+                    fn(client)   # warm up
+                cpu, wall = measure(lambda: fn(client), count)
+                results[(label, engine)] = cpu
+                ratio = f"{cpu / results[(label, 'requests')]:.2f}x"
+                print(f"{label + ' [' + engine + ']':<28}{cpu:>10.1f}{wall:>10.1f}{ratio:>17}")
+
+        for client in clients.values():
+            client.close()
+    finally:
+        server.terminate()
+        server.join()
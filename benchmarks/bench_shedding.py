@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+# Load shedding on cron runs (see gocoax/scheduler.py).
+#
+# A cron run is a new process whose scheduler only knows what the state file carried over
+# from the previous run. This starts slow stand-in adapters (the moca25 fixture of
+# bench_http.py, with a delay before every response) and runs py_gocoax_stats.py the way
+# cron does, once per run, with a cron interval too short for all hosts:
+#
+#   - one run without load shedding, for comparison
+#   - a cold run with load shedding and no state file, which has only the default cost
+#     estimates to go by
+#   - --runs more runs, each starting from the state the previous one saved
+#
+# Each run's cycle duration, overrun, shed polls and deferred PHY sweeps are taken from
+# the cycle metrics the collector publishes to the MQTT stand-in of soak.py. The check
+# fails, with exit status 1, if the cold run shed and deferred nothing or a run after it
+# overran its interval.
+#
+#   python benchmarks/bench_shedding.py                       # 8 hosts, 1 s interval
+#   python benchmarks/bench_shedding.py --hosts 40 --interval 5 --runs 5
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTOR_PATH = os.path.join(os.path.dirname(BENCH_DIR), 'py_gocoax_stats.py')
+
+sys.path.insert(0, BENCH_DIR)
+from bench_http import adapter_handler
+from soak import BrokerStandin, BASE_TOPIC
+
+# Function to start 'count' stand-in adapters that answer every POST after 'delay'
+# seconds; returns their host:port addresses
+def start_slow_adapters(count, delay):
+    class SlowHandler(adapter_handler()):
+        def do_POST(self):
+            time.sleep(delay)
+            super().do_POST()
+
+    hosts = []
+    for _ in range(count):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        hosts.append(f"127.0.0.1:{server.server_address[1]}")
+    return hosts
+
+# Function to run the collector once, like cron does; returns its last cycle metrics
+def cron_run(hosts, broker, interval, extra_args):
+    broker.cycle.clear()
+    command = [sys.executable, COLLECTOR_PATH, '--username', 'admin', '--password', 'bench', '--hosts', ','.join(hosts),
+               '--output', 'none', '--request-rate', '0', '--cron-interval', str(interval),
+               '--mqtt-host', '127.0.0.1', '--mqtt-port', str(broker.port), '--mqtt-base-topic', BASE_TOPIC]
+    completed = subprocess.run(command + extra_args, capture_output=True, text=True, timeout=300)
+    if completed.returncode != 0:
+        print(completed.stdout + completed.stderr)
+        sys.exit(f"The collector exited with status {completed.returncode}.")
+    # The last messages may still be on their way from the collector's network thread
+    deadline = time.monotonic() + 2
+    while 'deferred_total' not in broker.cycle and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return dict(broker.cycle)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that cron runs shed load from their first run on.')
+    parser.add_argument('--hosts', type=int, default=8, help='Stand-in adapters (default: 8)')
+    parser.add_argument('--interval', type=float, default=1.0, help='Cron interval in seconds (default: 1)')
+    parser.add_argument('--delay', type=float, default=0.02, help='Seconds each adapter takes per request (default: 0.02)')
+    parser.add_argument('--runs', type=int, default=3, help='Runs after the cold one (default: 3)')
+    args = parser.parse_args()
+
+    hosts = start_slow_adapters(args.hosts, args.delay)
+    broker = BrokerStandin()
+    failures = []
+    with tempfile.TemporaryDirectory(prefix='moca-shedding-') as work_dir:
+        state_path = os.path.join(work_dir, 'load_shedding_state.json')
+        shedding_args = ['--load-shedding', '--load-shedding-state-file', state_path]
+
+        print(f"{args.hosts} hosts taking {args.delay * 1000:.0f} ms per request, cron interval {args.interval}s\n")
+        print(f"{'Run':<22}{'duration s':>12}{'overrun':>9}{'polls':>7}{'shed':>6}{'deferred':>10}")
+        for index, (label, extra_args) in enumerate([('no load shedding', [])]
+                                                    + [('cold', shedding_args)]
+                                                    + [(f"warm {run}", shedding_args) for run in range(1, args.runs + 1)]):
+            metrics = cron_run(hosts, broker, args.interval, extra_args)
+            if 'duration' not in metrics:
+                sys.exit(f"No cycle metrics arrived from the {label} run.")
+            print(f"{label:<22}{float(metrics['duration']):>12.3f}{metrics['overrun']:>9}{metrics['hosts']:>7}"
+                  f"{metrics['shed']:>6}{metrics['deferred']:>10}")
+            if label == 'cold' and int(metrics['shed']) + int(metrics['deferred']) == 0:
+                failures.append("The cold run shed and deferred nothing.")
+            if label.startswith('warm') and int(metrics['overrun']):
+                failures.append(f"The {label} run overran its interval.")
+    broker.close()
+
+    print()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("PASS")
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+
+# Soak test for a resident collector.
+#
+# Cron starts a fresh process every minute, which hides slow leaks; a resident collector
+# (POLL_INTERVAL / --interval) runs for weeks. This runs one for hours at an accelerated
+# poll rate against local stand-ins and fails if its resource use keeps growing:
+#
+#   - stand-in adapters serve the moca25 fixture (see bench_http.py), one local HTTP
+#     server per host, and a minimal MQTT broker takes the collector's messages and
+#     records its cycle durations; both run in this process
+#   - the collector is py_gocoax_stats.py in a child process, polling the adapters listed
+#     in an inventory file; with --churn, one host is swapped for another every so often,
+#     so the per-host state is created and dropped as well
+#   - with --broker-drops, the broker drops its connections every so often, so the client
+#     has to reconnect (and, with --mqtt-spool-dir, spool and replay)
+#   - every --sample-interval, the collector's RSS, open file descriptors and threads are
+#     read from /proc (Linux only), along with the mean duration of the cycles it
+#     published since the previous sample
+#
+# Samples taken during the warm-up are shown but not judged. After it, each metric's
+# median over the last third of the samples is compared with its median over the first
+# third: a metric fails when it grew by more than its tolerance and its least-squares
+# slope is positive. The run also fails if the collector dies or stops completing cycles.
+#
+#   python benchmarks/soak.py                                # 2 hours, 20 hosts, 1 s interval
+#   python benchmarks/soak.py --duration 10m --warmup 2m --hosts 5
+#   python benchmarks/soak.py --duration 4h --churn 60 --broker-drops 600 -- --http-engine keepalive
+#
+# Arguments after '--' are passed on to py_gocoax_stats.py.
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import socketserver
+from http.server import ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+COLLECTOR_PATH = os.path.join(ROOT_DIR, 'py_gocoax_stats.py')
+
+sys.path.insert(0, ROOT_DIR)
+from bench_http import adapter_handler
+
+BASE_TOPIC = 'soak'
+
+# metric -> (relative, absolute) growth allowed from the first to the last third
+TOLERANCES = {
+    'rss_mb': (0.05, 2.0),
+    'fds': (0.0, 2),
+    'threads': (0.0, 1),
+    'cycle_s': (0.25, 0.005),
+}
+
+# Function to parse a duration like '90', '10m' or '2h' into seconds
+def parse_duration(value):
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+# Minimal MQTT 3.1.1 broker: accepts connections and subscriptions, takes QoS 0 and 1
+# publishes and forwards nothing. It keeps count of the messages and the durations the
+# collector published to <base>/collector/cycle/duration, and the latest value of every
+# cycle metric in 'cycle'.
+class BrokerStandin:
+    def __init__(self):
+        self.messages = 0
+        self.connects = 0
+        self.cycle = {}
+        self._durations = []
+        self._lock = threading.Lock()
+        self._connections = set()
+        broker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                broker._serve(self.request)
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _serve(self, sock):
+        stream = sock.makefile('rb')
+        with self._lock:
+            self._connections.add(sock)
+        try:
+            while True:
+                header = stream.read(1)
+                if not header:
+                    return
+                length, shift = 0, 0
+                while True:
+                    byte = stream.read(1)
+                    if not byte:
+                        return
+                    length |= (byte[0] & 0x7F) << shift
+                    shift += 7
+                    if not byte[0] & 0x80:
+                        break
+                body = stream.read(length)
+                kind = header[0] >> 4
+                if kind == 1:      # CONNECT
+                    sock.sendall(b'\x20\x02\x00\x00')
+                    with self._lock:
+                        self.connects += 1
+                elif kind == 3:    # PUBLISH
+                    qos = (header[0] >> 1) & 3
+                    topic_end = 2 + int.from_bytes(body[:2], 'big')
+                    topic = body[2:topic_end].decode('utf-8')
+                    payload = body[topic_end + (2 if qos else 0):]
+                    if qos == 1:
+                        sock.sendall(b'\x40\x02' + body[topic_end:topic_end + 2])
+                    self._received(topic, payload)
+                elif kind == 8:    # SUBSCRIBE: grant QoS 0 for every topic filter
+                    granted, offset = b'', 2
+                    while offset < len(body):
+                        offset += 2 + int.from_bytes(body[offset:offset + 2], 'big') + 1
+                        granted += b'\x00'
+                    sock.sendall(bytes([0x90, 2 + len(granted)]) + body[:2] + granted)
+                elif kind == 12:   # PINGREQ
+                    sock.sendall(b'\xd0\x00')
+                elif kind == 14:   # DISCONNECT
+                    return
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._connections.discard(sock)
+            stream.close()
+
+    def _received(self, topic, payload):
+        with self._lock:
+            self.messages += 1
+            if topic == f"{BASE_TOPIC}/collector/cycle/duration":
+                self._durations.append(float(payload))
+            if topic.startswith(f"{BASE_TOPIC}/collector/cycle/"):
+                self.cycle[topic.rsplit('/', 1)[1]] = payload.decode('utf-8')
+
+    # Function to return the cycle durations received since the last call
+    def take_durations(self):
+        with self._lock:
+            durations, self._durations = self._durations, []
+        return durations
+
+    # Drop every client connection
+    def drop(self):
+        with self._lock:
+            connections = list(self._connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+# Function to start 'count' stand-in adapters; returns their host:port addresses
+def start_adapters(count):
+    handler = adapter_handler()
+    hosts = []
+    for _ in range(count):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        hosts.append(f"127.0.0.1:{server.server_address[1]}")
+    return hosts
+
+# Function to write the inventory the collector polls; replaced atomically so it never
+# reads half a file
+def write_inventory(path, hosts):
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'hosts': [{'host': host} for host in hosts]}, f)
+    os.replace(path + '.tmp', path)
+
+# Function to read a process's RSS (MB), open file descriptors and threads from /proc
+def process_stats(pid):
+    with open(f'/proc/{pid}/status', 'r') as f:
+        status = dict(line.split(':', 1) for line in f if ':' in line)
+    rss_mb = int(status['VmRSS'].split()[0]) / 1024
+    return rss_mb, len(os.listdir(f'/proc/{pid}/fd')), int(status['Threads'])
+
+# Function to judge one metric's samples; None if there are too few
+def judge(points, relative, absolute):
+    if len(points) < 6:
+        return None
+    third = len(points) // 3
+    first = statistics.median(value for _, value in points[:third])
+    last = statistics.median(value for _, value in points[-third:])
+    mean_t = statistics.fmean(t for t, _ in points)
+    mean_v = statistics.fmean(value for _, value in points)
+    spread = sum((t - mean_t) ** 2 for t, _ in points)
+    slope = sum((t - mean_t) * (value - mean_v) for t, value in points) / spread if spread else 0.0
+    limit = max(relative * first, absolute)
+    return {'first': first, 'last': last, 'per_hour': slope * 3600, 'limit': limit,
+            'failed': slope > 0 and last - first > limit}
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    collector_args = []
+    if '--' in argv:
+        collector_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+
+    parser = argparse.ArgumentParser(description='Soak-test a resident collector against local stand-ins.')
+    parser.add_argument('--duration', type=str, default='2h', help='How long to run, e.g. 90s, 30m, 4h (default: 2h)')
+    parser.add_argument('--warmup', type=str, default='5m', help='Samples not judged at the start (default: 5m)')
+    parser.add_argument('--hosts', type=int, default=20, help='Stand-in adapters polled at a time (default: 20)')
+    parser.add_argument('--interval', type=float, default=1.0, help="The collector's poll interval in seconds (default: 1)")
+    parser.add_argument('--sample-interval', type=str, default='30s', help='Time between samples (default: 30s)')
+    parser.add_argument('--churn', type=str, default='0', help='Swap one host for another this often, 0 for never (default: 0)')
+    parser.add_argument('--broker-drops', type=str, default='0', help='Drop the broker connections this often, 0 for never (default: 0)')
+    parser.add_argument('--csv', type=str, help='Also write the samples to this CSV file')
+    args = parser.parse_args(argv)
+
+    duration = parse_duration(args.duration)
+    warmup = parse_duration(args.warmup)
+    sample_interval = parse_duration(args.sample_interval)
+    churn = parse_duration(args.churn)
+    drops = parse_duration(args.broker_drops)
+    if warmup >= duration:
+        parser.error("--warmup must be shorter than --duration")
+    if not os.path.isdir('/proc/self/fd'):
+        print("The soak test reads the collector's resource use from /proc and needs Linux.")
+        sys.exit(2)
+
+    work_dir = tempfile.mkdtemp(prefix='moca-soak-')
+    inventory_path = os.path.join(work_dir, 'inventory.json')
+    log_path = os.path.join(work_dir, 'collector.log')
+    broker = BrokerStandin()
+    # With churn, a few spare adapters take turns in the inventory
+    adapters = start_adapters(args.hosts + (max(2, args.hosts // 4) if churn else 0))
+    polled = adapters[:args.hosts]
+    spare = adapters[args.hosts:]
+    write_inventory(inventory_path, polled)
+
+    command = [sys.executable, COLLECTOR_PATH, '--inventory', inventory_path, '--username', 'admin',
+               '--password', 'soak', '--interval', str(args.interval), '--output', 'none',
+               '--mqtt-host', '127.0.0.1', '--mqtt-port', str(broker.port), '--mqtt-base-topic', BASE_TOPIC,
+               *collector_args]
+    log_file = open(log_path, 'w')
+    collector = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT, cwd=ROOT_DIR)
+    print(f"Soaking pid {collector.pid} for {args.duration}: {args.hosts} hosts every {args.interval}s, "
+          f"warm-up {args.warmup}; the end of its log is shown if the test fails")
+
+    csv_file = None
+    if args.csv:
+        csv_file = open(args.csv, 'w')
+        csv_file.write('elapsed,rss_mb,fds,threads,cycles,cycle_s,messages\n')
+    print(f"\n{'elapsed s':>10}{'RSS MB':>10}{'fds':>6}{'threads':>9}{'cycles':>8}{'cycle s':>10}{'messages':>10}")
+
+    samples = []
+    failures = []
+    start = time.monotonic()
+    next_sample, next_churn, next_drop = start + sample_interval, start + churn, start + drops
+    try:
+        while True:
+            time.sleep(1.0)
+            now = time.monotonic()
+            if collector.poll() is not None:
+                failures.append(f"the collector exited with status {collector.returncode}")
+                break
+            if churn and now >= next_churn:
+                next_churn += churn
+                spare.append(polled.pop(0))
+                polled.append(spare.pop(0))
+                write_inventory(inventory_path, polled)
+            if drops and now >= next_drop:
+                next_drop += drops
+                broker.drop()
+            if now >= next_sample:
+                next_sample += sample_interval
+                elapsed = now - start
+                rss_mb, fds, threads = process_stats(collector.pid)
+                durations = broker.take_durations()
+                cycle_s = statistics.fmean(durations) if durations else None
+                samples.append({'elapsed': elapsed, 'rss_mb': rss_mb, 'fds': fds, 'threads': threads,
+                                'cycles': len(durations), 'cycle_s': cycle_s})
+                shown = f"{cycle_s:.4f}" if cycle_s is not None else '-'
+                marker = '  (warm-up)' if elapsed < warmup else ''
+                print(f"{elapsed:>10.0f}{rss_mb:>10.1f}{fds:>6}{threads:>9}{len(durations):>8}{shown:>10}"
+                      f"{broker.messages:>10}{marker}", flush=True)
+                if csv_file:
+                    csv_file.write(f"{elapsed:.1f},{rss_mb:.2f},{fds},{threads},{len(durations)},"
+                                   f"{'' if cycle_s is None else f'{cycle_s:.5f}'},{broker.messages}\n")
+                    csv_file.flush()
+                if elapsed >= warmup and not durations:
+                    failures.append(f"no cycles completed in the {sample_interval:.0f}s before {elapsed:.0f}s")
+            if now - start >= duration:
+                break
+    except KeyboardInterrupt:
+        print("Interrupted; judging the samples so far.")
+    finally:
+        if collector.poll() is None:
+            collector.send_signal(signal.SIGTERM)
+            try:
+                collector.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                collector.kill()
+                collector.wait()
+        log_file.close()
+        if csv_file:
+            csv_file.close()
+        broker.close()
+        # Only the end of the log outlives the work directory
+        with open(log_path, 'r') as f:
+            log_tail = f.readlines()[-20:]
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    judged = [sample for sample in samples if sample['elapsed'] >= warmup]
+    print(f"\n{'metric':<10}{'first':>10}{'last':>10}{'per hour':>11}{'allowed':>10}  result")
+    for name, (relative, absolute) in TOLERANCES.items():
+        result = judge([(sample['elapsed'], sample[name]) for sample in judged if sample[name] is not None],
+                       relative, absolute)
+        if result is None:
+            print(f"{name:<10}{'too few samples after the warm-up':>51}")
+            continue
+        print(f"{name:<10}{result['first']:>10.4g}{result['last']:>10.4g}{result['per_hour']:>+11.4g}"
+              f"{result['limit']:>10.4g}  {'GROWING' if result['failed'] else 'ok'}")
+        if result['failed']:
+            failures.append(f"{name} grew from {result['first']:.4g} to {result['last']:.4g}")
+    print(f"\nBroker: {broker.messages} messages, {broker.connects} connections")
+
+    if failures:
+        print("\nSoak test failed: " + "; ".join(failures))
+        if log_tail:
+            print("\nLast lines of the collector's log:\n" + ''.join(log_tail))
+        sys.exit(1)
+    print("\nSoak test passed.")
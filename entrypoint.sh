@@ -3,5 +3,10 @@
 # Export all environment variables to a file
 printenv | sed 's/^\(.*\)$/export \1/g' > /etc/environment
 
+# With POLL_INTERVAL set, run the collector as a resident process instead of from cron
+if [ -n "$POLL_INTERVAL" ] && [ "$POLL_INTERVAL" != "0" ]; then
+    exec /usr/local/bin/python3 /app/moca_info.py
+fi
+
 # Start cron in the foreground
 cron -f
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+# Library for reading status and PHY rates from goCoax MoCA adapters.
+#
+#   GoCoaxClient          one adapter: poll() for dictionaries, sample() for compact objects
+#   Collector             schedules polls of many hosts (see collector.py and sharding.py)
+#   run_collector         the whole application behind moca_info.py and py_gocoax_stats.py
+
+from .client import GoCoaxClient, GoCoaxError, poll_host
+from .models import DeviceStatus, EthernetCounters, PhyMatrix, PhyRates, Sample
+from .decode import decode_device_info, calculate_phy_rates
+from .fields import DEFAULT_FIELDS, parse_fields
+from .collector import Collector
+from .sharding import ThreadPoller, ShardedPoller
+from .ratelimit import RequestLimiter
+from .app import run_collector, SETTINGS_DEFAULTS
+
+__all__ = [
+    'GoCoaxClient', 'GoCoaxError', 'poll_host',
+    'DeviceStatus', 'EthernetCounters', 'PhyMatrix', 'PhyRates', 'Sample',
+    'decode_device_info', 'calculate_phy_rates',
+    'DEFAULT_FIELDS', 'parse_fields',
+    'Collector', 'ThreadPoller', 'ShardedPoller', 'RequestLimiter',
+    'run_collector', 'SETTINGS_DEFAULTS',
+]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+# Streaming anomaly detection on per-link PHY rates.
+#
+# Every (host, from-node, to-node) link keeps a handful of numbers: a fast EWMA of the
+# rate with its variance, and a slow EWMA that acts as the long-term baseline. That is
+# all the history there is, so memory stays constant no matter how long the collector
+# runs. Three kinds of events come out of update():
+#
+#   drop       the new sample is far below the fast mean, both in standard deviations
+#              and as a fraction of the mean (a sudden fall, e.g. a splitter went bad)
+#   degraded   the fast mean has stayed below the baseline by more than
+#              degrade_fraction for 'sustain' samples in a row
+#   recovered  a degraded link's fast mean is back near its baseline
+
+import json
+import math
+import time
+
+# Per-link statistics
+class LinkStats:
+    __slots__ = ('mean', 'var', 'baseline', 'count', 'low_count', 'degraded')
+
+    def __init__(self, rate):
+        self.mean = float(rate)
+        self.var = 0.0
+        self.baseline = float(rate)
+        self.count = 1
+        self.low_count = 0
+        self.degraded = False
+
+class PhyRateAnomalyDetector:
+    def __init__(self, alpha=0.3, baseline_alpha=0.02, drop_sigma=4.0, min_drop=0.2,
+                 degrade_fraction=0.15, sustain=3, warmup=5):
+        self.alpha = alpha
+        self.baseline_alpha = baseline_alpha
+        self.drop_sigma = drop_sigma
+        self.min_drop = min_drop
+        self.degrade_fraction = degrade_fraction
+        self.sustain = sustain
+        self.warmup = warmup
+        # host -> {(from_node, to_node): LinkStats}
+        self.links = {}
+
+    # Feed one get_phy_rates() sample for a host; returns a list of alert events
+    def update(self, host, phy_rates_data, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        nodes = phy_rates_data["nodes"]
+        rates = phy_rates_data["rates"]
+        old_links = self.links.get(host, {})
+        # Links of nodes that left the network are dropped, so memory follows the topology
+        new_links = {}
+        events = []
+
+        for i, from_node in enumerate(nodes):
+            for j, to_node in enumerate(nodes):
+                rate = rates[i][j]
+                key = (from_node, to_node)
+                stats = old_links.get(key)
+                if stats is None:
+                    new_links[key] = LinkStats(rate)
+                    continue
+                new_links[key] = stats
+
+                event = self._update_link(stats, rate)
+                if event:
+                    events.append({
+                        "type": event,
+                        "host": host,
+                        "from": from_node,
+                        "to": to_node,
+                        "rate": rate,
+                        "mean": round(stats.mean, 1),
+                        "baseline": round(stats.baseline, 1),
+                        "timestamp": round(timestamp, 3),
+                    })
+
+        self.links[host] = new_links
+        return events
+
+    def _update_link(self, stats, rate):
+        event = None
+        mean = stats.mean
+        std = math.sqrt(stats.var)
+
+        if stats.count >= self.warmup:
+            drop = mean - rate
+            if drop > self.drop_sigma * std and drop >= self.min_drop * mean:
+                event = 'drop'
+
+        # Incremental EWMA mean and variance
+        diff = rate - mean
+        incr = self.alpha * diff
+        stats.mean = mean + incr
+        stats.var = (1 - self.alpha) * (stats.var + diff * incr)
+        stats.baseline += self.baseline_alpha * (rate - stats.baseline)
+        stats.count += 1
+
+        if stats.count < self.warmup:
+            return event
+
+        if stats.mean < stats.baseline * (1 - self.degrade_fraction):
+            stats.low_count += 1
+            if stats.low_count >= self.sustain and not stats.degraded:
+                stats.degraded = True
+                event = event or 'degraded'
+        else:
+            stats.low_count = 0
+            if stats.degraded and stats.mean >= stats.baseline * (1 - self.degrade_fraction / 2):
+                stats.degraded = False
+                event = event or 'recovered'
+        return event
+
+    # Forget a host's links, e.g. when it is removed from the inventory
+    def forget(self, host):
+        self.links.pop(host, None)
+
+    # Save the per-link state, so cron runs can carry it from one run to the next
+    def save(self, path):
+        data = {
+            host: [[from_node, to_node, s.mean, s.var, s.baseline, s.count, s.low_count, s.degraded]
+                   for (from_node, to_node), s in links.items()]
+            for host, links in self.links.items()
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    def load(self, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for host, links in data.items():
+            self.links[host] = {}
+            for from_node, to_node, mean, var, baseline, count, low_count, degraded in links:
+                stats = LinkStats(mean)
+                stats.var = var
+                stats.baseline = baseline
+                stats.count = count
+                stats.low_count = low_count
+                stats.degraded = degraded
+                self.links[host][(from_node, to_node)] = stats
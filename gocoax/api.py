@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+
+# HTTP access to the goCoax adapter's web API.
+#
+# The adapter's web UI fetches its data by POSTing small JSON requests to /ms/... URLs,
+# guarded by a CSRF cookie that is set when one of the HTML pages is loaded. These
+# functions do the same with a requests session and hand the raw hex words to the
+# decoders in decode.py.
+#
+# With a RetryPolicy, every request is retried on transient failures within the poll's
+# deadline, and with an 'errors' dict a failed endpoint no longer aborts the poll: its
+# error is recorded and the other endpoints are still fetched.
+
+import json
+import time
+import requests
+
+from .httpengine import KeepAliveSession
+
+from .decode import MAX_NUM_NODES, calculate_phy_rates
+
+# Suppress SSL warnings if the device uses a self-signed certificate
+import urllib3
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# Define the endpoints globally
+endpoints = {
+    'devStatus': '/devStatus.html',   # To retrieve the CSRF token
+    'phyRates': '/phyRates.html',     # For the referer in the headers
+    'localInfo': '/ms/0/0x15',
+    'netInfo': '/ms/0/0x16',
+    'fmrInfo': '/ms/0/0x1D',
+    'miscphyinfo': '/ms/0/0x24',
+    'macInfo': '/ms/1/0x103/GET',
+    'frameInfo': '/ms/0/0x14',
+    'lof': '/ms/0/0x1003/GET',
+    'ipAddr': '/ms/1/0x20b/GET',
+    'ChipID': '/ms/1/0x303/GET',
+    'gpio': '/ms/1/0xb17',
+    'miscm25phyinfo': '/ms/0/0x7f',
+}
+
+# Endpoint names by URL path, for telling responses apart
+endpoint_names = {path: name for name, path in endpoints.items()}
+
+# Raised instead of sending a request once the poll's deadline has passed
+class DeadlineExceeded(Exception):
+    pass
+
+# Function to tell failures worth retrying (the adapter was busy or the connection
+# dropped) from ones that will fail again (authentication, bad request)
+def is_transient(error):
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ValueError))
+
+# Retries for the requests of one poll: up to 'retries' more attempts per request after
+# a transient failure, backing off from 'backoff' seconds and doubling, as long as the
+# poll's 'deadline' (seconds from now) allows. Each attempt's timeout is capped by
+# 'timeout' and by the time left.
+class RetryPolicy:
+    def __init__(self, retries=2, backoff=0.2, deadline=None, timeout=10.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self.timeout = timeout
+        self.retried = 0
+
+    def call(self, fn, *args, **kwargs):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            timeout = self.timeout
+            if self.deadline is not None:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded("Poll deadline exceeded.")
+                timeout = min(timeout, remaining)
+            try:
+                return fn(*args, timeout=timeout, **kwargs)
+            except Exception as e:
+                if attempt == self.retries or not is_transient(e):
+                    raise
+                if self.deadline is not None and time.monotonic() + delay >= self.deadline:
+                    raise
+                self.retried += 1
+                time.sleep(delay)
+                delay *= 2
+
+# Function to make a request through the retry policy, if there is one
+def _send(retry, fn, *args, **kwargs):
+    if retry is None:
+        return fn(*args, **kwargs)
+    return retry.call(fn, *args, **kwargs)
+
+# Function to run one step of a poll; with an 'errors' dict a failure is recorded under
+# the endpoint's name instead of raised, and None is returned
+def _step(errors, name, fn, *args, **kwargs):
+    if errors is None:
+        return fn(*args, **kwargs)
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        errors[name] = str(e) or type(e).__name__
+        return None
+
+# Function to get CSRF token from cookies
+def get_csrf_token(session):
+    return session.cookies.get('csrf_token')
+
+# Function to perform POST requests with CSRF token and proper headers
+def post_data(session, base_url, action_url, payload_dict=None, referer=None, payload_format='json', debug=False,
+              timeout=None):
+    url = base_url + action_url
+    csrf_token = get_csrf_token(session)
+    headers = {
+        'User-Agent': 'Mozilla/5.0',
+        'Connection': 'keep-alive',
+        'Origin': base_url,
+        'Accept-Encoding': 'gzip, deflate',
+        'Accept-Language': 'en-US,en;q=0.9',
+    }
+    if referer:
+        headers['Referer'] = base_url + referer
+    else:
+        headers['Referer'] = base_url + endpoints['devStatus']
+
+    if payload_format == 'json':
+        headers['Accept'] = 'application/json, text/javascript, */*; q=0.01'
+        headers['Content-Type'] = 'application/json'
+        if payload_dict is None:
+            payload_dict = {"data": []}
+        payload_str = json.dumps(payload_dict)
+    elif payload_format == 'form':
+        headers['Accept'] = 'text/html, */*'
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if payload_dict is None:
+            payload_dict = {}
+        payload_str = payload_dict
+    else:
+        raise ValueError("Invalid payload_format specified.")
+
+    if csrf_token:
+        headers['X-CSRF-TOKEN'] = csrf_token
+        headers['Cookie'] = f'csrf_token={csrf_token}'
+
+    # Debugging statements
+    if debug:
+        print(f"POST URL: {url}")
+        print(f"Headers: {headers}")
+        print(f"Payload: {payload_str}\n")
+
+    response = session.post(url, data=payload_str, headers=headers, verify=False, timeout=timeout)
+    try:
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.HTTPError as err:
+        if debug:
+            print(f"Response Status Code: {response.status_code}")
+            print(f"Response Headers: {response.headers}")
+            print(f"Response Content: {response.text}\n")
+        raise
+
+# Function to perform GET requests
+def get_data(session, base_url, action_url, referer=None, debug=False, timeout=None):
+    url = base_url + action_url
+    csrf_token = get_csrf_token(session)
+    headers = {
+        'User-Agent': 'Mozilla/5.0',
+        'Accept': 'text/html, */*',
+        'Connection': 'keep-alive',
+    }
+    if referer:
+        headers['Referer'] = base_url + referer
+    if csrf_token:
+        headers['X-CSRF-TOKEN'] = csrf_token
+        headers['Cookie'] = f'csrf_token={csrf_token}'
+
+    if debug:
+        print(f"GET URL: {url}")
+        print(f"Headers: {headers}\n")
+
+    response = session.get(url, headers=headers, verify=False, timeout=timeout)
+    response.raise_for_status()
+    return response
+
+# Function to load one of the web UI's pages, which sets the CSRF cookie
+def get_page(session, url, timeout=None):
+    headers = {
+        'User-Agent': 'Mozilla/5.0',
+        'Accept': 'text/html, */*',
+        'Connection': 'keep-alive',
+    }
+    response = session.get(url, headers=headers, verify=False, timeout=timeout)
+    response.raise_for_status()
+    return response
+
+# Function to POST to an endpoint and return its data words
+def post_endpoint(session, base_url, name, payload_dict=None, debug=False, retry=None):
+    if isinstance(session, KeepAliveSession):
+        # The keep-alive engine builds the request from its own pre-serialized templates
+        if debug:
+            print(f"POST URL: {base_url + endpoints[name]}")
+            print(f"Payload: {payload_dict}\n")
+        return _send(retry, session.post_endpoint, endpoints[name], payload_dict)
+    return _send(retry, post_data, session, base_url, endpoints[name], payload_dict=payload_dict, debug=debug)['data']
+
+# Function to bring a netInfo cache up to date with the network's topology. A node's
+# netInfo (MAC address, MoCA version) doesn't change while it stays on the network, so
+# entries are only dropped for nodes whose bit left nodeBitMask, and all of them when
+# the network coordinator changed. The cache is a dict kept by the caller between polls;
+# get_phy_rates() also keeps each node's last good fmrInfo in it, under 'fmr'.
+def sync_net_info_cache(cache, node_bitmask, nc_node_id):
+    if cache.get('nc_node') != nc_node_id:
+        cache.clear()
+        cache['nc_node'] = nc_node_id
+    for key in ('nodes', 'fmr'):
+        nodes = cache.setdefault(key, {})
+        for node_id in [node_id for node_id in nodes if not node_bitmask & (1 << node_id)]:
+            del nodes[node_id]
+
+# Function to get a node's netInfo, from the cache if it has it
+def get_net_info(session, base_url, node_id, cache=None, debug=False, retry=None):
+    if cache is not None and node_id in cache['nodes']:
+        return cache['nodes'][node_id]
+    net_info = post_endpoint(session, base_url, 'netInfo', payload_dict={"data": [int(node_id)]}, debug=debug, retry=retry)
+    if cache is not None:
+        cache['nodes'][node_id] = net_info
+    return net_info
+
+# Function to retrieve device information.
+# 'needed' is the set of endpoint names to request (see fields.py); None requests all of them.
+# 'net_info_cache' is an optional dict for netInfo caching, see sync_net_info_cache().
+# 'retry' is an optional RetryPolicy for the requests. With an 'errors' dict, an endpoint
+# that fails is left out of the result and its error is recorded in 'errors' under the
+# endpoint's name, instead of failing the whole call; the CSRF page is still required.
+def retrieve_device_info(session, base_url, debug=False, needed=None, net_info_cache=None, retry=None, errors=None):
+    # Access devStatus.html to obtain the CSRF token
+    dev_status_url = base_url + endpoints['devStatus']
+
+    if debug:
+        print(f"Accessing devStatus.html at {dev_status_url}")
+
+    _send(retry, get_page, session, dev_status_url)
+    csrf_token = get_csrf_token(session)
+    if not csrf_token:
+        print("Failed to retrieve CSRF token.")
+        return None
+
+    if needed is None:
+        needed = set(endpoints)
+
+    device_info = {}
+
+    def fetch(name, payload_dict=None):
+        return _step(errors, name, post_endpoint, session, base_url, name, payload_dict, debug=debug, retry=retry)
+
+    # Step 1: Get localInfo
+    myNodeId = None
+    if 'localInfo' in needed:
+        device_info['localInfo'] = fetch('localInfo')
+        if device_info['localInfo'] is None:
+            del device_info['localInfo']
+        else:
+            myNodeId = int(device_info['localInfo'][0], 16)
+
+    # Step 2: Get miscphyinfo
+    if 'miscphyinfo' in needed:
+        device_info['miscphyinfo'] = fetch('miscphyinfo')
+
+    # Step 3: Get netInfo
+    if 'netInfo' in needed:
+        if myNodeId is None and errors is not None:
+            errors['netInfo'] = "localInfo is not available"
+        else:
+            if net_info_cache is not None:
+                sync_net_info_cache(net_info_cache, int(device_info['localInfo'][12], 16), int(device_info['localInfo'][1], 16) & 0xFF)
+            device_info['netInfo'] = _step(errors, 'netInfo', get_net_info, session, base_url, myNodeId, net_info_cache,
+                                           debug=debug, retry=retry)
+
+    # Step 4: Get macInfo
+    if 'macInfo' in needed:
+        if myNodeId is None and errors is not None:
+            errors['macInfo'] = "localInfo is not available"
+        else:
+            device_info['macInfo'] = fetch('macInfo', {"data": [myNodeId]})
+
+    # Step 5: Get frameInfo
+    if 'frameInfo' in needed:
+        device_info['frameInfo'] = fetch('frameInfo', {"data": [0]})
+
+    # Step 6: Get lof
+    if 'lof' in needed:
+        device_info['lof'] = fetch('lof')
+
+    # Step 7: Get ipAddr
+    if 'ipAddr' in needed:
+        device_info['ipAddr'] = fetch('ipAddr')
+
+    # Step 8: Get ChipID
+    if 'ChipID' in needed:
+        device_info['chipId'] = fetch('ChipID')
+
+    # Step 9: Get gpio
+    if 'gpio' in needed:
+        device_info['gpio'] = fetch('gpio', {"data": [0]})
+
+    # Step 10: Get miscm25phyinfo
+    if 'miscm25phyinfo' in needed:
+        device_info['miscm25phyinfo'] = fetch('miscm25phyinfo')
+
+    # Leave out what failed
+    return {key: value for key, value in device_info.items() if value is not None}
+
+# Include the get_phy_rates function, adjusted to use 'session', 'base_url', and 'debug'.
+# With a 'net_info_cache' (see sync_net_info_cache()), netInfo is only requested for
+# nodes that joined since the last call. 'retry' is an optional RetryPolicy for the
+# requests. With a 'stale_nodes' list as well, a node whose fmrInfo request fails gets
+# its row from the node's last good fmrInfo instead of failing the whole call, and its
+# ID is appended to 'stale_nodes'.
+def get_phy_rates(session, base_url, debug=False, net_info_cache=None, retry=None, stale_nodes=None):
+    # Step 0: Access phyRates.html to obtain the CSRF token
+    phy_rates_url = base_url + endpoints['phyRates']
+
+    if debug:
+        print(f"Accessing phyRates.html at {phy_rates_url}")
+
+    try:
+        _send(retry, get_page, session, phy_rates_url)
+    except requests.exceptions.HTTPError as err:
+        print(f"HTTP Error accessing phyRates.html: {err}")
+        print("Failed to retrieve CSRF token. Please check your credentials and device connection.")
+        return None
+
+    csrf_token = get_csrf_token(session)
+    if not csrf_token:
+        print("Failed to retrieve CSRF token.")
+        return None
+
+    # Initialize data structures
+    netInfo = [None]*MAX_NUM_NODES
+    fmrInfo = [None]*MAX_NUM_NODES
+    nodeId = []
+
+    # Step 1: Get localInfo
+    LocalInfo = post_endpoint(session, base_url, 'localInfo', debug=debug, retry=retry)
+    nodeBitMask = int(LocalInfo[12], 16)
+    ncNodeID = int(LocalInfo[1], 16) & 0xFF
+
+    # Step 2: Get netInfo for each node
+    if net_info_cache is not None:
+        sync_net_info_cache(net_info_cache, nodeBitMask, ncNodeID)
+    for node_id in range(MAX_NUM_NODES):
+        currNodeMask = 1 << node_id
+        if nodeBitMask & currNodeMask:
+            netInfo[node_id] = get_net_info(session, base_url, node_id, net_info_cache, debug=debug, retry=retry)
+            nodeId.append(node_id)
+        else:
+            netInfo[node_id] = None
+
+    # Get NC's MoCA version
+    ncMocaVer = int(netInfo[ncNodeID][4], 16) & 0xFF
+
+    # Step 3: Get fmrInfo for each node
+    for node_id in nodeId:
+        # Node's MoCA version
+        nodeMocaVer = int(netInfo[node_id][4], 16) & 0xFF
+        mocaVer = min(ncMocaVer, nodeMocaVer)
+        if mocaVer < 0x20:
+            finalVer = 1
+        else:
+            finalVer = 2
+        currNodeMask = 1 << node_id
+
+        # Prepare payload as JSON with 'data' as a list of two values
+        payload_dict = {
+            "data": [int(currNodeMask), finalVer]
+        }
+
+        try:
+            fmrInfo[node_id] = post_endpoint(session, base_url, 'fmrInfo', payload_dict=payload_dict, debug=debug, retry=retry)
+        except Exception:
+            last_good = net_info_cache.get('fmr', {}).get(node_id) if net_info_cache is not None else None
+            if stale_nodes is None or last_good is None:
+                raise
+            fmrInfo[node_id] = last_good
+            stale_nodes.append(node_id)
+        else:
+            if net_info_cache is not None:
+                net_info_cache['fmr'][node_id] = fmrInfo[node_id]
+
+    # Step 4: Calculate PHY rates
+    return calculate_phy_rates(LocalInfo, netInfo, fmrInfo)
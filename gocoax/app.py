@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+
+# The collector application behind both scripts.
+#
+# moca_info.py (environment variables, for Docker/cron) and py_gocoax_stats.py (command
+# line) only differ in where their settings come from. Both fill in a settings
+# dictionary and call run_collector(), which wires up the console renderer, MQTT,
+# anomaly detection, the poller and the collector, and runs until done or stopped.
+
+import os
+import time
+import signal
+import functools
+import paho.mqtt.client as mqtt
+
+from .client import poll_host, capture_time, PHY_TIME_ENDPOINTS
+from .collector import Collector, acquire_single_instance_lock, FAST_POLL_FIELDS
+from .inventory import load_inventory, inventory_from_hosts
+from .anomaly import PhyRateAnomalyDetector
+from .summary import summarize_phy_rates
+from .influx import InfluxSink, sample_to_lines
+from .fields import DEFAULT_FIELDS, PHY_FIELDS
+from .renderers import get_renderer
+from .sharding import ThreadPoller, ShardedPoller
+from .profiling import Profiler
+from .snapshot import SnapshotStore, SnapshotServer
+from .percentiles import RollingPercentiles
+from .scheduler import Scheduler
+from .spool import MqttSpool, SpoolingPublisher
+from .publish import (publish_to_mqtt, publish_sample, publish_phy_summary, publish_phy_percentiles,
+                      publish_alert, publish_shard_health, publish_cycle_metrics, publish_shed_report)
+
+# Settings understood by run_collector(), with their defaults
+SETTINGS_DEFAULTS = {
+    'username': None,
+    'password': None,
+    'hosts': [],                 # host list, used when there is no inventory file
+    'inventory_path': None,      # YAML/JSON inventory, re-read when it changes
+    'poll_interval': 0,          # 0 polls every host once and returns
+    'cycle_period': 0,           # time between runs (cron), for the cycle metrics
+    'lock_path': None,
+    'anomaly_detection': False,
+    'anomaly_state_path': None,
+    'debug': False,
+    'output_format': 'none',
+    'concurrency': 1,
+    'shards': 1,
+    'fields': DEFAULT_FIELDS,
+    'fast_poll_interval': 0,     # fast polling after link/LOF/node changes, 0 = off
+    'fast_poll_window': 300,
+    'request_rate': 50.0,        # per-adapter request limit (requests/s), 0 = unlimited
+    'request_burst': 20,
+    'max_in_flight': 1,          # requests outstanding per adapter
+    'request_autotune': False,   # adapt the rate to the adapter's latency and errors
+    'retries': 2,                # extra attempts per request after a transient failure
+    'retry_backoff': 0.2,        # seconds before the first retry, doubling after that
+    'poll_deadline': 30.0,       # seconds a host's poll may take, retries included; 0 = no limit
+    'request_timeout': 10.0,     # seconds per request attempt
+    'http_engine': 'requests',   # 'requests', or 'keepalive' for the lightweight engine in httpengine.py
+    'load_shedding': False,      # plan cycles by host priority and shed what won't fit the interval
+    'load_shedding_state_path': None,  # cost estimates and last-served times, kept across cron runs
+    'mqtt_host': None,
+    'mqtt_port': 1883,
+    'mqtt_user': None,
+    'mqtt_password': None,
+    'mqtt_base_topic': 'moca',
+    'mqtt_payload_format': 'text',
+    'mqtt_spool_dir': None,      # store-and-forward spool for broker outages, off unless set
+    'mqtt_spool_max_bytes': 64 * 1024 * 1024,
+    'mqtt_spool_rate': 500.0,    # messages per second replayed once the broker is back, 0 = unlimited
+    'influx_url': None,          # InfluxDB sink, off unless set
+    'influx_bucket': None,       # 2.x
+    'influx_org': None,
+    'influx_token': None,
+    'influx_database': None,     # 1.x
+    'influx_batch_size': 5000,
+    'influx_flush_interval': 10.0,
+    'influx_gzip': True,
+    'influx_spill_path': None,
+    'profile_dir': '/tmp/moca_profile',  # where the profiling hooks write their files
+    'profile_cycles': 0,         # cProfile over the first N cycles, 0 = off
+    'profile_memory': 0,         # tracemalloc snapshot every N cycles, 0 = off
+    'profile_sections': False,   # time fetch/decode/publish
+    'phy_percentiles': False,    # rolling p5/p50/p95 per link and node over 1h/24h
+    'percentile_interval': 300,  # seconds between percentile publications
+    'percentile_state_path': None,
+    'snapshot_listen': None,     # serve the latest results as JSON: host:port or a Unix socket path
+}
+
+# Function to run the collector; returns the process exit code
+def run_collector(settings):
+    settings = dict(SETTINGS_DEFAULTS, **settings)
+    debug = settings['debug']
+    render = get_renderer(settings['output_format'])
+    # Console messages go to the live view's status line in watch mode
+    log = getattr(render, 'message', print)
+    mqtt_base_topic = settings['mqtt_base_topic']
+    mqtt_payload_format = settings['mqtt_payload_format']
+    inventory_path = settings['inventory_path']
+    anomaly_state_path = settings['anomaly_state_path']
+
+    # Don't let a run overlap with one that is still going; before anything
+    # is started, so a skipped run leaves nothing behind
+    lock_file = None
+    if settings['lock_path']:
+        lock_file = acquire_single_instance_lock(settings['lock_path'])
+        if lock_file is None:
+            print(f"Another collector holds {settings['lock_path']}; skipping this run.")
+            return 0
+
+    # MQTT configuration; messages are published through mqtt_publisher, which is the
+    # client itself or, with a spool, a SpoolingPublisher in front of it
+    mqtt_client = None
+    mqtt_publisher = None
+    spool = None
+    if settings['mqtt_host']:
+        mqtt_client = mqtt.Client()
+        if settings['mqtt_user'] and settings['mqtt_password']:
+            mqtt_client.username_pw_set(settings['mqtt_user'], settings['mqtt_password'])
+        if settings['mqtt_spool_dir']:
+            try:
+                spool = MqttSpool(settings['mqtt_spool_dir'], max_bytes=settings['mqtt_spool_max_bytes'])
+            except OSError as e:
+                print(f"Failed to open the MQTT spool {settings['mqtt_spool_dir']}: {e}")
+        try:
+            mqtt_client.connect(settings['mqtt_host'], settings['mqtt_port'])
+            if debug:
+                print(f"Connected to MQTT broker at {settings['mqtt_host']}:{settings['mqtt_port']}")
+        except Exception as e:
+            print(f"Failed to connect to MQTT broker: {e}")
+            if spool:
+                # Keep trying in the background and spool until the broker is reachable
+                mqtt_client.connect_async(settings['mqtt_host'], settings['mqtt_port'])
+            else:
+                mqtt_client = None
+        if mqtt_client:
+            # Start the MQTT network loop
+            mqtt_client.loop_start()
+            mqtt_publisher = mqtt_client
+            if spool:
+                mqtt_publisher = SpoolingPublisher(mqtt_client, spool, rate=settings['mqtt_spool_rate'])
+                mqtt_publisher.start()
+
+    # Per-link PHY rate anomaly detection; its state is kept across cron runs in a file
+    detector = None
+    if settings['anomaly_detection']:
+        detector = PhyRateAnomalyDetector()
+        if anomaly_state_path and os.path.exists(anomaly_state_path):
+            try:
+                detector.load(anomaly_state_path)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable anomaly state {anomaly_state_path}: {e}")
+
+    # Rolling PHY rate percentiles; like the anomaly state, the buckets are kept across cron runs
+    percentiles = None
+    percentile_state_path = settings['percentile_state_path']
+    if settings['phy_percentiles']:
+        percentiles = RollingPercentiles()
+        if percentile_state_path and os.path.exists(percentile_state_path):
+            try:
+                percentiles.load(percentile_state_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable percentile state {percentile_state_path}: {e}")
+
+    # Optional InfluxDB sink, batching lines across hosts and cycles
+    influx_sink = None
+    if settings['influx_url']:
+        influx_sink = InfluxSink(settings['influx_url'], bucket=settings['influx_bucket'], org=settings['influx_org'],
+                                 token=settings['influx_token'], database=settings['influx_database'],
+                                 batch_size=settings['influx_batch_size'], flush_interval=settings['influx_flush_interval'],
+                                 use_gzip=settings['influx_gzip'], spill_path=settings['influx_spill_path'], debug=debug)
+
+    # Local JSON API with the latest result of every host
+    snapshot_store = None
+    snapshot_server = None
+    if settings['snapshot_listen']:
+        snapshot_store = SnapshotStore()
+        try:
+            snapshot_server = SnapshotServer(snapshot_store, settings['snapshot_listen'])
+            snapshot_server.start()
+            if debug:
+                print(f"Serving snapshots on {snapshot_server.address}")
+        except (OSError, ValueError) as e:
+            print(f"Failed to start the snapshot API on {settings['snapshot_listen']}: {e}")
+            snapshot_store = None
+
+    # Networks whose PHY summary was published this cycle; adapters on the same coax
+    # all report the same network, and one summary per network is enough
+    summarized_networks = set()
+
+    # Fields fetched only for fast polling; the collector sees them, nothing downstream does
+    watch_only = ()
+    if settings['fast_poll_interval'] > 0:
+        watch_only = tuple(name for name in FAST_POLL_FIELDS if name not in settings['fields'])
+
+    # Called for every polled host, in this process, whether sharded or not
+    def handle_result(host, result):
+        if watch_only and result["device_status"]:
+            result = dict(result, device_status={key: value for key, value in result["device_status"].items()
+                                                 if key not in watch_only})
+            if result["validity"]:
+                result["validity"] = {key: value for key, value in result["validity"].items() if key not in watch_only}
+        if snapshot_store:
+            snapshot_store.update(host, result)
+
+        # Render to the console only if an output format was requested
+        timing = result.get("timing")
+        validity = result.get("validity")
+        if render and (result["device_status"] or result["phy_rates"]):
+            render(host, result["device_status"], result["phy_rates"], timing)
+
+        if result["error"]:
+            if hasattr(render, 'error'):
+                render.error(host, result["error"])
+            else:
+                print(f"{host}: {result['error']}")
+            return
+
+        # Summaries, percentiles and the anomaly detector only take PHY rates fetched in
+        # this poll; stale ones would count the same sample twice
+        fresh_phy_rates = result["phy_rates"]
+        if validity and validity.get("phy_rates", {}).get("state", "fresh") != "fresh":
+            fresh_phy_rates = None
+
+        # Publish data to MQTT if client is available
+        if mqtt_publisher:
+            if mqtt_payload_format == 'binary':
+                publish_sample(mqtt_publisher, mqtt_base_topic, host, result["device_status"], result["phy_rates"],
+                               timing=timing, validity=validity)
+            else:
+                publish_to_mqtt(mqtt_publisher, mqtt_base_topic, host, result["device_status"], result["phy_rates"],
+                                debug=debug, timing=timing, validity=validity)
+            network = fresh_phy_rates and fresh_phy_rates["nc_mac"]
+            if network and network not in summarized_networks:
+                summarized_networks.add(network)
+                summary = summarize_phy_rates(fresh_phy_rates)
+                summary["host"] = host
+                phy_time = capture_time(timing, *PHY_TIME_ENDPOINTS)
+                summary["timestamp"] = phy_time["time"] if phy_time else round(time.time(), 3)
+                publish_phy_summary(mqtt_publisher, mqtt_base_topic, summary)
+
+        if influx_sink:
+            influx_sink.add(sample_to_lines(host, result["device_status"], result["phy_rates"], time.time_ns(),
+                                            labels=result.get("labels"), timing=timing, validity=validity))
+
+        phy_time = capture_time(timing, *PHY_TIME_ENDPOINTS)
+        if percentiles and fresh_phy_rates:
+            percentiles.update(host, fresh_phy_rates, phy_time["time"] if phy_time else time.time())
+
+        # Look for degrading links and publish alerts
+        if detector and fresh_phy_rates:
+            for event in detector.update(host, fresh_phy_rates, timestamp=phy_time["time"] if phy_time else None):
+                log(f"{host}: PHY rate {event['type']} on link {event['from']}->{event['to']}: "
+                      f"{event['rate']} Mbps (mean {event['mean']}, baseline {event['baseline']})")
+                if mqtt_publisher:
+                    publish_alert(mqtt_publisher, mqtt_base_topic, host, event)
+
+    # Called once per shard and cycle when sharding is enabled
+    def handle_health(health):
+        if render or health['failed'] or health.get('exitcode'):
+            log(f"Shard {health['shard']} (pid {health['pid']}): {health['hosts']} hosts, "
+                  f"{health['ok']} ok, {health['failed']} failed in {health['duration']}s")
+        if mqtt_publisher:
+            publish_shard_health(mqtt_publisher, mqtt_base_topic, health)
+
+    # Profiling hooks; only created when one of them is enabled
+    profiler = None
+    if settings['profile_cycles'] or settings['profile_memory'] or settings['profile_sections']:
+        profiler = Profiler(settings['profile_dir'], cycles=settings['profile_cycles'],
+                            memory=settings['profile_memory'], sections=settings['profile_sections'])
+        if profiler.sections:
+            handle_result = profiler.timed('publish', handle_result)
+
+    # Called after every poll cycle with its timing against the schedule
+    def handle_cycle(metrics):
+        summarized_networks.clear()
+        if profiler:
+            profiler.after_cycle()
+        if influx_sink:
+            influx_sink.maybe_flush()
+            metrics = dict(metrics, influx_written=influx_sink.written, influx_dropped=influx_sink.dropped,
+                           influx_spill_bytes=influx_sink.spill_size())
+        if spool:
+            metrics = dict(metrics, mqtt_spooled=spool.spooled, mqtt_replayed=spool.replayed,
+                           mqtt_spool_dropped=spool.dropped, mqtt_spool_bytes=spool.size())
+        if metrics['overrun'] or metrics['skipped']:
+            log(f"Cycle overrun: {metrics['hosts']} hosts took {metrics['duration']}s "
+                  f"(interval {metrics['interval']}s, started {metrics['start_lag']}s late, "
+                  f"{metrics['skipped']} polls skipped)")
+        if mqtt_publisher:
+            publish_cycle_metrics(mqtt_publisher, mqtt_base_topic, metrics)
+        now = time.time()
+        if percentiles and now - percentiles.published >= settings['percentile_interval']:
+            percentiles.published = now
+            for host in list(percentiles.series):
+                report = percentiles.report(host, now)
+                if mqtt_publisher:
+                    publish_phy_percentiles(mqtt_publisher, mqtt_base_topic, host,
+                                            dict(report, host=host, timestamp=round(now, 3)))
+
+    fields = settings['fields']
+    if settings['fast_poll_interval'] > 0:
+        # Fast polling needs the values it watches, whether they are published or not
+        fields = tuple(fields) + watch_only
+    limits = {'rate': settings['request_rate'], 'burst': settings['request_burst'],
+              'max_in_flight': settings['max_in_flight'], 'auto_tune': settings['request_autotune']}
+    retry = {'retries': settings['retries'], 'backoff': settings['retry_backoff'],
+             'deadline': settings['poll_deadline'], 'timeout': settings['request_timeout']}
+    poll_fn = functools.partial(poll_host, debug=debug, fields=fields, limits=limits, retry=retry,
+                                engine=settings['http_engine'])
+    concurrency = max(1, settings['concurrency'])
+    if settings['shards'] > 1:
+        # Split the hosts across worker processes; results stream back to this process
+        poller = ShardedPoller(poll_fn, settings['shards'], concurrency)
+    else:
+        poller = ThreadPoller(poll_fn, concurrency)
+
+    # Priority-aware planning of the cycles; only when load shedding is enabled
+    scheduler = None
+    if settings['load_shedding']:
+        scheduler = Scheduler(concurrency=concurrency * max(1, settings['shards']),
+                              phy=any(name in PHY_FIELDS for name in fields))
+
+    # Called for every cycle in which the scheduler shed or deferred work
+    def handle_shed(report):
+        log(f"Cycle {report['cycle']}: {len(report['shed'])} polls shed, {len(report['deferred'])} PHY sweeps deferred "
+            f"(estimated {report['estimate']}s, budget {report['budget']}s)")
+        if mqtt_publisher:
+            publish_shed_report(mqtt_publisher, mqtt_base_topic, report)
+
+    # Forget the state kept for hosts that leave the inventory
+    def handle_remove(host):
+        if detector:
+            detector.forget(host)
+        if percentiles:
+            percentiles.forget(host)
+        if snapshot_store:
+            snapshot_store.forget(host)
+
+    # Function to stop and release everything started above, on every way out
+    def close_resources():
+        poller.close()
+        if snapshot_server:
+            snapshot_server.close()
+        if hasattr(render, 'close'):
+            render.close()
+        if influx_sink:
+            influx_sink.close()
+
+        # Disconnect MQTT client
+        if spool and mqtt_client:
+            # Give the client a moment to send what it was handed; the rest stays spooled
+            mqtt_publisher.close()
+        if mqtt_client:
+            # Stop the MQTT network loop
+            mqtt_client.loop_stop()
+            mqtt_client.disconnect()
+        if lock_file:
+            lock_file.close()
+
+    collector = Collector(poller, handle_result, interval=settings['poll_interval'], on_health=handle_health,
+                          on_cycle=handle_cycle, cycle_period=settings['cycle_period'], on_remove=handle_remove,
+                          fast_interval=settings['fast_poll_interval'], fast_window=settings['fast_poll_window'],
+                          scheduler=scheduler, on_shed=handle_shed)
+    inventory_defaults = {'username': settings['username'], 'password': settings['password']}
+    try:
+        if inventory_path:
+            collector.apply_inventory(load_inventory(inventory_path, inventory_defaults))
+        else:
+            collector.apply_inventory(inventory_from_hosts(settings['hosts'], settings['username'], settings['password']))
+    except (OSError, ValueError) as e:
+        print(f"Error: Failed to load inventory: {e}")
+        close_resources()
+        return 1
+
+    # The scheduler's cost estimates and last-served times carry over from the previous
+    # run, for the hosts still in the inventory
+    load_shedding_state_path = settings['load_shedding_state_path']
+    if scheduler and load_shedding_state_path and os.path.exists(load_shedding_state_path):
+        try:
+            scheduler.load(load_shedding_state_path, hosts=set(collector.hosts))
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            print(f"Ignoring unreadable load shedding state {load_shedding_state_path}: {e}")
+
+    # On-demand polls: <base>/<host>/cmd/refresh polls one host, <base>/cmd/refresh all of them
+    if mqtt_client:
+        refresh_topics = (f"{mqtt_base_topic}/+/cmd/refresh", f"{mqtt_base_topic}/cmd/refresh")
+
+        def handle_refresh(client, userdata, message):
+            host = message.topic[len(mqtt_base_topic) + 1:-len('/cmd/refresh')] or None
+            if not collector.refresh(host):
+                log(f"Refresh requested for unknown host {host}")
+            elif debug:
+                print(f"Refresh requested for {host or 'all hosts'}")
+
+        # Subscribe again whenever the client reconnects
+        def subscribe_commands(client, userdata, flags, rc):
+            for topic in refresh_topics:
+                client.subscribe(topic)
+
+        for topic in refresh_topics:
+            mqtt_client.message_callback_add(topic, handle_refresh)
+        mqtt_client.on_connect = subscribe_commands
+        subscribe_commands(mqtt_client, None, None, 0)
+
+    # Let 'docker stop' and Ctrl-C finish the current cycle cleanly, and SIGUSR1 poll all hosts now
+    signal.signal(signal.SIGTERM, lambda signum, frame: collector.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: collector.stop())
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: collector.refresh())
+
+    if profiler:
+        profiler.start()
+    try:
+        collector.run(inventory_path, inventory_defaults)
+    finally:
+        if profiler:
+            profiler.close()
+        if detector and anomaly_state_path:
+            detector.save(anomaly_state_path)
+        if percentiles and percentile_state_path:
+            percentiles.save(percentile_state_path)
+        if scheduler and load_shedding_state_path:
+            scheduler.save(load_shedding_state_path)
+        close_resources()
+
+    return 0
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+
+# Client for one goCoax adapter.
+#
+# GoCoaxClient keeps the adapter's requests session (and with it the CSRF cookie)
+# between polls and only requests the endpoints the given fields need. poll() returns
+# the decoded dictionaries the collector publishes; sample() returns the compact
+# objects from models.py for code that embeds the library. Every response is timed as it
+# arrives (see take_timing()), so consumers get the capture time of each endpoint's data
+# instead of the time it was published. All requests go through the client's
+# RequestLimiter (see ratelimit.py), so the adapter's web server isn't overrun. With
+# engine='keepalive' the client talks to the adapter through the lightweight HTTP engine
+# in httpengine.py instead of a requests session.
+#
+# poll_host() retries failed requests within the poll's deadline and publishes what it
+# got: a field whose endpoints failed keeps its last good value, and the result's
+# 'validity' tells per field whether its value is fresh, partial, stale or missing.
+#
+#
+#   with GoCoaxClient('192.168.1.10', 'admin', 'secret') as client:
+#       sample = client.sample()
+#       print(sample.device_status.lof, sample.phy_rates.rates.rate(0, 1))
+
+import time
+import requests
+
+from .api import retrieve_device_info, get_phy_rates, endpoints, endpoint_names, RetryPolicy, DeadlineExceeded
+from .decode import decode_device_info
+from .fields import DEFAULT_FIELDS, PHY_FIELDS, FIELD_ENDPOINTS, plan_endpoints
+from .models import DeviceStatus, PhyRates, Sample
+from .httpengine import KeepAliveSession
+from .ratelimit import RequestLimiter, LimitedHTTPAdapter
+from .scheduler import scheduled_fields
+from .sharding import close_host_state
+
+# Raised when the adapter answers, but not with the data that was asked for
+class GoCoaxError(Exception):
+    pass
+
+# HTTP engines a client can use
+ENGINES = ('requests', 'keepalive')
+
+class GoCoaxClient:
+    def __init__(self, host, username, password, debug=False, limiter=None, engine='requests'):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown HTTP engine '{engine}'. Choose from: {', '.join(ENGINES)}.")
+        self.host = host
+        self.base_url = f'http://{host}'
+        self.username = username
+        self.password = password
+        self.debug = debug
+        self.limiter = limiter or RequestLimiter()
+        self.engine = engine
+        self._session = None
+        self._timing = {}
+        # Per-node netInfo, kept while the network's topology stays the same (see api.py)
+        self.net_info_cache = {}
+
+    # Create the session on first use
+    @property
+    def session(self):
+        if self._session is None and self.engine == 'keepalive':
+            self._session = KeepAliveSession(self.host, auth=(self.username, self.password), limiter=self.limiter,
+                                             on_response=self._record, referer=endpoints['devStatus'])
+        elif self._session is None:
+            self._session = requests.Session()
+            self._session.auth = (self.username, self.password)  # For Basic Authentication
+            limited = LimitedHTTPAdapter(self.limiter)
+            self._session.mount('http://', limited)
+            self._session.mount('https://', limited)
+            self._session.hooks['response'].append(self._record_response)
+        return self._session
+
+    # Response hook: note when each endpoint answered and how long the request took
+    # (without the time it waited for the rate limiter)
+    def _record_response(self, response, *args, **kwargs):
+        self._record(response.request.path_url, response.elapsed.total_seconds() - getattr(response, 'limiter_wait', 0.0))
+
+    # Function to note a response to 'path' that took 'latency' seconds
+    def _record(self, path, latency):
+        wall, mono = time.time(), time.monotonic()
+        name = endpoint_names.get(path, path)
+        entry = self._timing.setdefault(name, {"time": 0.0, "monotonic": 0.0, "latency": 0.0, "requests": 0})
+        entry["time"] = round(wall, 6)
+        entry["monotonic"] = round(mono, 6)
+        entry["latency"] = round(entry["latency"] + max(0.0, latency), 6)
+        entry["requests"] += 1
+
+    # Function to collect the timing of the requests since the last call: per endpoint
+    # the wall-clock and monotonic time of its last response, and the time spent in its
+    # requests; at the top level the same for the poll as a whole. None if nothing answered.
+    def take_timing(self):
+        endpoints, self._timing = self._timing, {}
+        if not endpoints:
+            return None
+        last = max(endpoints.values(), key=lambda entry: entry["monotonic"])
+        return {
+            "time": last["time"],
+            "monotonic": last["monotonic"],
+            "latency": round(sum(entry["latency"] for entry in endpoints.values()), 6),
+            "requests": sum(entry["requests"] for entry in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+    # Function to fetch and decode the status fields; returns the decode_device_info() dictionary.
+    # With an 'errors' dict, endpoints that fail are recorded there by name (see
+    # retrieve_device_info()) and the fields that need them are left out.
+    def fetch_status(self, fields=DEFAULT_FIELDS, errors=None, retry=None):
+        status_fields = [name for name in fields if name not in PHY_FIELDS]
+        if not status_fields:
+            return {}
+        device_info = retrieve_device_info(self.session, self.base_url, debug=self.debug, needed=plan_endpoints(status_fields),
+                                           net_info_cache=self.net_info_cache, retry=retry, errors=errors)
+        if device_info is None or not (device_info or errors):
+            raise GoCoaxError("Failed to retrieve device information.")
+        if errors:
+            status_fields = [name for name in status_fields if not errors.keys() & set(FIELD_ENDPOINTS[name])]
+        return decode_device_info(device_info, status_fields)
+
+    # Function to fetch the PHY rates; returns the calculate_phy_rates() dictionary. With
+    # 'partial', a node whose fmrInfo fails keeps its last good row and is listed in the
+    # dictionary's 'stale_nodes'.
+    def fetch_phy_rates(self, vlper=False, retry=None, partial=False):
+        stale_nodes = [] if partial else None
+        phy_rates_data = get_phy_rates(self.session, self.base_url, debug=self.debug, net_info_cache=self.net_info_cache,
+                                       retry=retry, stale_nodes=stale_nodes)
+        if not phy_rates_data:
+            raise GoCoaxError("Failed to retrieve PHY rates.")
+        if not vlper:
+            del phy_rates_data["vlper_rates"]
+        if stale_nodes:
+            phy_rates_data["stale_nodes"] = stale_nodes
+        return phy_rates_data
+
+    # Function to fetch everything the fields need; returns (device_status, phy_rates_data),
+    # where phy_rates_data is None if no PHY field was asked for
+    def poll(self, fields=DEFAULT_FIELDS):
+        device_status = self.fetch_status(fields)
+        phy_rates_data = None
+        if any(name in PHY_FIELDS for name in fields):
+            phy_rates_data = self.fetch_phy_rates(vlper='vlper_rates' in fields)
+        return device_status, phy_rates_data
+
+    def device_status(self, fields=DEFAULT_FIELDS):
+        return DeviceStatus.from_dict(self.fetch_status(fields))
+
+    def phy_rates(self, vlper=False):
+        return PhyRates.from_dict(self.fetch_phy_rates(vlper))
+
+    def sample(self, fields=DEFAULT_FIELDS):
+        device_status, phy_rates_data = self.poll(fields)
+        return Sample(self.host, DeviceStatus.from_dict(device_status),
+                      PhyRates.from_dict(phy_rates_data) if phy_rates_data else None)
+
+    # Drop the session; the next request logs in again
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Endpoints whose responses date the status fields and the PHY rates
+STATUS_TIME_ENDPOINTS = ('frameInfo', 'localInfo')
+PHY_TIME_ENDPOINTS = ('fmrInfo',)
+
+# Function to get the timing entry that dates an endpoint's data: the first of 'names'
+# that was requested, else the poll as a whole. Returns None without timing.
+def capture_time(timing, *names):
+    if not timing:
+        return None
+    for name in names:
+        if name in timing["endpoints"]:
+            return timing["endpoints"][name]
+    return timing
+
+# Function to turn an exception from a poll into the message for the result
+def error_message(error):
+    if isinstance(error, GoCoaxError):
+        return str(error)
+    if isinstance(error, requests.exceptions.HTTPError):
+        return f"HTTP Error: {error}\nFailed to retrieve data. Please check your credentials and device connection."
+    return f"An error occurred: {error}\nFailed to retrieve data. Please check your credentials and device connection."
+
+# Failures that mean the adapter can't be reached at all, so there is no point in
+# trying the PHY rates after the status failed with one
+UNREACHABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, DeadlineExceeded)
+
+# Function to poll a single host. It never raises, so it can run in a thread or a
+# worker process; the result dictionary carries the decoded data, and an error if
+# nothing could be fetched. 'state' persists between polls of the same host and keeps
+# its client (and CSRF cookie), its RequestLimiter, built from 'limits' (RequestLimiter
+# arguments) on the first poll, and the last good value of every field. 'retry' holds
+# RetryPolicy arguments; the policy, and with it the deadline, is new for every poll.
+# 'engine' selects the client's HTTP engine (see GoCoaxClient). The PHY fields are left
+# out when the scheduler deferred the host's PHY sweep (see scheduler.py).
+#
+# Every requested field gets an entry in result["validity"]:
+#   {"state": "fresh"}                       fetched in this poll
+#   {"state": "partial", "stale_nodes": [..]} PHY rates where the rows of the listed
+#                                             nodes are their last good ones
+#   {"state": "stale", "age": s, "error": e} fetching failed; the value is the last good
+#                                             one, from 'age' seconds ago
+#   {"state": "missing", "error": e}         fetching failed and there is no value
+def poll_host(host, config, state, debug=False, fields=DEFAULT_FIELDS, limits=None, retry=None, engine='requests'):
+    result = {"device_status": None, "phy_rates": None, "error": None, "timing": None, "validity": None}
+
+    # Create a client the first time the host is polled; the limiter outlives the client,
+    # so a rate that was lowered after errors stays lowered when the session is replaced
+    client = state.get('client')
+    if client is None:
+        limiter = state.get('limiter')
+        if limiter is None:
+            limiter = state['limiter'] = RequestLimiter(**(limits or {}))
+        client = GoCoaxClient(host, config['username'], config['password'], debug=debug, limiter=limiter, engine=engine)
+        state['client'] = client
+
+    fields = scheduled_fields(config, fields)
+    policy = RetryPolicy(**(retry or {}))
+    field_errors = {}   # field -> error message
+    failure = None      # message for the result's error, if nothing could be fetched
+    status_fields = [name for name in fields if name not in PHY_FIELDS]
+    phy_fields = [name for name in fields if name in PHY_FIELDS]
+
+    # Status first, so it is still reported if the PHY rates fail
+    result["device_status"] = {}
+    unreachable = None
+    endpoint_errors = {}
+    try:
+        result["device_status"] = client.fetch_status(fields, errors=endpoint_errors, retry=policy)
+    except Exception as e:
+        if isinstance(e, UNREACHABLE_ERRORS):
+            unreachable = e
+        failure = error_message(e)
+        field_errors.update((name, str(e) or type(e).__name__) for name in status_fields)
+    for name in status_fields:
+        failed = [endpoint for endpoint in FIELD_ENDPOINTS[name] if endpoint in endpoint_errors]
+        if failed:
+            field_errors[name] = f"{failed[0]}: {endpoint_errors[failed[0]]}"
+
+    if phy_fields:
+        try:
+            if unreachable:
+                raise unreachable
+            result["phy_rates"] = client.fetch_phy_rates(vlper='vlper_rates' in fields, retry=policy, partial=True)
+        except Exception as e:
+            failure = failure or error_message(e)
+            field_errors.update((name, str(e) or type(e).__name__) for name in phy_fields)
+
+    result["timing"] = client.take_timing()
+    if debug:
+        print(f"{host}: request limiter {client.limiter.stats()}, {policy.retried} retries")
+
+    # Fill in failed fields from their last good values and note each field's validity
+    now = time.time()
+    last_good = state.setdefault('last_good', {})
+    validity = {}
+    for name in fields:
+        error = field_errors.get(name)
+        if error is None:
+            if name in PHY_FIELDS:
+                stale_nodes = result["phy_rates"].get("stale_nodes")
+                if stale_nodes:
+                    validity[name] = {"state": "partial", "stale_nodes": stale_nodes}
+                    continue
+                last_good[name] = (result["phy_rates"], now)
+            else:
+                last_good[name] = (result["device_status"][name], now)
+            validity[name] = {"state": "fresh"}
+        elif name in last_good:
+            value, captured = last_good[name]
+            validity[name] = {"state": "stale", "age": round(now - captured, 3), "error": error}
+            if name in PHY_FIELDS:
+                result["phy_rates"] = value
+            else:
+                result["device_status"][name] = value
+        else:
+            validity[name] = {"state": "missing", "error": error}
+    result["validity"] = validity
+
+    # Only a poll that fetched nothing at all is an error; it carries no data, as before
+    if field_errors and len(field_errors) == len(fields):
+        result["error"] = failure or next(iter(field_errors.values()))
+        result["device_status"], result["phy_rates"] = None, None
+
+    # Start from a fresh session after a failed poll, e.g. when the adapter rebooted
+    if result["error"]:
+        close_host_state(state)
+
+    return result
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+# Resident collector: keeps per-host state and schedules polls.
+#
+# With an interval of 0 the collector polls every enabled host once and returns, which
+# is how the cron setup runs it. With a positive interval it keeps running, polls each
+# host on its own schedule and, when given an inventory file, re-reads it whenever it
+# changes. Inventory changes are applied incrementally: hosts that didn't change keep
+# their session, CSRF cookie and place in the schedule.
+#
+# Every cycle is timed against its schedule (start lag, duration, overruns and skipped
+# polls) and reported through on_cycle, so poll intervals can be sized against the fleet.
+#
+# With fast polling enabled, a host whose link status, LOF or node bitmask changes (or
+# that stops or starts answering) is polled every fast_interval seconds for
+# fast_window seconds, after which its interval doubles with every poll until it is
+# back at the normal interval. Short outages get a fine time resolution without
+# polling the whole fleet at the fast rate.
+#
+# refresh() asks for an immediate out-of-band poll of one host or all of them (from an
+# MQTT command or a signal). It wakes the collector, which polls the hosts right away
+# without moving their schedule. Requests are coalesced: asking again before the poll
+# happened, or while the host's poll is already in flight, leads to a single poll.
+
+import os
+import time
+import fcntl
+import threading
+
+from .inventory import diff_inventory, reload_inventory
+
+# How often the inventory file is checked for changes while the collector is idle
+INVENTORY_CHECK_SECONDS = 5.0
+
+# Config keys whose change requires a fresh session for the host
+SESSION_KEYS = ('username', 'password')
+
+# Status fields whose change switches a host to fast polling
+FAST_POLL_FIELDS = ('link_status', 'lof', 'node_bitmask')
+
+# Function to reduce a result to the values fast polling watches
+def fast_poll_key(result):
+    if result["error"]:
+        return ('error',)
+    device_status = result["device_status"] or {}
+    return tuple(device_status.get(name) for name in FAST_POLL_FIELDS)
+
+# Function to make sure only one collector runs at a time, e.g. when a cron run takes
+# longer than a minute. Returns the open lock file (keep it open for the lifetime of the
+# run), or None if another collector holds the lock.
+def acquire_single_instance_lock(lock_path):
+    lock_file = open(lock_path, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(f"{os.getpid()}\n")
+    lock_file.flush()
+    return lock_file
+
+# Per-host scheduling state
+class HostState:
+    __slots__ = ('host', 'config', 'next_due', 'last_poll', 'last_key', 'fast_interval', 'fast_until')
+
+    def __init__(self, host, config, next_due):
+        self.host = host
+        self.config = config
+        self.next_due = next_due
+        self.last_poll = None
+        self.last_key = None        # fast_poll_key() of the last result
+        self.fast_interval = None   # shortened interval while fast polling, else None
+        self.fast_until = 0.0
+
+class Collector:
+    # cycle_period is the expected time between runs when the collector is started by an
+    # external scheduler (cron) with interval 0; it is used for the cycle metrics and as
+    # the deadline of the run's cycle.
+    # With a 'scheduler' (see scheduler.py), every cycle is planned against its deadline
+    # and on_shed gets the report of every cycle that shed or deferred work.
+    def __init__(self, poller, on_result, interval=0, on_health=None, on_cycle=None, cycle_period=0,
+                 on_remove=None, fast_interval=0, fast_window=300, scheduler=None, on_shed=None):
+        self.poller = poller
+        self.scheduler = scheduler
+        self.on_shed = on_shed
+        self.on_result = on_result
+        self.on_health = on_health
+        self.on_cycle = on_cycle
+        self.on_remove = on_remove
+        self.interval = interval
+        self.cycle_period = cycle_period
+        self.fast_interval = fast_interval
+        self.fast_window = fast_window
+        self.fast_triggers = 0
+        self.hosts = {}
+        self.inventory = {}
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.refreshes = 0
+        self._refresh = set()      # hosts waiting for an out-of-band poll
+        self._refresh_lock = threading.RLock()   # refresh() also runs in signal handlers
+        self._in_flight = set()    # hosts of the cycle that is running
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    # Poll interval for a host: its own from the inventory, else the collector's
+    def host_interval(self, state):
+        return state.config.get('interval') or self.interval
+
+    # Interval until a host's next poll: the fast interval inside a fast polling window,
+    # then doubling with every poll until it is back at the normal interval
+    def next_interval(self, state, now):
+        interval = self.host_interval(state)
+        if state.fast_interval is None:
+            return interval
+        if now >= state.fast_until:
+            state.fast_interval *= 2
+            if state.fast_interval >= interval:
+                state.fast_interval = None
+                return interval
+        return state.fast_interval
+
+    # Start (or extend) fast polling when one of the watched values changed
+    def check_fast_poll(self, state, result, now):
+        key = fast_poll_key(result)
+        changed = state.last_key is not None and key != state.last_key
+        state.last_key = key
+        if changed and self.fast_interval > 0 and self.fast_interval < self.host_interval(state):
+            state.fast_interval = self.fast_interval
+            state.fast_until = now + self.fast_window
+            self.fast_triggers += 1
+
+    # Next regular slot for a host joining the schedule: the earliest next poll of the
+    # polled hosts on the same interval, so it joins their cycle instead of starting a
+    # phase of its own; 'default' if there are none
+    def schedule_slot(self, state, default):
+        interval = self.host_interval(state)
+        slots = [other.next_due for other in self.hosts.values()
+                 if other is not state and other.last_poll is not None and other.fast_interval is None
+                 and other.config.get('enabled', True) and self.host_interval(other) == interval]
+        return min(slots, default=default)
+
+    # Apply a new inventory, touching only hosts that were added, removed or changed. The
+    # hosts change under the refresh lock, as refresh() reads them from other threads.
+    def apply_inventory(self, inventory):
+        with self._refresh_lock:
+            added, removed, changed = diff_inventory(self.inventory, inventory)
+            now = time.monotonic()
+
+            for host in removed:
+                del self.hosts[host]
+                self.poller.forget(host)
+                if self.scheduler:
+                    self.scheduler.forget(host)
+                if self.on_remove:
+                    self.on_remove(host)
+
+            for host in added:
+                state = HostState(host, inventory[host], next_due=now)
+                state.next_due = self.schedule_slot(state, now)
+                self.hosts[host] = state
+
+            for host in changed:
+                state = self.hosts[host]
+                old_config = state.config
+                state.config = inventory[host]
+                if any(old_config.get(key) != state.config.get(key) for key in SESSION_KEYS):
+                    self.poller.forget(host)
+                if old_config.get('interval') != state.config.get('interval') and state.last_poll is not None:
+                    state.next_due = self.schedule_slot(state, state.last_poll + self.host_interval(state))
+
+            self.inventory = inventory
+            return added, removed, changed
+
+    # Hosts whose next poll is due at 'now', and hosts waiting for a refresh
+    def due_jobs(self, now):
+        with self._refresh_lock:
+            refresh, self._refresh = self._refresh, set()
+        return [
+            (host, state.config)
+            for host, state in self.hosts.items()
+            if state.config.get('enabled', True) and (state.next_due <= now or host in refresh)
+        ]
+
+    # Ask for an immediate poll of a host, or of all hosts if 'host' is None; safe to
+    # call from any thread. Returns False for an unknown host.
+    def refresh(self, host=None):
+        with self._refresh_lock:
+            known = set(self.hosts)
+            hosts = known if host is None else {host} & known
+            if not hosts:
+                return False
+            # A host whose poll is in flight gets its fresh result from that poll
+            self._refresh |= hosts - self._in_flight
+        self._wake.set()
+        return True
+
+    # Poll a batch of hosts and hand every result to on_result
+    def run_cycle(self, jobs):
+        cycle_start = time.monotonic()
+        started_at = time.time()
+        period = self.interval or self.cycle_period
+        # Hosts polled ahead of their schedule on request
+        refreshed = {host for host, _ in jobs if self.hosts[host].next_due > cycle_start}
+        with self._refresh_lock:
+            self._in_flight = {host for host, _ in jobs}
+        if self.interval > 0:
+            # Resident: the cycle was due when its earliest host was due
+            scheduled = min((self.hosts[host].next_due for host, _ in jobs if host not in refreshed), default=cycle_start)
+            start_lag = cycle_start - scheduled
+        elif period:
+            # Cron: runs are scheduled on multiples of the period in wall-clock time
+            start_lag = started_at % period
+        else:
+            start_lag = 0.0
+
+        skipped = 0
+        report = None
+        if self.scheduler:
+            # Order the jobs and cut what won't make it by the next cycle, if there is one;
+            # shed hosts move on to their next slot, like polls that were skipped
+            deadline = cycle_start + period if period else None
+            jobs, report = self.scheduler.plan(jobs, cycle_start, deadline, exempt=refreshed)
+            if self.interval > 0:
+                for host in report["shed"]:
+                    state = self.hosts[host]
+                    interval = self.next_interval(state, cycle_start)
+                    state.next_due += (int((cycle_start - state.next_due) // interval) + 1) * interval
+            with self._refresh_lock:
+                self._in_flight = {host for host, _ in jobs}
+        configs = dict(jobs)
+
+        for host, result in self.poller.poll(jobs):
+            with self._refresh_lock:
+                self._in_flight.discard(host)
+            state = self.hosts.get(host)
+            if state is None:
+                # Removed from the inventory while its poll was in flight
+                continue
+            state.last_poll = cycle_start
+            now = time.monotonic()
+            self.check_fast_poll(state, result, now)
+            interval = self.next_interval(state, now)
+            if host in refreshed:
+                # Out of band: the schedule stays as it was, unless the result started fast polling
+                if state.fast_interval is not None:
+                    state.next_due = min(state.next_due, now + interval)
+            elif interval:
+                # Stay on the host's fixed-rate schedule; slots already in the past are skipped
+                next_due = state.next_due + interval
+                if next_due <= now:
+                    missed = int((now - next_due) // interval) + 1
+                    next_due += missed * interval
+                    skipped += missed
+                state.next_due = next_due
+            result["labels"] = state.config.get('labels', {})
+            if self.scheduler:
+                self.scheduler.record(host, configs[host], result)
+            self.on_result(host, result)
+
+        with self._refresh_lock:
+            self._in_flight = set()
+
+        if self.on_health:
+            for health in self.poller.health:
+                self.on_health(health)
+
+        if report and (report["shed"] or report["deferred"]) and self.on_shed:
+            self.on_shed(dict(report, cycle=self.cycles + 1))
+
+        duration = time.monotonic() - cycle_start
+        overrun = bool(period) and duration > period
+        if self.interval <= 0 and period:
+            # Cron runs that started while this one held the lock found it and gave up
+            skipped += int(duration // period)
+        self.cycles += 1
+        self.overruns += overrun
+        self.skipped += skipped
+        self.refreshes += len(refreshed)
+
+        if self.on_cycle:
+            self.on_cycle({
+                'cycle': self.cycles,
+                'scheduled_start': round(started_at - start_lag, 3),
+                'actual_start': round(started_at, 3),
+                'start_lag': round(start_lag, 3),
+                'duration': round(duration, 3),
+                'interval': period,
+                'hosts': len(jobs),
+                'overrun': int(overrun),
+                'overruns_total': self.overruns,
+                'skipped': skipped,
+                'skipped_total': self.skipped,
+                'fast_hosts': sum(1 for state in self.hosts.values() if state.fast_interval is not None),
+                'fast_triggers_total': self.fast_triggers,
+                'refreshed': len(refreshed),
+                'refreshed_total': self.refreshes,
+                'shed': len(report["shed"]) if report else 0,
+                'shed_total': self.scheduler.shed_total if self.scheduler else 0,
+                'deferred': len(report["deferred"]) if report else 0,
+                'deferred_total': self.scheduler.deferred_total if self.scheduler else 0,
+            })
+
+    # Ask a running collector to return after the current cycle
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # Run once (interval 0) or until stop() is called
+    def run(self, inventory_path=None, inventory_defaults=None):
+        if self.interval <= 0:
+            self.run_cycle(self.due_jobs(float('inf')))
+            return
+
+        inventory_mtime = None
+        next_inventory_check = 0.0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if inventory_path and now >= next_inventory_check:
+                next_inventory_check = now + INVENTORY_CHECK_SECONDS
+                try:
+                    inventory_mtime, inventory = reload_inventory(inventory_path, inventory_mtime, inventory_defaults)
+                except Exception as e:
+                    # Keep polling the previous inventory while the file is broken
+                    print(f"Failed to reload inventory {inventory_path}: {e}")
+                    inventory = None
+                if inventory is not None:
+                    added, removed, changed = self.apply_inventory(inventory)
+                    if added or removed or changed:
+                        print(f"Inventory reloaded: {len(added)} added, {len(removed)} removed, {len(changed)} changed")
+
+            jobs = self.due_jobs(now)
+            if jobs:
+                self.run_cycle(jobs)
+
+            # Sleep until the next host is due, waking up for inventory checks
+            due_times = [state.next_due for state in self.hosts.values() if state.config.get('enabled', True)]
+            wake = min(due_times, default=now + INVENTORY_CHECK_SECONDS)
+            if inventory_path:
+                wake = min(wake, next_inventory_check)
+            self._wake.wait(max(0.0, wake - time.monotonic()))
+            self._wake.clear()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+# Decoding of the raw adapter data.
+#
+# Everything here is pure: the functions take the hex word lists returned by the
+# adapter (see api.py) and return plain dictionaries, so they can be tested and
+# benchmarked against recorded data without an adapter (see benchmarks/).
+
+from .fields import DEFAULT_FIELDS
+
+# Helper functions
+def byte2ascii(hex_str):
+    # Convert hex string to ASCII characters
+    try:
+        bytes_obj = bytes.fromhex(hex_str)
+        ascii_str = ''
+        for b in bytes_obj:
+            if 0 < b < 0x80:
+                ascii_str += chr(b)
+            else:
+                return ''
+        return ascii_str
+    except ValueError:
+        return ''
+
+def hex2mac(hi, lo):
+    # Convert hi and lo integers to MAC address string
+    mac_parts = [
+        f"{(hi >> 24) & 0xFF:02x}",
+        f"{(hi >> 16) & 0xFF:02x}",
+        f"{(hi >> 8) & 0xFF:02x}",
+        f"{hi & 0xFF:02x}",
+        f"{(lo >> 24) & 0xFF:02x}",
+        f"{(lo >> 16) & 0xFF:02x}",
+    ]
+    return ':'.join(mac_parts)
+
+def soc_version_string(local_info):
+    # Concatenate the ASCII words of the SoC version, starting at localInfo[21]
+    socVersion = ''
+    i = 0
+    while True:
+        if 21 + i >= len(local_info):
+            break
+        val = local_info[21 + i][2:10]
+        retVal = byte2ascii(val)
+        if not retVal:
+            break
+        socVersion += retVal
+        i += 1
+    return socVersion
+
+def counter64(frame_info, index):
+    # Assemble a 64-bit counter from its hi word at 'index' and lo word at 'index + 1'
+    return ((int(frame_info[index], 16) & 0xFFFFFFFF) * 4294967296) + int(frame_info[index + 1], 16)
+
+# Function to decode the device information (rendering is done by renderers.py).
+# Only the requested fields are decoded, from whatever retrieve_device_info() fetched for them.
+def decode_device_info(device_info, fields=DEFAULT_FIELDS):
+    decoded = {}
+
+    # Process the data as in the JavaScript code
+    local_info = device_info.get('localInfo')
+    if 'network_moca_version' in fields:
+        nwMocaVer = int(local_info[11], 16)
+        decoded["network_moca_version"] = f"{(nwMocaVer >> 4) & 0xF}.{nwMocaVer & 0xF}"
+
+    if 'link_status' in fields:
+        linkStatus = int(local_info[5], 16)
+        decoded["link_status"] = "Up" if linkStatus else "Down"
+
+    # Bitmask of the node IDs in the network
+    if 'node_bitmask' in fields:
+        decoded["node_bitmask"] = int(local_info[12], 16)
+
+    if 'soc_version' in fields:
+        socVersion = soc_version_string(local_info)
+
+        # Determine chip name
+        chipArray = ["MXL370x", "MXL371x", "UNKNOWN"]
+        chipId = int(device_info['chipId'][0], 16)  # Specify base 16
+        chipIdIndex = chipId - 0x15
+        if chipIdIndex >= len(chipArray):
+            chipIdIndex = len(chipArray) - 1
+        chipName = chipArray[chipIdIndex]
+        decoded["soc_version"] = f"{chipName}.{socVersion}"
+
+    # MAC Address
+    if 'mac_address' in fields:
+        mac_info = device_info['macInfo']
+        hi = int(mac_info[0], 16)  # Specify base 16
+        lo = int(mac_info[1], 16)  # Specify base 16
+        decoded["mac_address"] = hex2mac(hi, lo)
+
+    # My MoCA Version
+    if 'my_moca_version' in fields:
+        myMocaVer = int(device_info['netInfo'][4], 16)
+        decoded["my_moca_version"] = f"{(myMocaVer >> 4) & 0xF}.{myMocaVer & 0xF}"
+
+    # Ethernet TX/RX values
+    frame_info = device_info.get('frameInfo')
+    if 'ethernet_tx' in fields:
+        decoded["ethernet_tx"] = {
+            "tx_good": counter64(frame_info, 12),
+            "tx_bad": counter64(frame_info, 30),
+            "tx_dropped": counter64(frame_info, 48),
+        }
+    if 'ethernet_rx' in fields:
+        decoded["ethernet_rx"] = {
+            "rx_good": counter64(frame_info, 66),
+            "rx_bad": counter64(frame_info, 84),
+            "rx_dropped": counter64(frame_info, 102),
+        }
+
+    # IP Address
+    if 'ip_address' in fields:
+        ipAddr = int(device_info['ipAddr'][0], 16)
+        decoded["ip_address"] = f"{(ipAddr >> 24) & 0xFF}.{(ipAddr >> 16) & 0xFF}.{(ipAddr >> 8) & 0xFF}.{ipAddr & 0xFF}"
+
+    # LOF Value
+    if 'lof' in fields:
+        decoded["lof"] = int(device_info['lof'][0], 16)
+
+    # Raw data nothing decodes yet, passed through as-is when asked for
+    for name in ('miscphyinfo', 'gpio', 'miscm25phyinfo'):
+        if name in fields:
+            decoded[name] = device_info[name]
+
+    # Return the processed information as a dictionary for MQTT publishing
+    return decoded
+
+# Constants for the PHY rate calculation
+MAX_NUM_NODES = 16
+LDPC_LEN_100MHZ = 3900
+LDPC_LEN_50MHZ = 1200
+FFT_LEN_100MHZ = 512
+FFT_LEN_50MHZ = 256
+
+# Function to calculate the PHY rates from the raw localInfo data and the per-node
+# netInfo and fmrInfo data (lists indexed by node ID, None for absent nodes)
+def calculate_phy_rates(LocalInfo, netInfo, fmrInfo):
+    # Initialize data structures
+    rateNper = [[0]*MAX_NUM_NODES for _ in range(MAX_NUM_NODES)]
+    rateVlper = [[0]*MAX_NUM_NODES for _ in range(MAX_NUM_NODES)]
+    rateGcd = [0]*MAX_NUM_NODES
+    nodeId = [node_id for node_id in range(MAX_NUM_NODES) if netInfo[node_id] is not None]
+    ncNodeID = int(LocalInfo[1], 16) & 0xFF
+
+    # Get NC's MoCA version
+    ncMocaVer = int(netInfo[ncNodeID][4], 16) & 0xFF
+
+    numNode = len(nodeId)
+    for id_index, id in enumerate(nodeId):
+        entryNodePayloadVer = min(int(netInfo[id][4], 16) & 0xFF, ncMocaVer)
+        readIndx = 10
+        alignmentFlag = True
+        rateGcd[id_index] = 0
+        mocaNodeVer = int(netInfo[id][4], 16) & 0xFF
+
+        for jd_index, jd in enumerate(nodeId):
+            # Determine fmrPayloadVer
+            node_jd_mocaNodeVer = int(netInfo[jd][4], 16) & 0xFF
+            if ncMocaVer < 0x20:
+                fmrPayloadVer = min(entryNodePayloadVer, node_jd_mocaNodeVer)
+            else:
+                fmrPayloadVer = mocaNodeVer
+
+            # Parse fmrInfo data
+            fmr_data = fmrInfo[id]
+            try:
+                if fmrPayloadVer in (0x20, 0x25):
+                    # MoCA 2.x
+                    if alignmentFlag:
+                        val1 = int(fmr_data[readIndx], 16)
+                        gapNper = (val1 >> 24) & 0xFF
+                        gapVLper = (val1 >> 16) & 0xFF
+                        ofdmbNper = val1 & 0xFFFF
+                        val2 = int(fmr_data[readIndx+1], 16)
+                        ofdmbVLper = (val2 >> 16) & 0xFFFF
+                        readIndx += 1
+                    else:
+                        val1 = int(fmr_data[readIndx], 16)
+                        gapNper = (val1 >> 8) & 0xFF
+                        gapVLper = val1 & 0xFF
+                        val2 = int(fmr_data[readIndx+1], 16)
+                        ofdmbNper = (val2 >> 16) & 0xFFFF
+                        ofdmbVLper = val2 & 0xFFFF
+                        readIndx += 2
+                else:
+                    # MoCA 1.x
+                    gapVLper = 0
+                    ofdmbVLper = 0
+                    val = int(fmr_data[readIndx], 16)
+                    if alignmentFlag:
+                        gapNper = (val & 0xF8000000) >> 27
+                        ofdmbNper = (val & 0x07FF0000) >> 16
+                    else:
+                        gapNper = (val & 0x0000F800) >> 11
+                        ofdmbNper = val & 0x000007FF
+                        readIndx += 1
+                alignmentFlag = not alignmentFlag
+
+                # Calculate PHY rates
+                if gapVLper == 0:
+                    rateVlper[id_index][jd_index] = 0
+                else:
+                    rateVlper[id_index][jd_index] = (LDPC_LEN_100MHZ * ofdmbVLper) // ((FFT_LEN_100MHZ + ((gapVLper + 10) * 2)) * 46)
+
+                if gapNper == 0:
+                    rateNper[id_index][jd_index] = 0
+                elif gapVLper == 0 and fmrPayloadVer == 0x20:
+                    rateNper[id_index][jd_index] = (LDPC_LEN_50MHZ * ofdmbNper) // ((FFT_LEN_50MHZ + (gapNper * 2 + 10)) * 26)
+                else:
+                    rateNper[id_index][jd_index] = (LDPC_LEN_100MHZ * ofdmbNper) // ((FFT_LEN_100MHZ + ((gapNper + 10) * 2)) * 46)
+
+                # Calculate GCD
+                if id == jd:
+                    if (mocaNodeVer & 0xF0) == 0x10:
+                        # MoCA 1.x
+                        gapGcd = gapNper
+                        ofdmbGcd = ofdmbNper
+                        rateGcd[id_index] = (LDPC_LEN_50MHZ * ofdmbGcd) // ((FFT_LEN_50MHZ + (gapGcd * 2 + 10)) * 26)
+                    elif (mocaNodeVer & 0xF0) == 0x20:
+                        # MoCA 2.x
+                        gapGcd = gapNper
+                        ofdmbGcd = ofdmbNper
+                        rateGcd[id_index] = (LDPC_LEN_100MHZ * ofdmbGcd) // ((FFT_LEN_100MHZ + ((gapGcd + 10) * 2)) * 46)
+            except Exception as e:
+                print(f"Error parsing FMR data for node {id}: {e}")
+                rateNper[id_index][jd_index] = 0
+                rateVlper[id_index][jd_index] = 0
+
+    # Prepare data for MQTT publishing
+    phy_rates_data = {
+        "nodes": nodeId,
+        "nc_node": ncNodeID,
+        "nc_mac": hex2mac(int(netInfo[ncNodeID][0], 16), int(netInfo[ncNodeID][1], 16)),
+        "node_macs": [netInfo[node_id][0] for node_id in nodeId],
+        "node_moca_versions": [netInfo[node_id][4] for node_id in nodeId],
+        "rates": rateNper,
+        "gcd_rates": rateGcd,
+        "vlper_rates": rateVlper,
+    }
+
+    return phy_rates_data
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# Published fields and the adapter endpoints they depend on.
+#
+# The collector only requests the endpoints needed for the configured fields
+# (MOCA_FIELDS / --fields), so data nobody publishes costs no round trips to the
+# adapter. The names on the right are keys of the 'endpoints' table; 'fmrInfo' stands
+# for the whole PHY rate sweep done by get_phy_rates() (phyRates.html, localInfo and
+# netInfo/fmrInfo for every node).
+
+FIELD_ENDPOINTS = {
+    'soc_version': ('localInfo', 'ChipID'),
+    'my_moca_version': ('localInfo', 'netInfo'),
+    'network_moca_version': ('localInfo',),
+    'ip_address': ('ipAddr',),
+    'mac_address': ('localInfo', 'macInfo'),
+    'link_status': ('localInfo',),
+    'node_bitmask': ('localInfo',),
+    'lof': ('lof',),
+    'ethernet_tx': ('frameInfo',),
+    'ethernet_rx': ('frameInfo',),
+    # Raw data the web UI fetches but nothing decodes; opt-in only
+    'miscphyinfo': ('miscphyinfo',),
+    'gpio': ('gpio',),
+    'miscm25phyinfo': ('miscm25phyinfo',),
+    # PHY rate sweep: 'phy_rates' is the NPER matrix plus GCD rates, 'vlper_rates' the VLPER matrix
+    'phy_rates': ('fmrInfo',),
+    'vlper_rates': ('fmrInfo',),
+}
+
+# Fields filled in by get_phy_rates() rather than retrieve_device_info()
+PHY_FIELDS = ('phy_rates', 'vlper_rates')
+
+# What is published when no fields are configured
+DEFAULT_FIELDS = (
+    'soc_version', 'my_moca_version', 'network_moca_version', 'ip_address', 'mac_address',
+    'link_status', 'lof', 'ethernet_tx', 'ethernet_rx', 'phy_rates',
+)
+
+# Function to parse a comma-separated field list; 'default' expands to DEFAULT_FIELDS
+def parse_fields(fields_str):
+    if not fields_str:
+        return DEFAULT_FIELDS
+    fields = []
+    for name in fields_str.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name == 'default':
+            fields.extend(DEFAULT_FIELDS)
+        elif name in FIELD_ENDPOINTS:
+            fields.append(name)
+        else:
+            raise ValueError(f"Unknown field '{name}'. Choose from: default, {', '.join(FIELD_ENDPOINTS)}.")
+    return tuple(dict.fromkeys(fields))
+
+# Function to derive the minimal set of endpoints for a list of fields
+def plan_endpoints(fields):
+    needed = set()
+    for name in fields:
+        needed.update(FIELD_ENDPOINTS[name])
+    return needed
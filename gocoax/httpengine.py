@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+# Lightweight HTTP/1.1 engine for polling adapters.
+#
+# For large fleets, most of the collector's CPU per request goes into the requests
+# stack (session and header merging, the cookie jar, building the response objects),
+# while the adapters only ever see a handful of fixed requests: a GET of a web UI page
+# for the CSRF cookie and small JSON POSTs to /ms/... KeepAliveSession does just that
+# over one persistent socket per adapter, using the standard library only:
+#
+#   - the header block of every (method, path) is serialized once, with the basic auth
+#     header; the CSRF header and cookies are serialized again only when the adapter
+#     sets a new cookie, and JSON bodies are cached per payload
+#   - responses are read into one receive buffer per session that is reused for every
+#     request; Content-Length, chunked and read-until-close bodies are supported
+#   - a kept-alive connection that the adapter closed in the meantime is reopened once
+#
+# It mimics the parts of a requests session that api.py uses (get(), cookies, close())
+# and raises requests' exceptions, so retries and error handling work the same with
+# either engine; POSTs go through post_endpoint(). It goes through the client's
+# RequestLimiter and reports every response to 'on_response' for the poll's timing.
+# Plain HTTP only, like the adapters' web UI.
+
+import json
+import time
+import socket
+import base64
+from urllib.parse import urlsplit
+
+import requests
+
+# Size of the receive buffer
+RECV_SIZE = 16384
+
+# Headers sent with every request, in this order
+_COMMON_HEADERS = (
+    ('User-Agent', 'Mozilla/5.0'),
+    ('Connection', 'keep-alive'),
+    ('Accept-Language', 'en-US,en;q=0.9'),
+)
+
+# Raised when a kept-alive connection turns out to be closed before the response began
+class _StaleConnection(Exception):
+    pass
+
+class EngineResponse:
+    __slots__ = ('status_code', 'reason', 'headers', 'content', 'url')
+
+    def __init__(self, status_code, reason, headers, content, url):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers   # lower-case names
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            kind = 'Client' if self.status_code < 500 else 'Server'
+            raise requests.exceptions.HTTPError(f"{self.status_code} {kind} Error: {self.reason} for url: {self.url}",
+                                                response=self)
+
+class KeepAliveSession:
+    # 'host' is the adapter's host[:port], 'auth' a (username, password) tuple for basic
+    # authentication and 'referer' the page POSTs claim to come from
+    def __init__(self, host, auth=None, limiter=None, on_response=None, referer='/', buffer_size=RECV_SIZE):
+        hostname, _, port = host.partition(':')
+        self.host = host
+        self.address = (hostname, int(port or 80))
+        self.base_url = f'http://{host}'
+        self.auth = auth
+        self.limiter = limiter
+        self.on_response = on_response
+        self.referer = referer
+        self.cookies = {}
+        self._sock = None
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._data = bytearray()    # received and not yet parsed; keeps its capacity
+        self._templates = {}        # (method, path) -> serialized request line and headers
+        self._bodies = {}           # payload key -> serialized JSON body
+        self._cookie_block = None   # serialized CSRF header and cookies
+
+    # Function to serialize the fixed part of a request
+    def _template(self, method, path):
+        template = self._templates.get((method, path))
+        if template is None:
+            lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}"]
+            lines.extend(f"{name}: {value}" for name, value in _COMMON_HEADERS)
+            if self.auth:
+                credentials = base64.b64encode(f"{self.auth[0]}:{self.auth[1]}".encode('latin-1')).decode('ascii')
+                lines.append(f"Authorization: Basic {credentials}")
+            if method == 'POST':
+                lines.append('Accept: application/json, text/javascript, */*; q=0.01')
+                lines.append('Content-Type: application/json')
+                lines.append(f"Origin: {self.base_url}")
+                lines.append(f"Referer: {self.base_url}{self.referer}")
+            else:
+                lines.append('Accept: text/html, */*')
+            template = self._templates[(method, path)] = ('\r\n'.join(lines) + '\r\n').encode('latin-1')
+        return template
+
+    # Function to serialize the headers that follow the adapter's cookies
+    def _cookies(self):
+        if self._cookie_block is None:
+            lines = []
+            token = self.cookies.get('csrf_token')
+            if token:
+                lines.append(f"X-CSRF-TOKEN: {token}\r\n")
+            if self.cookies:
+                lines.append(f"Cookie: {'; '.join(f'{name}={value}' for name, value in self.cookies.items())}\r\n")
+            self._cookie_block = ''.join(lines).encode('latin-1')
+        return self._cookie_block
+
+    # Function to serialize a JSON payload, cached for the {"data": [...]} payloads the
+    # adapter takes
+    def _body(self, payload_dict):
+        if payload_dict is None:
+            payload_dict = {"data": []}
+        key = tuple(payload_dict["data"]) if len(payload_dict) == 1 and "data" in payload_dict else None
+        body = self._bodies.get(key) if key is not None else None
+        if body is None:
+            body = json.dumps(payload_dict).encode('utf-8')
+            if key is not None:
+                self._bodies[key] = body
+        return body
+
+    # Function to POST a JSON payload to an endpoint path and return its data words
+    def post_endpoint(self, path, payload_dict=None, timeout=None):
+        body = self._body(payload_dict)
+        response = self._request('POST', path, body, timeout)
+        response.raise_for_status()
+        return response.json()['data']
+
+    # GET a page; the arguments other than 'timeout' are accepted for compatibility with
+    # requests and ignored
+    def get(self, url, headers=None, verify=None, timeout=None):
+        return self._request('GET', urlsplit(url).path or '/', None, timeout)
+
+    def _request(self, method, path, body, timeout):
+        head = self._template(method, path) + self._cookies()
+        if body is None:
+            request = head + b'\r\n'
+        else:
+            request = b''.join((head, b'Content-Length: %d\r\n\r\n' % len(body), body))
+
+        if self.limiter:
+            self.limiter.acquire()
+        start = time.monotonic()
+        error = True
+        try:
+            response = self._exchange(request, timeout, self.base_url + path)
+            error = response.status_code >= 500
+        finally:
+            latency = time.monotonic() - start
+            if self.limiter:
+                self.limiter.release(latency, error)
+        if self.on_response:
+            self.on_response(path, latency)
+        return response
+
+    # Function to send a request and read its response, reopening a kept-alive
+    # connection once if the adapter closed it in the meantime
+    def _exchange(self, request, timeout, url):
+        while True:
+            reused = self._sock is not None
+            if not reused:
+                self._connect(timeout)
+            else:
+                self._sock.settimeout(timeout)
+            try:
+                self._sock.sendall(request)
+                return self._read_response(url)
+            except socket.timeout as e:
+                self.close()
+                raise requests.exceptions.ReadTimeout(f"Read timed out: {url}") from e
+            except (_StaleConnection, OSError) as e:
+                self.close()
+                if not reused:
+                    raise requests.exceptions.ConnectionError(f"Connection to {self.host} failed: {e}") from e
+
+    def _connect(self, timeout):
+        try:
+            self._sock = socket.create_connection(self.address, timeout=timeout)
+        except socket.timeout as e:
+            raise requests.exceptions.ConnectTimeout(f"Connection to {self.host} timed out") from e
+        except OSError as e:
+            raise requests.exceptions.ConnectionError(f"Connection to {self.host} failed: {e}") from e
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._data.clear()
+
+    # Function to receive more bytes into the pending data; False at the end of the stream
+    def _receive(self):
+        received = self._sock.recv_into(self._buffer)
+        if not received:
+            return False
+        self._data += self._view[:received]
+        return True
+
+    def _read_response(self, url):
+        data = self._data
+        header_end = data.find(b'\r\n\r\n')
+        while header_end < 0:
+            if not self._receive():
+                if not data:
+                    raise _StaleConnection("connection closed")
+                raise requests.exceptions.ConnectionError(f"Incomplete response from {self.host}")
+            header_end = data.find(b'\r\n\r\n')
+
+        lines = data[:header_end].decode('latin-1').split('\r\n')
+        version, status, reason = (lines[0].split(' ', 2) + [''])[:3]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                cookie_name, _, cookie_value = value.split(';', 1)[0].partition('=')
+                self.cookies[cookie_name.strip()] = cookie_value.strip()
+                self._cookie_block = None
+            headers[name] = value
+        start = header_end + 4
+
+        connection = headers.get('connection', '').lower()
+        close = connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive')
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            content, end = self._read_chunked(start)
+        elif 'content-length' in headers:
+            end = start + int(headers['content-length'])
+            while len(data) < end:
+                if not self._receive():
+                    raise requests.exceptions.ConnectionError(f"Incomplete response from {self.host}")
+            content = bytes(data[start:end])
+        else:
+            while self._receive():
+                pass
+            end = len(data)
+            content = bytes(data[start:end])
+            close = True
+        del data[:end]
+
+        if close:
+            self.close()
+        return EngineResponse(int(status), reason, headers, content, url)
+
+    def _read_chunked(self, offset):
+        data = self._data
+        chunks = []
+        while True:
+            line_end = data.find(b'\r\n', offset)
+            while line_end < 0:
+                if not self._receive():
+                    raise requests.exceptions.ConnectionError(f"Incomplete response from {self.host}")
+                line_end = data.find(b'\r\n', offset)
+            size = int(data[offset:line_end].split(b';', 1)[0], 16)
+            chunk_start = line_end + 2
+            while len(data) < chunk_start + size + 2:
+                if not self._receive():
+                    raise requests.exceptions.ConnectionError(f"Incomplete response from {self.host}")
+            if size == 0:
+                # Skip any trailers up to the final empty line
+                end = data.find(b'\r\n\r\n', line_end)
+                while end < 0:
+                    if not self._receive():
+                        raise requests.exceptions.ConnectionError(f"Incomplete response from {self.host}")
+                    end = data.find(b'\r\n\r\n', line_end)
+                return b''.join(chunks), end + 4
+            chunks.append(bytes(data[chunk_start:chunk_start + size]))
+            offset = chunk_start + size + 2
+
+    # Close the connection; the next request opens a new one
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+        self._data.clear()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+
+# Batched InfluxDB line-protocol sink.
+#
+# Each host's status and PHY matrix are turned into line protocol and buffered across
+# hosts and cycles. The buffer is handed over as a batch when it holds batch_size lines
+# or its oldest line is flush_interval seconds old (checked on every add and at the end
+# of every cycle), and when the sink is closed. A background writer thread sends each
+# batch in one gzip-compressed HTTP request, so polling never waits for InfluxDB; at most
+# max_queued batches wait for it, and newer ones are dropped beyond that. Failed writes
+# are retried with backoff; a batch that still can't be written is appended to an
+# on-disk spill file, and so are the batches after it until flush_interval has passed.
+# The spill file is replayed ahead of new data once the server answers again, a batch at
+# a time from a saved offset, so neither a long outage nor a cron run reads or rewrites
+# it whole.
+#
+# Measurements (integers are written as Influx integers):
+#
+#   moca_status     tags host (+ inventory labels); link_up, lof, tx_/rx_ counters,
+#                   the version/address strings, and latency (seconds the poll's requests took)
+#   moca_phy_rate   tags host, network, from_node, to_node; rate (+ vlper_rate)
+#   moca_gcd_rate   tags host, network, node; rate
+#
+# InfluxDB 2.x is written to with org/bucket/token, 1.x with a database name. For
+# testing without a server, see influx_standin.py.
+#
+# Points are stamped with the time the adapter answered: the status with the time of the
+# frameInfo/localInfo response and the PHY rates with that of the fmrInfo responses.
+
+import os
+import gzip
+import time
+import queue
+import threading
+import itertools
+import requests
+
+from .client import capture_time, STATUS_TIME_ENDPOINTS, PHY_TIME_ENDPOINTS
+
+# Status fields written as Influx integers and as strings
+_STATUS_INT_FIELDS = ('lof', 'node_bitmask')
+_STATUS_STR_FIELDS = ('soc_version', 'my_moca_version', 'network_moca_version', 'ip_address', 'mac_address')
+
+# HTTP statuses worth retrying; any other error status means the batch itself was rejected
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Batches waiting for the writer thread, at most
+MAX_QUEUED_BATCHES = 10
+
+# Suffix of the file next to the spill file that keeps the replay offset
+_SPILL_OFFSET_SUFFIX = '.offset'
+
+# Function to escape a measurement name, tag key or tag value
+def _escape_key(value):
+    return str(value).replace('\\', '\\\\').replace(',', '\\,').replace('=', '\\=').replace(' ', '\\ ')
+
+# Function to format a field value
+def _field_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, float):
+        return repr(value)
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+# Function to build one line of line protocol
+def format_line(measurement, tags, fields, timestamp_ns):
+    tag_str = ''.join(f",{_escape_key(key)}={_escape_key(value)}" for key, value in sorted(tags.items()) if value != '')
+    field_str = ','.join(f"{_escape_key(key)}={_field_value(value)}" for key, value in fields.items())
+    return f"{_escape_key(measurement)}{tag_str} {field_str} {timestamp_ns}"
+
+# Function to convert one host's sample into lines of line protocol. With the poll's
+# 'timing', points get the time their data was captured instead of 'timestamp_ns'. With
+# its 'validity' (see poll_host()), values that were not fetched in this poll are left
+# out, so a stale value is never written again under a new timestamp.
+def sample_to_lines(host, device_status, phy_rates_data, timestamp_ns, labels=None, timing=None, validity=None):
+    lines = []
+    host_tags = dict(labels or {}, host=host)
+    status_ns = phy_ns = timestamp_ns
+    if timing:
+        status_ns = int(capture_time(timing, *STATUS_TIME_ENDPOINTS)["time"] * 1e9)
+        phy_ns = int(capture_time(timing, *PHY_TIME_ENDPOINTS)["time"] * 1e9)
+
+    stale_nodes = ()
+    if validity:
+        device_status = {key: value for key, value in (device_status or {}).items()
+                         if validity.get(key, {}).get("state", "fresh") == "fresh"}
+        phy_state = validity.get("phy_rates", {}).get("state", "fresh")
+        if phy_state == "partial":
+            stale_nodes = validity["phy_rates"]["stale_nodes"]
+        elif phy_state != "fresh":
+            phy_rates_data = None
+
+    if device_status:
+        fields = {}
+        if "link_status" in device_status:
+            fields["link_up"] = 1 if device_status["link_status"] == "Up" else 0
+        for key in _STATUS_INT_FIELDS:
+            if key in device_status:
+                fields[key] = device_status[key]
+        for key in ("ethernet_tx", "ethernet_rx"):
+            fields.update(device_status.get(key, {}))
+        for key in _STATUS_STR_FIELDS:
+            if key in device_status:
+                fields[key] = device_status[key]
+        if fields and timing:
+            fields["latency"] = float(timing["latency"])
+        if fields:
+            lines.append(format_line("moca_status", host_tags, fields, status_ns))
+
+    if phy_rates_data:
+        nodes = phy_rates_data["nodes"]
+        rates = phy_rates_data["rates"]
+        vlper_rates = phy_rates_data.get("vlper_rates")
+        network_tags = dict(host_tags, network=phy_rates_data["nc_mac"])
+        for i, from_node in enumerate(nodes):
+            if from_node in stale_nodes:
+                continue
+            lines.append(format_line("moca_gcd_rate", dict(network_tags, node=from_node),
+                                     {"rate": phy_rates_data["gcd_rates"][i]}, phy_ns))
+            for j, to_node in enumerate(nodes):
+                fields = {"rate": rates[i][j]}
+                if vlper_rates:
+                    fields["vlper_rate"] = vlper_rates[i][j]
+                lines.append(format_line("moca_phy_rate", dict(network_tags, from_node=from_node, to_node=to_node),
+                                         fields, phy_ns))
+    return lines
+
+class InfluxSink:
+    def __init__(self, url, bucket=None, org=None, token=None, database=None, batch_size=5000,
+                 flush_interval=10.0, use_gzip=True, retries=3, timeout=10.0,
+                 spill_path=None, spill_max_bytes=64 * 1024 * 1024, max_queued=MAX_QUEUED_BATCHES, debug=False):
+        if bucket:
+            # InfluxDB 2.x
+            self.write_url = f"{url.rstrip('/')}/api/v2/write"
+            self.params = {'bucket': bucket, 'org': org or '', 'precision': 'ns'}
+        elif database:
+            # InfluxDB 1.x
+            self.write_url = f"{url.rstrip('/')}/write"
+            self.params = {'db': database, 'precision': 'ns'}
+        else:
+            raise ValueError("InfluxDB output needs a bucket (2.x) or a database (1.x).")
+        self.headers = {'Content-Type': 'text/plain; charset=utf-8'}
+        if token:
+            self.headers['Authorization'] = f"Token {token}"
+        if use_gzip:
+            self.headers['Content-Encoding'] = 'gzip'
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.use_gzip = use_gzip
+        self.retries = retries
+        self.timeout = timeout
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self.debug = debug
+        self.session = requests.Session()
+        self.buffer = []
+        self.buffer_since = None
+        # Counters for the collector metrics
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+        # Everything below is only used by the writer thread, except that spill_size()
+        # reads the offset
+        self._spill_offset = self._load_spill_offset()
+        self._spill_until = 0.0   # monotonic time until which batches go straight to the spill
+        self._queue = queue.Queue(maxsize=max(1, max_queued))
+        self._thread = threading.Thread(target=self._run, name='influx-writer', daemon=True)
+        self._thread.start()
+
+    # Function to buffer lines, flushing if a threshold was reached
+    def add(self, lines):
+        if not lines:
+            return
+        if not self.buffer:
+            self.buffer_since = time.monotonic()
+        self.buffer.extend(lines)
+        self.maybe_flush()
+
+    # Function to flush if the buffer is full or old enough
+    def maybe_flush(self):
+        if not self.buffer:
+            return
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self.buffer_since >= self.flush_interval:
+            self.flush()
+
+    # Function to hand the buffer to the writer thread in batches; never blocks or raises
+    def flush(self):
+        while self.buffer:
+            batch = self.buffer[:self.batch_size]
+            del self.buffer[:self.batch_size]
+            try:
+                self._queue.put_nowait(batch)
+            except queue.Full:
+                print(f"InfluxDB writer is {self._queue.maxsize} batches behind; dropping {len(batch)} lines.")
+                self.dropped += len(batch)
+
+    # Writer thread: writes the queued batches until it takes None. An unexpected error
+    # costs the batch it happened on, never the thread.
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            try:
+                self._send(batch)
+            except Exception as e:
+                print(f"InfluxDB writer failed; dropping {len(batch)} lines: {e}")
+                self.dropped += len(batch)
+
+    # Function to write one batch after any spilled data, or spill it
+    def _send(self, batch):
+        if time.monotonic() < self._spill_until:
+            # The last write failed; don't wait for the server again for every batch
+            self._spill(batch)
+            return
+        if self.spill_size() and not self._replay_spill():
+            # The server is still unreachable; keep the order by spilling behind the old data
+            self._spill(batch)
+        elif not self._write(batch):
+            self._spill(batch)
+        else:
+            return
+        self._spill_until = time.monotonic() + self.flush_interval
+
+    # Function to send one batch with retries; True once the server accepted or rejected it
+    def _write(self, lines):
+        body = ('\n'.join(lines) + '\n').encode('utf-8')
+        if self.use_gzip:
+            body = gzip.compress(body)
+        delay = 0.5
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(self.write_url, params=self.params, data=body,
+                                             headers=self.headers, timeout=self.timeout)
+                if response.status_code < 300:
+                    self.written += len(lines)
+                    return True
+                if response.status_code not in _RETRY_STATUSES:
+                    # Malformed data or bad credentials; retrying or spilling won't help
+                    print(f"InfluxDB rejected {len(lines)} lines: {response.status_code} {response.text[:200]}")
+                    self.dropped += len(lines)
+                    return True
+                error = f"{response.status_code} {response.text[:200]}"
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+            if self.debug:
+                print(f"InfluxDB write attempt {attempt + 1} failed: {error}")
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay *= 2
+        print(f"InfluxDB write of {len(lines)} lines failed: {error}")
+        return False
+
+    # Function to append lines to the spill file, up to spill_max_bytes
+    def _spill(self, lines):
+        if not lines:
+            return
+        if not self.spill_path:
+            self.dropped += len(lines)
+            return
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        try:
+            size = os.path.getsize(self.spill_path)
+        except OSError:
+            size = 0
+        if size + len(data) > self.spill_max_bytes:
+            print(f"InfluxDB spill file {self.spill_path} is full; dropping {len(lines)} lines.")
+            self.dropped += len(lines)
+            return
+        try:
+            with open(self.spill_path, 'ab') as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Failed to write the InfluxDB spill file {self.spill_path}; dropping {len(lines)} lines: {e}")
+            self.dropped += len(lines)
+            return
+        self.spilled += len(lines)
+
+    # Function to get the bytes in the spill file that have not been replayed yet
+    def spill_size(self):
+        try:
+            return max(0, os.path.getsize(self.spill_path) - self._spill_offset) if self.spill_path else 0
+        except OSError:
+            return 0
+
+    # Function to read the replay offset saved by an earlier run; 0 without one
+    def _load_spill_offset(self):
+        if not self.spill_path:
+            return 0
+        try:
+            with open(self.spill_path + _SPILL_OFFSET_SUFFIX, 'r') as f:
+                offset = int(f.read().strip() or 0)
+            return offset if 0 <= offset <= os.path.getsize(self.spill_path) else 0
+        except (OSError, ValueError):
+            return 0
+
+    def _save_spill_offset(self):
+        temp_path = self.spill_path + _SPILL_OFFSET_SUFFIX + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(f"{self._spill_offset}\n")
+        os.replace(temp_path, self.spill_path + _SPILL_OFFSET_SUFFIX)
+
+    # Function to write out the spill file a batch at a time from the saved offset; True
+    # once all of it was written, when the file is removed
+    def _replay_spill(self):
+        with open(self.spill_path, 'rb') as f:
+            f.seek(self._spill_offset)
+            while True:
+                lines = [line.decode('utf-8').rstrip('\n') for line in itertools.islice(f, self.batch_size)]
+                if not lines:
+                    break
+                if not self._write(lines):
+                    return False
+                self._spill_offset = f.tell()
+                self._save_spill_offset()
+        os.remove(self.spill_path)
+        try:
+            os.remove(self.spill_path + _SPILL_OFFSET_SUFFIX)
+        except FileNotFoundError:
+            pass
+        self._spill_offset = 0
+        return True
+
+    # Function to hand an item to the writer thread, waiting for room in the queue for as
+    # long as the thread runs; False if it is gone
+    def _put_while_running(self, item):
+        while self._thread.is_alive():
+            try:
+                self._queue.put(item, timeout=1.0)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    # Function to flush what is left, wait for the writer thread and release the connection
+    def close(self):
+        # Unlike flush(), wait for room in the queue; nothing is dropped on the way out
+        # unless the writer thread is gone
+        for start in range(0, len(self.buffer), self.batch_size):
+            batch = self.buffer[start:start + self.batch_size]
+            if not self._put_while_running(batch):
+                self.dropped += len(batch)
+        self.buffer = []
+        if self._put_while_running(None):
+            self._thread.join()
+        self.session.close()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+# Minimal local stand-in for the InfluxDB write endpoints (1.x /write and 2.x
+# /api/v2/write), for trying the InfluxDB sink without a server. It prints every line
+# it receives and can answer the first writes with 503 to exercise retries and the
+# spill file:
+#
+#   python -m gocoax.influx_standin --port 8086 [--fail 4]
+#   INFLUX_URL=http://127.0.0.1:8086 INFLUX_BUCKET=moca python moca_info.py
+
+import gzip
+import argparse
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+# Function to serve the stand-in until interrupted
+def serve_standin(port, fail=0):
+    failures = [fail]
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            if failures[0] > 0:
+                failures[0] -= 1
+                self.send_response(503)
+                self.end_headers()
+                return
+            lines = body.decode('utf-8').splitlines()
+            print(f"{self.path}: {len(lines)} lines", flush=True)
+            for line in lines:
+                print(f"  {line}", flush=True)
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    HTTPServer(('127.0.0.1', port), Handler).serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local stand-in for the InfluxDB write API.')
+    parser.add_argument('--port', type=int, default=8086, help='Port to listen on (default: 8086)')
+    parser.add_argument('--fail', type=int, default=0, help='Answer the first N writes with 503')
+    args = parser.parse_args()
+    serve_standin(args.port, args.fail)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+# Host inventory file support.
+#
+# The inventory is a YAML or JSON file listing the adapters to poll, e.g.:
+#
+#   defaults:
+#     username: admin
+#     password: secret
+#     interval: 60
+#   hosts:
+#     - host: 192.168.1.100
+#       labels: {room: office}
+#     - host: 192.168.1.101
+#       interval: 30
+#       enabled: false
+#     - host: 192.168.1.102
+#       priority: critical
+#
+# Every host entry inherits the 'defaults' and may override any of them. 'priority'
+# (critical, high, normal or low) orders and protects hosts when the collector has to
+# shed load, see scheduler.py. A running collector re-reads the file when its
+# modification time changes and applies only the differences, see
+# Collector.apply_inventory().
+
+import os
+import json
+
+from .scheduler import parse_priority, DEFAULT_PRIORITY
+
+try:
+    import yaml
+except ImportError:  # YAML support is optional; JSON inventories always work
+    yaml = None
+
+# Keys a host entry may carry, and their defaults
+HOST_DEFAULTS = {
+    'username': None,
+    'password': None,
+    'interval': None,
+    'labels': {},
+    'enabled': True,
+    'priority': DEFAULT_PRIORITY,
+}
+
+# Function to build host configs from a plain comma-separated host list (MOCA_HOSTS / --hosts)
+def inventory_from_hosts(host_list, username, password, interval=None):
+    return {
+        host: dict(HOST_DEFAULTS, host=host, username=username, password=password, interval=interval, labels={})
+        for host in host_list
+    }
+
+# Function to read an inventory file; returns a dict of host -> config
+def load_inventory(path, defaults=None):
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError("PyYAML is required for YAML inventories; install it or use JSON.")
+            data = yaml.safe_load(f) or {}
+        else:
+            data = json.load(f)
+
+    # A bare list of hosts is accepted as well as the full form
+    if isinstance(data, list):
+        data = {'hosts': data}
+
+    base = dict(HOST_DEFAULTS)
+    base.update(defaults or {})
+    base.update(data.get('defaults') or {})
+
+    inventory = {}
+    for entry in data.get('hosts') or []:
+        if isinstance(entry, str):
+            entry = {'host': entry}
+        host = str(entry.get('host', '')).strip()
+        if not host:
+            raise ValueError(f"Inventory entry without a 'host': {entry}")
+        config = dict(base)
+        config.update(entry)
+        config['host'] = host
+        config['labels'] = dict(config.get('labels') or {})
+        config['enabled'] = bool(config.get('enabled', True))
+        config['priority'] = parse_priority(config.get('priority'))
+        if config.get('interval') is not None:
+            config['interval'] = float(config['interval'])
+        inventory[host] = config
+    return inventory
+
+# Function to compare two inventories; returns (added, removed, changed) host lists
+def diff_inventory(old, new):
+    added = [host for host in new if host not in old]
+    removed = [host for host in old if host not in new]
+    changed = [host for host in new if host in old and new[host] != old[host]]
+    return added, removed, changed
+
+# Function to check an inventory file for changes.
+# Returns (mtime, inventory), with inventory None when the file is unchanged.
+def reload_inventory(path, last_mtime, defaults=None):
+    mtime = os.stat(path).st_mtime
+    if mtime == last_mtime:
+        return last_mtime, None
+    return mtime, load_inventory(path, defaults)
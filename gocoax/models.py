@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+# Compact sample objects for library users.
+#
+# The decoders return nested dictionaries and 16 x 16 lists of lists, which is handy for
+# publishing but costs a few kilobytes per sample. The classes below hold the same data
+# with __slots__ and, for the rate matrices, one array of the active nodes only, so a
+# service keeping many samples around (or embedding the collector) pays far less memory
+# per sample. as_dict()/from_dict() convert to and from the dictionaries the rest of
+# the code (renderers, payload, summary, anomaly detection) works with.
+
+from array import array
+
+from .decode import MAX_NUM_NODES
+
+# Good/bad/dropped frame counters of one Ethernet direction
+class EthernetCounters:
+    __slots__ = ('good', 'bad', 'dropped')
+
+    def __init__(self, good=0, bad=0, dropped=0):
+        self.good = good
+        self.bad = bad
+        self.dropped = dropped
+
+    # Build from a decoded 'ethernet_tx'/'ethernet_rx' dictionary; prefix is 'tx' or 'rx'
+    @classmethod
+    def from_dict(cls, data, prefix):
+        return cls(data[f"{prefix}_good"], data[f"{prefix}_bad"], data[f"{prefix}_dropped"])
+
+    def as_dict(self, prefix):
+        return {f"{prefix}_good": self.good, f"{prefix}_bad": self.bad, f"{prefix}_dropped": self.dropped}
+
+    def __eq__(self, other):
+        if not isinstance(other, EthernetCounters):
+            return NotImplemented
+        return (self.good, self.bad, self.dropped) == (other.good, other.bad, other.dropped)
+
+    def __repr__(self):
+        return f"EthernetCounters(good={self.good}, bad={self.bad}, dropped={self.dropped})"
+
+# Decoded device status; fields that were not fetched (see fields.py) are None
+class DeviceStatus:
+    __slots__ = ('soc_version', 'my_moca_version', 'network_moca_version', 'ip_address', 'mac_address',
+                 'link_status', 'node_bitmask', 'lof', 'ethernet_tx', 'ethernet_rx', 'miscphyinfo', 'gpio',
+                 'miscm25phyinfo')
+
+    def __init__(self, soc_version=None, my_moca_version=None, network_moca_version=None, ip_address=None,
+                 mac_address=None, link_status=None, node_bitmask=None, lof=None, ethernet_tx=None, ethernet_rx=None,
+                 miscphyinfo=None, gpio=None, miscm25phyinfo=None):
+        self.soc_version = soc_version
+        self.my_moca_version = my_moca_version
+        self.network_moca_version = network_moca_version
+        self.ip_address = ip_address
+        self.mac_address = mac_address
+        self.link_status = link_status
+        self.node_bitmask = node_bitmask
+        self.lof = lof
+        self.ethernet_tx = ethernet_tx
+        self.ethernet_rx = ethernet_rx
+        self.miscphyinfo = miscphyinfo
+        self.gpio = gpio
+        self.miscm25phyinfo = miscm25phyinfo
+
+    @property
+    def link_up(self):
+        return self.link_status == "Up"
+
+    # Build from the dictionary returned by decode_device_info()
+    @classmethod
+    def from_dict(cls, data):
+        values = {name: data[name] for name in cls.__slots__ if name in data}
+        if 'ethernet_tx' in values:
+            values['ethernet_tx'] = EthernetCounters.from_dict(values['ethernet_tx'], 'tx')
+        if 'ethernet_rx' in values:
+            values['ethernet_rx'] = EthernetCounters.from_dict(values['ethernet_rx'], 'rx')
+        return cls(**values)
+
+    # The decode_device_info() dictionary, with only the fields that are set
+    def as_dict(self):
+        data = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if name == 'ethernet_tx':
+                value = value.as_dict('tx')
+            elif name == 'ethernet_rx':
+                value = value.as_dict('rx')
+            data[name] = value
+        return data
+
+    def __eq__(self, other):
+        if not isinstance(other, DeviceStatus):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if getattr(self, name) is not None)
+        return f"DeviceStatus({fields})"
+
+# Square matrix of PHY rates between the active nodes, in one unsigned int array.
+# Rows are the transmitting node and columns the receiving node, both in the order of
+# 'nodes' (not indexed by node ID).
+class PhyMatrix:
+    __slots__ = ('nodes', 'values')
+
+    def __init__(self, nodes, values=None):
+        self.nodes = tuple(nodes)
+        n = len(self.nodes)
+        self.values = array('I', values if values is not None else [0] * (n * n))
+        if len(self.values) != n * n:
+            raise ValueError(f"A PHY matrix of {n} nodes needs {n * n} values, got {len(self.values)}.")
+
+    # Build from a list of rows, e.g. the 16 x 16 'rates' list of calculate_phy_rates()
+    @classmethod
+    def from_rows(cls, nodes, rows):
+        n = len(nodes)
+        return cls(nodes, [rate for row in rows[:n] for rate in row[:n]])
+
+    # The rows padded to 'width' columns and rows, as calculate_phy_rates() returns them
+    def to_rows(self, width=MAX_NUM_NODES):
+        n = len(self.nodes)
+        width = max(width, n)
+        rows = [list(self.values[i * n:(i + 1) * n]) + [0] * (width - n) for i in range(n)]
+        rows.extend([0] * width for _ in range(width - n))
+        return rows
+
+    def __len__(self):
+        return len(self.nodes)
+
+    # matrix[i, j] is the rate from the i-th to the j-th node
+    def __getitem__(self, index):
+        i, j = index
+        n = len(self.nodes)
+        if not (0 <= i < n and 0 <= j < n):
+            raise IndexError(f"PHY matrix index {index} out of range for {n} nodes.")
+        return self.values[i * n + j]
+
+    # Rate between two node IDs
+    def rate(self, from_node, to_node):
+        return self[self.nodes.index(from_node), self.nodes.index(to_node)]
+
+    # Yields (from_node, to_node, rate) for every link, leaving out the diagonal
+    def links(self):
+        n = len(self.nodes)
+        for i, from_node in enumerate(self.nodes):
+            for j, to_node in enumerate(self.nodes):
+                if i != j:
+                    yield from_node, to_node, self.values[i * n + j]
+
+    def __eq__(self, other):
+        if not isinstance(other, PhyMatrix):
+            return NotImplemented
+        return self.nodes == other.nodes and self.values == other.values
+
+    def __repr__(self):
+        return f"PhyMatrix(nodes={list(self.nodes)}, values={self.values.tolist()})"
+
+# PHY rates of one MoCA network as seen from one adapter
+class PhyRates:
+    __slots__ = ('nodes', 'nc_node', 'nc_mac', 'node_macs', 'node_moca_versions', 'rates', 'gcd_rates', 'vlper_rates')
+
+    def __init__(self, nodes, nc_node, nc_mac, node_macs, node_moca_versions, rates, gcd_rates, vlper_rates=None):
+        self.nodes = tuple(nodes)
+        self.nc_node = nc_node
+        self.nc_mac = nc_mac
+        self.node_macs = tuple(node_macs)
+        self.node_moca_versions = tuple(node_moca_versions)
+        self.rates = rates
+        self.gcd_rates = array('I', gcd_rates[:len(self.nodes)])
+        self.vlper_rates = vlper_rates
+
+    # Build from the dictionary returned by calculate_phy_rates()
+    @classmethod
+    def from_dict(cls, data):
+        nodes = data["nodes"]
+        vlper_rates = data.get("vlper_rates")
+        return cls(
+            nodes, data["nc_node"], data["nc_mac"], data["node_macs"], data["node_moca_versions"],
+            PhyMatrix.from_rows(nodes, data["rates"]),
+            data["gcd_rates"],
+            PhyMatrix.from_rows(nodes, vlper_rates) if vlper_rates else None,
+        )
+
+    # The calculate_phy_rates() dictionary, with the matrices padded back to 16 x 16
+    def as_dict(self):
+        data = {
+            "nodes": list(self.nodes),
+            "nc_node": self.nc_node,
+            "nc_mac": self.nc_mac,
+            "node_macs": list(self.node_macs),
+            "node_moca_versions": list(self.node_moca_versions),
+            "rates": self.rates.to_rows(),
+            "gcd_rates": self.gcd_rates.tolist() + [0] * (MAX_NUM_NODES - len(self.nodes)),
+        }
+        if self.vlper_rates is not None:
+            data["vlper_rates"] = self.vlper_rates.to_rows()
+        return data
+
+    # GCD rate of a node ID
+    def gcd_rate(self, node):
+        return self.gcd_rates[self.nodes.index(node)]
+
+    def __eq__(self, other):
+        if not isinstance(other, PhyRates):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"PhyRates(nodes={list(self.nodes)}, nc_node={self.nc_node}, nc_mac={self.nc_mac!r})"
+
+# One poll of one host
+class Sample:
+    __slots__ = ('host', 'device_status', 'phy_rates')
+
+    def __init__(self, host, device_status=None, phy_rates=None):
+        self.host = host
+        self.device_status = device_status
+        self.phy_rates = phy_rates
+
+    def __repr__(self):
+        return f"Sample(host={self.host!r}, device_status={self.device_status!r}, phy_rates={self.phy_rates!r})"
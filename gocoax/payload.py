@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+# Compact binary encoding of one host's sample, for bandwidth-constrained MQTT brokers.
+#
+# One message carries the status fields from decode_device_info() and the PHY rates
+# and GCD rates from get_phy_rates(). The module has no dependencies beyond the
+# standard library, so consumers can copy it as-is and call decode_sample().
+#
+# Layout (version 2, network byte order):
+#
+#   header   magic 'MC' (2s), version (B), flags (B), capture time in ms (Q);
+#            FLAG_PARTIAL marks a sample with stale or missing values (see the
+#            host's validity topic), which are sent as they were last seen or as 0
+#   timing   monotonic capture time in ms (Q), request latency in us (I); not in version 1
+#   status   link up (B), lof (I), IPv4 address (4s), MAC address (6s),
+#            tx good/bad/dropped and rx good/bad/dropped (6Q),
+#            my and network MoCA version as 0xMm nibbles (2B),
+#            SoC version string (B length + UTF-8 bytes)
+#   phy      only if FLAG_PHY: node count n (B), n node IDs (B each),
+#            n x n PHY rates, then n GCD rates, as H (or I with FLAG_WIDE_RATES)
+
+import struct
+import time
+
+MAGIC = b'MC'
+VERSION = 2
+
+FLAG_PHY = 0x01          # the sample includes the PHY block
+FLAG_WIDE_RATES = 0x02   # rates are 32-bit instead of 16-bit
+FLAG_PARTIAL = 0x04      # some values were not fetched in this poll
+
+_HEADER = struct.Struct('!2sBBQ')
+_TIMING = struct.Struct('!QI')
+_STATUS = struct.Struct('!BI4s6s6Q2B')
+
+_NO_TX = {"tx_good": 0, "tx_bad": 0, "tx_dropped": 0}
+_NO_RX = {"rx_good": 0, "rx_bad": 0, "rx_dropped": 0}
+
+# Function to pack an "M.m" version string into one byte
+def _pack_version(version):
+    major, _, minor = version.partition('.')
+    return ((int(major) & 0xF) << 4) | (int(minor or 0) & 0xF)
+
+# Function to encode one host's sample; phy_rates_data may be None. 'timestamp' and
+# 'monotonic' are when the adapter answered and 'latency' the time its requests took,
+# in seconds; they default to now and 0. 'partial' sets FLAG_PARTIAL.
+def encode_sample(device_status, phy_rates_data=None, timestamp=None, monotonic=None, latency=0.0, partial=False):
+    timestamp = time.time() if timestamp is None else timestamp
+    monotonic = time.monotonic() if monotonic is None else monotonic
+    flags = FLAG_PARTIAL if partial else 0
+    phy_block = b''
+
+    if phy_rates_data:
+        flags |= FLAG_PHY
+        nodes = phy_rates_data["nodes"]
+        n = len(nodes)
+        values = [rate for row in phy_rates_data["rates"][:n] for rate in row[:n]]
+        values.extend(phy_rates_data["gcd_rates"][:n])
+        if values and max(values) > 0xFFFF:
+            flags |= FLAG_WIDE_RATES
+        fmt = f"!B{n}B{len(values)}{'I' if flags & FLAG_WIDE_RATES else 'H'}"
+        phy_block = struct.pack(fmt, n, *nodes, *values)
+
+    # Status fields that were not configured (see fields.py) are sent as zeros
+    eth_tx = device_status.get("ethernet_tx", _NO_TX)
+    eth_rx = device_status.get("ethernet_rx", _NO_RX)
+    soc_version = device_status.get("soc_version", "").encode('utf-8')[:255]
+    status_block = _STATUS.pack(
+        1 if device_status.get("link_status") == "Up" else 0,
+        device_status.get("lof", 0),
+        bytes(int(part) for part in device_status.get("ip_address", "0.0.0.0").split('.')),
+        bytes.fromhex(device_status.get("mac_address", "00:00:00:00:00:00").replace(':', '')),
+        eth_tx["tx_good"], eth_tx["tx_bad"], eth_tx["tx_dropped"],
+        eth_rx["rx_good"], eth_rx["rx_bad"], eth_rx["rx_dropped"],
+        _pack_version(device_status.get("my_moca_version", "0.0")),
+        _pack_version(device_status.get("network_moca_version", "0.0")),
+    ) + bytes([len(soc_version)]) + soc_version
+
+    header = _HEADER.pack(MAGIC, VERSION, flags, int(timestamp * 1000))
+    timing_block = _TIMING.pack(int(monotonic * 1000), min(int(latency * 1e6), 0xFFFFFFFF))
+    return header + timing_block + status_block + phy_block
+
+# Function to decode a message produced by encode_sample(); version 1 messages have
+# no monotonic time or latency, which are then None
+def decode_sample(data):
+    magic, version, flags, timestamp_ms = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a MoCA sample payload.")
+    if version not in (1, VERSION):
+        raise ValueError(f"Unsupported payload version {version}.")
+    offset = _HEADER.size
+
+    monotonic = latency = None
+    if version >= 2:
+        monotonic_ms, latency_us = _TIMING.unpack_from(data, offset)
+        offset += _TIMING.size
+        monotonic = monotonic_ms / 1000.0
+        latency = latency_us / 1e6
+
+    (link_up, lof, ip, mac, tx_good, tx_bad, tx_dropped, rx_good, rx_bad, rx_dropped,
+     my_ver, nw_ver) = _STATUS.unpack_from(data, offset)
+    offset += _STATUS.size
+    soc_len = data[offset]
+    soc_version = data[offset + 1:offset + 1 + soc_len].decode('utf-8')
+    offset += 1 + soc_len
+
+    device_status = {
+        "soc_version": soc_version,
+        "my_moca_version": f"{my_ver >> 4}.{my_ver & 0xF}",
+        "network_moca_version": f"{nw_ver >> 4}.{nw_ver & 0xF}",
+        "ip_address": '.'.join(str(b) for b in ip),
+        "mac_address": ':'.join(f"{b:02x}" for b in mac),
+        "link_status": "Up" if link_up else "Down",
+        "ethernet_tx": {"tx_good": tx_good, "tx_bad": tx_bad, "tx_dropped": tx_dropped},
+        "ethernet_rx": {"rx_good": rx_good, "rx_bad": rx_bad, "rx_dropped": rx_dropped},
+        "lof": lof,
+    }
+
+    phy_rates_data = None
+    if flags & FLAG_PHY:
+        n = data[offset]
+        offset += 1
+        nodes = list(data[offset:offset + n])
+        offset += n
+        width = 'I' if flags & FLAG_WIDE_RATES else 'H'
+        values = struct.unpack_from(f"!{n * n + n}{width}", data, offset)
+        phy_rates_data = {
+            "nodes": nodes,
+            "rates": [list(values[i * n:(i + 1) * n]) for i in range(n)],
+            "gcd_rates": list(values[n * n:]),
+        }
+
+    return {
+        "timestamp": timestamp_ms / 1000.0,
+        "monotonic": monotonic,
+        "latency": latency,
+        "partial": bool(flags & FLAG_PARTIAL),
+        "device_status": device_status,
+        "phy_rates": phy_rates_data,
+    }
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+# Rolling PHY rate percentiles with constant memory.
+#
+# For capacity planning, the collector keeps p5/p50/p95 of every link's PHY rate (the
+# diagonal is not a link) and every node's GCD rate over the last hour and day, without
+# storing the samples. Each series is a set of time buckets per window (10 minutes for
+# the hour, 1 hour for the day); each bucket is a quantile sketch that counts samples
+# in logarithmic bins, so a percentile is within 'accuracy' (1%) of the true value.
+# A bucket counts towards a window while it overlaps it, so a window covers up to one
+# bucket more than its length. Buckets that slide out are dropped, so memory depends on
+# the number of links and bins, not on how long the collector runs: a link with a
+# steady rate only fills a couple of bins per bucket.
+
+import json
+import math
+from collections import deque
+
+# (name, window length, bucket length) in seconds
+WINDOWS = (('1h', 3600, 600), ('24h', 86400, 3600))
+
+PERCENTILES = (5, 50, 95)
+
+# Bin for rates of 0 (a link that is down)
+ZERO_BIN = -1
+
+class RollingPercentiles:
+    def __init__(self, windows=WINDOWS, accuracy=0.01):
+        self.windows = windows
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        # host -> {series: {window name: deque of [bucket start, {bin: count}]}}, where
+        # series is 'from-to' for a link and 'gcd-<node>' for a node's GCD rate
+        self.series = {}
+        # When the percentiles were last published, kept across cron runs with the buckets
+        self.published = 0.0
+
+    def _bin(self, value):
+        return math.ceil(math.log(value) / self._log_gamma) if value > 0 else ZERO_BIN
+
+    def _value(self, index):
+        return 0 if index == ZERO_BIN else round(2 * self.gamma ** index / (self.gamma + 1))
+
+    def _add(self, windows, value, timestamp):
+        index = self._bin(value)
+        for name, length, bucket_length in self.windows:
+            buckets = windows.setdefault(name, deque())
+            start = timestamp - timestamp % bucket_length
+            if not buckets or buckets[-1][0] != start:
+                if buckets and buckets[-1][0] > start:
+                    continue   # older than the newest bucket, e.g. a clock step
+                buckets.append([start, {}])
+                while buckets[0][0] + bucket_length <= timestamp - length:
+                    buckets.popleft()
+            counts = buckets[-1][1]
+            counts[index] = counts.get(index, 0) + 1
+
+    # Feed one get_phy_rates() sample for a host
+    def update(self, host, phy_rates_data, timestamp):
+        series = self.series.setdefault(host, {})
+        nodes = phy_rates_data["nodes"]
+        rates = phy_rates_data["rates"]
+        for i, from_node in enumerate(nodes):
+            self._add(series.setdefault(f"gcd-{from_node}", {}), phy_rates_data["gcd_rates"][i], timestamp)
+            for j, to_node in enumerate(nodes):
+                if i != j:
+                    self._add(series.setdefault(f"{from_node}-{to_node}", {}), rates[i][j], timestamp)
+
+    # Function to compute the percentiles of a host's series at 'now', as
+    # {window name: {"links": {"0-1": {"p5": ..., "p50": ..., "p95": ..., "count": ...}},
+    # "gcd": {"0": {...}}}}. Series without samples in the window are left out, and a
+    # series without samples in any window is dropped.
+    def report(self, host, now):
+        series = self.series.get(host, {})
+        report = {name: {"links": {}, "gcd": {}} for name, _, _ in self.windows}
+        for key in list(series):
+            windows = series[key]
+            found = False
+            for name, length, bucket_length in self.windows:
+                merged = {}
+                for start, counts in windows.get(name, ()):
+                    if start + bucket_length > now - length:
+                        for index, count in counts.items():
+                            merged[index] = merged.get(index, 0) + count
+                if not merged:
+                    continue
+                found = True
+                if key.startswith('gcd-'):
+                    report[name]["gcd"][key[4:]] = self._percentiles(merged)
+                else:
+                    report[name]["links"][key] = self._percentiles(merged)
+            if not found:
+                del series[key]
+        return report
+
+    def _percentiles(self, merged):
+        total = sum(merged.values())
+        result = {}
+        targets = [(f"p{p}", p / 100 * (total - 1)) for p in PERCENTILES]
+        seen = 0
+        for index in sorted(merged):
+            seen += merged[index]
+            while targets and targets[0][1] < seen:
+                result[targets.pop(0)[0]] = self._value(index)
+        result["count"] = total
+        return result
+
+    # Forget a host, e.g. when it is removed from the inventory
+    def forget(self, host):
+        self.series.pop(host, None)
+
+    # Save the buckets, so cron runs can carry them from one run to the next
+    def save(self, path):
+        data = {
+            'published': self.published,
+            'hosts': {
+                host: {key: {name: [[start, list(counts.items())] for start, counts in buckets]
+                             for name, buckets in windows.items()}
+                       for key, windows in series.items()}
+                for host, series in self.series.items()
+            },
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    def load(self, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        self.published = data['published']
+        for host, series in data['hosts'].items():
+            self.series[host] = {
+                key: {name: deque([start, dict(counts)] for start, counts in buckets)
+                      for name, buckets in windows.items()}
+                for key, windows in series.items()
+            }
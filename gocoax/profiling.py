@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+# Profiling hooks for a collector that has become slow or keeps growing.
+#
+# All of them are off by default and then cost nothing: nothing is wrapped and no hook
+# is installed. Each one writes standard formats into the profile directory, with the
+# process ID in the file names:
+#
+#   cycles=N      cProfile over the first N poll cycles, dumped to profile-<pid>.pstats
+#                 (python -m pstats, snakeviz, ...). cProfile only sees the collector's
+#                 thread, so profile with concurrency 1 and one shard to include the polls.
+#   memory=N      tracemalloc snapshot every N cycles, dumped to
+#                 tracemalloc-<pid>-<cycle>.snapshot (tracemalloc.Snapshot.load()), with
+#                 the top allocation growth since the previous snapshot appended to
+#                 tracemalloc-<pid>.txt; only the last MEMORY_KEEP_SNAPSHOTS snapshots are kept
+#   sections      wall time spent fetching from the adapters, decoding and publishing
+#                 (including rendering and the InfluxDB sink), written to
+#                 sections-<pid>.json after every cycle. Nested sections count towards
+#                 the inner one only, so fetch excludes the decoding done between requests.
+#                 With shards, fetch and decode happen in the worker processes and are
+#                 not counted.
+
+import os
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+
+from . import api, client
+
+# Functions timed as sections: (module, attribute, section)
+SECTION_TARGETS = (
+    (client, 'retrieve_device_info', 'fetch'),
+    (client, 'get_phy_rates', 'fetch'),
+    (client, 'decode_device_info', 'decode'),
+    (api, 'calculate_phy_rates', 'decode'),
+)
+
+# Lines of allocation growth written per memory snapshot, and snapshot files kept
+MEMORY_TOP_LINES = 20
+MEMORY_KEEP_SNAPSHOTS = 10
+
+class Profiler:
+    def __init__(self, output_dir, cycles=0, memory=0, sections=False):
+        self.output_dir = output_dir
+        self.cycles = cycles
+        self.memory = memory
+        self.sections = sections
+        self.pid = os.getpid()
+        self.cycle = 0
+        self._profile = None
+        self._snapshot = None
+        self._patched = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._totals = {}   # section -> [calls, total seconds, max seconds]
+
+    def _path(self, name):
+        return os.path.join(self.output_dir, name.format(pid=self.pid, cycle=self.cycle))
+
+    # Function to install the enabled hooks
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.sections:
+            for module, name, section in SECTION_TARGETS:
+                original = getattr(module, name)
+                setattr(module, name, self.timed(section, original))
+                self._patched.append((module, name, original))
+        if self.memory:
+            tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+        if self.cycles:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    # Function to wrap fn so that its calls are timed as 'section'
+    def timed(self, section, fn):
+        def wrapper(*args, **kwargs):
+            stack = getattr(self._local, 'stack', None)
+            if stack is None:
+                stack = self._local.stack = []
+            stack.append(0.0)   # time spent in nested sections
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                own = elapsed - stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self._lock:
+                    totals = self._totals.setdefault(section, [0, 0.0, 0.0])
+                    totals[0] += 1
+                    totals[1] += own
+                    totals[2] = max(totals[2], own)
+        return wrapper
+
+    # Called after every poll cycle
+    def after_cycle(self):
+        self.cycle += 1
+        if self._profile and self.cycle >= self.cycles:
+            self._dump_profile()
+        if self.memory and self.cycle % self.memory == 0:
+            self._dump_memory()
+        if self.sections:
+            self._dump_sections()
+
+    def _dump_profile(self):
+        self._profile.disable()
+        self._profile.dump_stats(self._path('profile-{pid}.pstats'))
+        self._profile = None
+
+    def _dump_memory(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        snapshot.dump(self._path('tracemalloc-{pid}-{cycle}.snapshot'))
+        oldest = self.cycle - self.memory * MEMORY_KEEP_SNAPSHOTS
+        if oldest > 0:
+            try:
+                os.remove(os.path.join(self.output_dir, f"tracemalloc-{self.pid}-{oldest}.snapshot"))
+            except OSError:
+                pass
+        current, peak = tracemalloc.get_traced_memory()
+        with open(self._path('tracemalloc-{pid}.txt'), 'a') as f:
+            f.write(f"Cycle {self.cycle}: {current} bytes traced, peak {peak}\n")
+            for stat in snapshot.compare_to(self._snapshot, 'lineno')[:MEMORY_TOP_LINES]:
+                f.write(f"  {stat}\n")
+        self._snapshot = snapshot
+
+    def _dump_sections(self):
+        with self._lock:
+            report = {
+                section: {'calls': calls, 'total': round(total, 6), 'mean': round(total / calls, 6),
+                          'max': round(longest, 6)}
+                for section, (calls, total, longest) in self._totals.items()
+            }
+        report['cycles'] = self.cycle
+        path = self._path('sections-{pid}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    # Function to write out what is left and remove the hooks
+    def close(self):
+        if self._profile:
+            self._dump_profile()
+        if self.memory:
+            if self.cycle % self.memory:
+                self._dump_memory()
+            tracemalloc.stop()
+        if self.sections:
+            self._dump_sections()
+        for module, name, original in self._patched:
+            setattr(module, name, original)
+        self._patched = []
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# Publishing of samples, summaries, alerts and collector metrics to MQTT.
+#
+# Each function takes a connected paho client and publishes under the base topic; the
+# topic layout is described in the README.
+
+import json
+
+from .payload import encode_sample
+from .client import capture_time, STATUS_TIME_ENDPOINTS
+
+# Function to tell whether any field of a poll is not fresh (see poll_host())
+def is_partial(validity):
+    return bool(validity) and any(entry["state"] != "fresh" for entry in validity.values())
+
+# Function to publish data to MQTT; 'timing' is the poll's timing from GoCoaxClient.take_timing()
+# and 'validity' its per-field validity from poll_host()
+def publish_to_mqtt(mqtt_client, base_topic, host_ip, device_info, phy_rates_data, debug=False, timing=None,
+                    validity=None):
+    # When each endpoint answered and how long the requests took, as JSON
+    if timing:
+        mqtt_client.publish(f"{base_topic}/{host_ip}/timing", json.dumps(timing))
+
+    # Which fields are fresh, partial, stale or missing, as JSON
+    if validity:
+        mqtt_client.publish(f"{base_topic}/{host_ip}/validity", json.dumps(validity))
+
+    # Device status information; only the configured fields are present
+    status_topic = f"{base_topic}/{host_ip}/status"
+    for key in ("soc_version", "my_moca_version", "network_moca_version", "ip_address", "mac_address", "link_status",
+                "node_bitmask", "lof"):
+        if key in device_info:
+            mqtt_client.publish(f"{status_topic}/{key}", device_info[key])
+
+    # Ethernet TX
+    if "ethernet_tx" in device_info:
+        eth_tx = device_info["ethernet_tx"]
+        mqtt_client.publish(f"{status_topic}/ethernet_tx/tx_good", eth_tx["tx_good"])
+        mqtt_client.publish(f"{status_topic}/ethernet_tx/tx_bad", eth_tx["tx_bad"])
+        mqtt_client.publish(f"{status_topic}/ethernet_tx/tx_dropped", eth_tx["tx_dropped"])
+
+    # Ethernet RX
+    if "ethernet_rx" in device_info:
+        eth_rx = device_info["ethernet_rx"]
+        mqtt_client.publish(f"{status_topic}/ethernet_rx/rx_good", eth_rx["rx_good"])
+        mqtt_client.publish(f"{status_topic}/ethernet_rx/rx_bad", eth_rx["rx_bad"])
+        mqtt_client.publish(f"{status_topic}/ethernet_rx/rx_dropped", eth_rx["rx_dropped"])
+
+    # Raw opt-in data, as JSON lists
+    for key in ("miscphyinfo", "gpio", "miscm25phyinfo"):
+        if key in device_info:
+            mqtt_client.publish(f"{status_topic}/{key}", json.dumps(device_info[key]))
+
+    if not phy_rates_data:
+        return
+
+    # PHY Rates
+    rates_topic = f"{base_topic}/{host_ip}/phy_rates"
+    nodes = phy_rates_data["nodes"]
+    rates = phy_rates_data["rates"]
+    gcd_rates = phy_rates_data["gcd_rates"]
+
+    # Publish GCD Rates
+    for i, node_id in enumerate(nodes):
+        mqtt_client.publish(f"{rates_topic}/gcd_rate/{node_id}", gcd_rates[i])
+
+    # Publish Rates between nodes
+    for i, id_from in enumerate(nodes):
+        for j, id_to in enumerate(nodes):
+            rate = rates[i][j]
+            mqtt_client.publish(f"{rates_topic}/from_{id_from}/to_{id_to}", rate)
+
+    # Publish VLPER rates between nodes, if configured
+    vlper_rates = phy_rates_data.get("vlper_rates")
+    if vlper_rates:
+        vlper_topic = f"{base_topic}/{host_ip}/phy_rates_vlper"
+        for i, id_from in enumerate(nodes):
+            for j, id_to in enumerate(nodes):
+                mqtt_client.publish(f"{vlper_topic}/from_{id_from}/to_{id_to}", vlper_rates[i][j])
+
+    if debug:
+        print(f"Published data to MQTT under base topic '{base_topic}/{host_ip}'.")
+
+# Function to publish a host's whole sample as one compact binary message (see payload.py)
+# stamped with the time the status was captured. A partial sample is flagged, and only
+# then is its validity published as well, to keep the traffic down.
+def publish_sample(mqtt_client, base_topic, host_ip, device_info, phy_rates_data, timing=None, validity=None):
+    captured = capture_time(timing, *STATUS_TIME_ENDPOINTS) or {}
+    partial = is_partial(validity)
+    payload = encode_sample(device_info, phy_rates_data, timestamp=captured.get("time"),
+                            monotonic=captured.get("monotonic"), latency=timing["latency"] if timing else 0.0,
+                            partial=partial)
+    mqtt_client.publish(f"{base_topic}/{host_ip}/sample", payload)
+    if partial:
+        mqtt_client.publish(f"{base_topic}/{host_ip}/validity", json.dumps(validity))
+
+# Function to publish the network-wide PHY summary to MQTT
+def publish_phy_summary(mqtt_client, base_topic, summary):
+    mqtt_client.publish(f"{base_topic}/network/{summary['network']}/phy_summary", json.dumps(summary))
+
+# Function to publish a host's rolling PHY rate percentiles (see percentiles.py) to MQTT
+def publish_phy_percentiles(mqtt_client, base_topic, host_ip, report):
+    mqtt_client.publish(f"{base_topic}/{host_ip}/phy_percentiles", json.dumps(report))
+
+# Function to publish a PHY rate alert event to MQTT
+def publish_alert(mqtt_client, base_topic, host_ip, event):
+    mqtt_client.publish(f"{base_topic}/{host_ip}/alerts/phy_rate", json.dumps(event))
+
+# Function to publish the health of one collector shard to MQTT
+def publish_shard_health(mqtt_client, base_topic, health):
+    shard_topic = f"{base_topic}/collector/shard_{health['shard']}"
+    for key, value in health.items():
+        if key != 'shard':
+            mqtt_client.publish(f"{shard_topic}/{key}", value)
+
+# Function to publish what the scheduler shed or deferred in a cycle (see scheduler.py)
+def publish_shed_report(mqtt_client, base_topic, report):
+    mqtt_client.publish(f"{base_topic}/collector/shed", json.dumps(report))
+
+# Function to publish the timing of the last poll cycle to MQTT
+def publish_cycle_metrics(mqtt_client, base_topic, metrics):
+    cycle_topic = f"{base_topic}/collector/cycle"
+    for key, value in metrics.items():
+        mqtt_client.publish(f"{cycle_topic}/{key}", value)
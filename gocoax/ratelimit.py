@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# Per-adapter request rate limiting.
+#
+# The adapter's web server runs on a small embedded CPU; a burst of requests, or
+# several at once, makes it answer with errors or slows down the adapter itself. Every
+# request to an adapter goes through its host's RequestLimiter, which is mounted on the
+# client's requests session as a transport adapter (LimitedHTTPAdapter):
+#
+#   - a token bucket allows 'rate' requests per second on average, with bursts of up
+#     to 'burst' requests; the default burst covers a whole poll, so a normal poll is
+#     not slowed down, while tight polling loops are
+#   - at most 'max_in_flight' requests are outstanding at a time
+#
+# With auto_tune, the rate follows the adapter's health (additive increase,
+# multiplicative decrease): every response that comes back without an error and
+# within latency_factor times the fastest typical latency seen raises the rate by a
+# small step, up to max_rate; an error, a 5xx status or a slow response halves it
+# (at most once per second), down to min_rate. A rate of 0 disables the bucket.
+
+import time
+import threading
+from requests.adapters import HTTPAdapter
+
+class RequestLimiter:
+    def __init__(self, rate=50.0, burst=20, max_in_flight=1, auto_tune=False, min_rate=1.0,
+                 max_rate=None, latency_factor=3.0, increase=0.5):
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self.max_in_flight = max(1, max_in_flight)
+        self.auto_tune = auto_tune and rate > 0
+        self.min_rate = min(min_rate, self.rate) if rate > 0 else 0.0
+        self.max_rate = float(max_rate) if max_rate else self.rate * 4
+        self.latency_factor = latency_factor
+        self.increase = increase
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self._latency = None        # moving average of the response latency
+        self._best_latency = None   # lowest moving average seen, the adapter at ease
+        self._last_decrease = 0.0
+        # Counters
+        self.requests = 0
+        self.errors = 0
+        self.waited = 0.0
+
+    # Function to wait for a token and a free request slot; call release() afterwards.
+    # Returns the seconds waited.
+    def acquire(self):
+        start = time.monotonic()
+        if self.rate > 0:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    wait = (1 - self._tokens) / self.rate
+                time.sleep(wait)
+        self._in_flight.acquire()
+        waited = time.monotonic() - start
+        self.waited += waited
+        return waited
+
+    # Function to free the request slot and feed the outcome to the auto-tuning;
+    # 'latency' is the request's duration in seconds, 'error' whether it failed
+    def release(self, latency, error=False):
+        self._in_flight.release()
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+            if not self.auto_tune:
+                return
+            self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+            if self._best_latency is None or self._latency < self._best_latency:
+                self._best_latency = self._latency
+            now = time.monotonic()
+            if error or self._latency > self._best_latency * self.latency_factor:
+                if now - self._last_decrease >= 1.0:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self._last_decrease = now
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    # Counters and current rate, for the debug output
+    def stats(self):
+        return {'rate': round(self.rate, 2), 'requests': self.requests, 'errors': self.errors,
+                'waited': round(self.waited, 3)}
+
+# requests transport adapter that sends every request through a RequestLimiter. The time
+# spent waiting is noted on the response as 'limiter_wait', since the session counts it
+# in response.elapsed.
+class LimitedHTTPAdapter(HTTPAdapter):
+    def __init__(self, limiter, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        waited = self.limiter.acquire()
+        start = time.monotonic()
+        error = True
+        try:
+            response = super().send(request, **kwargs)
+            response.limiter_wait = waited
+            error = response.status_code >= 500
+            return response
+        finally:
+            self.limiter.release(time.monotonic() - start, error)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# Console renderers for decoded MoCA data.
+#
+# Decoding (decode_device_info / get_phy_rates) never prints anything. The main loop
+# hands the decoded dictionaries to the selected renderer, so the strings below are
+# only built when somebody actually asked for console output. The 'none' renderer
+# is simply no renderer at all, which keeps headless/cron runs free of per-cycle output.
+# Renderers are called as render(host, device_status, phy_rates_data, timing), where
+# timing is the poll's timing from GoCoaxClient.take_timing() and may be None.
+# 'watch' is the live view from watch.py; it keeps state, so every lookup gets a new one.
+
+import time
+
+from .watch import WatchView
+
+# Status lines of the full table, in display order
+STATUS_LABELS = (
+    ("SOC Version", "soc_version"),
+    ("My MoCA Version", "my_moca_version"),
+    ("Network MoCA Version", "network_moca_version"),
+    ("IP Address", "ip_address"),
+    ("MAC Address", "mac_address"),
+    ("Link Status", "link_status"),
+    ("Node Bitmask", "node_bitmask"),
+)
+
+# Print the full tables, as the script always did
+def render_table(host, device_status, phy_rates_data, timing=None):
+    print(f"\nConnecting to host: http://{host}")
+    if timing:
+        sampled = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timing["time"]))
+        print(f"Sampled at {sampled} ({timing['requests']} requests in {timing['latency'] * 1000:.0f} ms)")
+
+    if device_status:
+        # Only the configured fields are present (see fields.py)
+        print("\nDevice Status Information:")
+        for label, key in STATUS_LABELS:
+            if key in device_status:
+                print(f"{label}:", device_status[key])
+        if "ethernet_tx" in device_status:
+            eth_tx = device_status["ethernet_tx"]
+            ethTxVal = f"Tx Good: {eth_tx['tx_good']}\n Tx Bad: {eth_tx['tx_bad']}\n Tx Dropped: {eth_tx['tx_dropped']}"
+            print("Ethernet TX:\n", ethTxVal)
+        if "ethernet_rx" in device_status:
+            eth_rx = device_status["ethernet_rx"]
+            ethRxVal = f"Rx Good: {eth_rx['rx_good']}\n Rx Bad: {eth_rx['rx_bad']}\n Rx Dropped: {eth_rx['rx_dropped']}"
+            print("Ethernet RX:\n", ethRxVal)
+        for key in ("miscphyinfo", "gpio", "miscm25phyinfo"):
+            if key in device_status:
+                print(f"{key}:", " ".join(device_status[key]))
+
+    if not phy_rates_data:
+        return
+
+    nodes = phy_rates_data["nodes"]
+    rates = phy_rates_data["rates"]
+    gcd_rates = phy_rates_data["gcd_rates"]
+
+    # Display Node Information
+    print("\nNode Information:")
+    print("NodeID\tMAC Address\tMoCA Version")
+    for i, node_id in enumerate(nodes):
+        print(f"{node_id}\t{phy_rates_data['node_macs'][i]}\t{phy_rates_data['node_moca_versions'][i]}")
+
+    # Display PHY Rates (Mbps)
+    print("\nPHY Rates (Mbps):")
+    header = ["From/To"] + [str(nid) for nid in nodes]
+    print("\t".join(header))
+    for i, id_from in enumerate(nodes):
+        row = [str(id_from)] + [str(rate) for rate in rates[i][:len(nodes)]]
+        print("\t".join(row))
+
+    # Display GCD Rates
+    print("\nGCD Rates (Mbps):")
+    print("NodeID\tGCD Rate")
+    for i, node_id in enumerate(nodes):
+        print(f"{node_id}\t{gcd_rates[i]}")
+
+    # Display VLPER Rates, if configured
+    vlper_rates = phy_rates_data.get("vlper_rates")
+    if vlper_rates:
+        print("\nVLPER PHY Rates (Mbps):")
+        print("\t".join(header))
+        for i, id_from in enumerate(nodes):
+            row = [str(id_from)] + [str(rate) for rate in vlper_rates[i][:len(nodes)]]
+            print("\t".join(row))
+
+# Print a single summary line per host
+def render_compact(host, device_status, phy_rates_data, timing=None):
+    parts = [host]
+    if timing:
+        parts.append(time.strftime('%H:%M:%S', time.localtime(timing["time"])))
+    if device_status:
+        if "link_status" in device_status:
+            parts.append(f"link={device_status['link_status']}")
+        if "lof" in device_status:
+            parts.append(f"lof={device_status['lof']}")
+        if "ethernet_tx" in device_status:
+            parts.append(f"tx={device_status['ethernet_tx']['tx_good']}")
+        if "ethernet_rx" in device_status:
+            parts.append(f"rx={device_status['ethernet_rx']['rx_good']}")
+    if phy_rates_data:
+        nodes = phy_rates_data["nodes"]
+        n = len(nodes)
+        link_rates = [phy_rates_data["rates"][i][j] for i in range(n) for j in range(n) if i != j]
+        parts.append(f"nodes={n}")
+        if link_rates:
+            parts.append(f"phy={min(link_rates)}/{max(link_rates)}")
+    if timing:
+        parts.append(f"latency={timing['latency'] * 1000:.0f}ms")
+    print(" ".join(parts))
+
+# Available renderers; 'none' means nothing is rendered
+RENDERERS = {
+    'table': render_table,
+    'compact': render_compact,
+    'watch': WatchView,
+    'none': None,
+}
+
+# Function to look up a renderer by name
+def get_renderer(name):
+    try:
+        renderer = RENDERERS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Invalid output format '{name}'. Choose from: {', '.join(RENDERERS)}.")
+    return renderer() if isinstance(renderer, type) else renderer
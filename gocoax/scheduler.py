@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+# Priority-aware planning of poll cycles with deadline-based load shedding.
+#
+# When the fleet is too large for the interval, a cycle that simply polls every due host
+# runs late, and the hosts at the end of the list are the ones that always lose out.
+# With a Scheduler, the Collector plans every cycle before it starts:
+#
+#   - every host has a priority from the inventory ('priority': critical, high, normal
+#     or low; normal by default), and every poll splits into the status (link status,
+#     LOF, counters) and the PHY sweep, the expensive part
+#   - each part's cost is estimated from the host's recent polls; a host without any
+#     counts as an average host, and DEFAULT_COSTS stand in until some host was polled.
+#     While the cycle's estimated work fits into the time until its deadline (the next
+#     cycle's start, with DEADLINE_MARGIN to spare), nothing changes except the order:
+#     higher priorities go first
+#   - when it doesn't fit, the PHY sweeps are deferred first, from the lowest priority
+#     up, and the status polls kept; if that is not enough, whole polls are shed, again
+#     from the lowest priority up. Critical hosts and requested refreshes are never shed.
+#   - among equal priorities, the part that was served longest ago goes first, so
+#     shedding rotates through the hosts instead of always hitting the same ones; hosts
+#     never served rotate by the time of day
+#
+# plan() returns the jobs to run and a report of what was shed and deferred. Without a
+# deadline (a single run that isn't part of a schedule) it only orders them. Cron runs
+# carry the cost estimates and the last-served times over in a state file (save() and
+# load()), like the anomaly and percentile state.
+
+import json
+import time
+
+from .fields import PHY_FIELDS
+
+# Host priorities; higher goes first
+PRIORITIES = {'low': 0, 'normal': 1, 'high': 2, 'critical': 3}
+DEFAULT_PRIORITY = 'normal'
+
+# Share of the time until the deadline the planned work may fill
+DEADLINE_MARGIN = 0.9
+
+# Weight of the newest poll in the cost estimates
+COST_SMOOTHING = 0.3
+
+# Estimated seconds of the status part and the PHY sweep before any host was polled;
+# about what a MoCA 2.5 adapter takes
+DEFAULT_COSTS = (0.1, 0.2)
+
+# Endpoints whose share of a poll's latency is counted as the PHY sweep's cost
+PHY_COST_ENDPOINTS = ('phyRates', 'fmrInfo')
+
+# Function to check an inventory priority; returns its name
+def parse_priority(value):
+    name = str(value or DEFAULT_PRIORITY).strip().lower()
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{value}'. Choose from: {', '.join(PRIORITIES)}.")
+    return name
+
+class Scheduler:
+    # 'concurrency' is how many hosts are polled at once (threads times shards); 'phy'
+    # whether the polls include the PHY sweep at all
+    def __init__(self, concurrency=1, phy=True, margin=DEADLINE_MARGIN):
+        self.concurrency = max(1, concurrency)
+        self.phy = phy
+        self.margin = margin
+        self.costs = {}    # host -> [status seconds, PHY seconds or None if never measured]
+        self.served = {}   # (host, part) -> monotonic time it was last planned
+        self.shed_total = 0
+        self.deferred_total = 0
+
+    # Function to plan a cycle: the (host, config) jobs due at 'now' and the cycle's
+    # 'deadline' (monotonic), or None to only order the jobs. Hosts in 'exempt' are never
+    # shed. Returns (jobs, report): the jobs to run in order, where a deferred PHY sweep
+    # is marked by 'defer_phy' in the job's config, and {"shed": [hosts], "deferred":
+    # [hosts], "estimate": seconds, "budget": seconds or None}.
+    def plan(self, jobs, now, deadline, exempt=()):
+        priorities = {host: PRIORITIES[parse_priority(config.get('priority'))] for host, config in jobs}
+        span = max(1.0, deadline - now) if deadline is not None else 1.0
+        rotation = int(time.time() // span)
+        order = {host: (index + rotation) % len(jobs) for index, host in enumerate(sorted(priorities))}
+
+        def key(host, part):
+            return (-priorities[host], self.served.get((host, part), float('-inf')), order[host])
+
+        budget = float('inf')
+        if deadline is not None:
+            budget = max(0.0, deadline - now) * self.margin * self.concurrency
+        shed, deferred = set(), set()
+        estimate = 0.0
+        if jobs:
+            # Parts never measured (every part of a new host, or the PHY sweep of one whose
+            # sweeps were always deferred) are assumed to cost what they cost an average host
+            average = []
+            for index in (0, 1):
+                values = [cost[index] for cost in self.costs.values() if cost[index] is not None]
+                average.append(sum(values) / len(values) if values else DEFAULT_COSTS[index])
+
+            def cost_of(host, index):
+                value = self.costs.get(host, (None, None))[index]
+                return average[index] if value is None else value
+
+            hosts = sorted(priorities, key=lambda host: key(host, 'status'))
+            phy_hosts = sorted(priorities, key=lambda host: key(host, 'phy')) if self.phy else []
+            protected = {host for host in hosts if host in exempt or priorities[host] == PRIORITIES['critical']}
+            # Protected work is always done, so its time is set aside first; the rest
+            # goes status before PHY, each by priority, and what doesn't fit is cut
+            for host in protected:
+                estimate += cost_of(host, 0) + (cost_of(host, 1) if self.phy else 0.0)
+            for part, candidates, index in (('status', hosts, 0), ('phy', phy_hosts, 1)):
+                for host in candidates:
+                    if host in shed or host in protected:
+                        continue
+                    cost = cost_of(host, index)
+                    if estimate + cost > budget:
+                        (shed if part == 'status' else deferred).add(host)
+                    else:
+                        estimate += cost
+
+        planned = []
+        for host, config in sorted(jobs, key=lambda job: key(job[0], 'status')):
+            if host in shed:
+                continue
+            self.served[(host, 'status')] = now
+            if host in deferred:
+                config = dict(config, defer_phy=True)
+            elif self.phy:
+                self.served[(host, 'phy')] = now
+            planned.append((host, config))
+
+        self.shed_total += len(shed)
+        self.deferred_total += len(deferred)
+        return planned, {
+            "shed": sorted(shed),
+            "deferred": sorted(deferred),
+            "estimate": round(estimate / self.concurrency, 3),
+            "budget": round(budget / self.concurrency, 3) if deadline is not None else None,
+        }
+
+    # Function to learn a host's costs from a poll's result; 'config' is the job's
+    def record(self, host, config, result):
+        duration = result.get("duration")
+        if duration is None:
+            return
+        # Without the poll's timing (a failed poll) its PHY share is unknown, and the PHY
+        # estimate stays as it was
+        timing = result.get("timing")
+        measured_phy = self.phy and not config.get('defer_phy') and timing and timing["latency"] > 0
+        status_cost, phy_cost = duration, None
+        if measured_phy:
+            phy_latency = sum(timing["endpoints"].get(name, {}).get("latency", 0.0) for name in PHY_COST_ENDPOINTS)
+            phy_cost = duration * min(1.0, phy_latency / timing["latency"])
+            status_cost = duration - phy_cost
+        cost = self.costs.get(host)
+        if cost is None:
+            self.costs[host] = [status_cost, phy_cost]
+            return
+        cost[0] += COST_SMOOTHING * (status_cost - cost[0])
+        if phy_cost is not None:
+            cost[1] = phy_cost if cost[1] is None else cost[1] + COST_SMOOTHING * (phy_cost - cost[1])
+
+    # Forget a host removed from the inventory
+    def forget(self, host):
+        self.costs.pop(host, None)
+        self.served.pop((host, 'status'), None)
+        self.served.pop((host, 'phy'), None)
+
+    # The last-served times are monotonic, which means nothing to the next process; the
+    # state file has them as wall-clock times
+    def save(self, path):
+        offset = time.time() - time.monotonic()
+        data = {
+            'costs': self.costs,
+            'served': [[host, part, served + offset] for (host, part), served in self.served.items()],
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+    # Load the state of an earlier run, keeping only the hosts in 'hosts' if given
+    def load(self, path, hosts=None):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        offset = time.time() - time.monotonic()
+        self.costs = {host: [float(cost[0]), None if cost[1] is None else float(cost[1])]
+                      for host, cost in data['costs'].items() if hosts is None or host in hosts}
+        self.served = {(host, part): float(served) - offset for host, part, served in data['served']
+                       if hosts is None or host in hosts}
+
+# Function to drop the PHY fields from a poll whose PHY sweep the scheduler deferred
+def scheduled_fields(config, fields):
+    if config.get('defer_phy'):
+        return tuple(name for name in fields if name not in PHY_FIELDS)
+    return fields
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+# Concurrent and multi-process polling of many MoCA hosts.
+#
+# ThreadPoller polls a batch of hosts with a thread pool, which is enough while the work
+# is dominated by waiting on the adapters. For fleets where JSON parsing, hex decoding
+# and rate math make a single process CPU-bound, ShardedPoller splits the hosts across
+# worker processes. Each worker owns the hosts of its shard (and their sessions), polls
+# them with its own thread pool and streams results back to the parent over a queue, so
+# the parent stays the only process that renders output or talks to the MQTT broker.
+#
+# Both pollers call poll_fn(host, config, state), where 'state' is a per-host dict that
+# survives between polls (the host's GoCoaxClient lives there) until the host is forgotten.
+
+import os
+import time
+import zlib
+import queue
+import signal
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# How long the parent waits on the result queue before checking worker liveness
+QUEUE_POLL_SECONDS = 1.0
+
+# Function to pick the shard for a host; stable across runs and independent of list order
+def shard_for_host(host, num_shards):
+    return zlib.crc32(host.encode('utf-8')) % num_shards
+
+# Function to split a host list into shards
+def shard_hosts(host_list, num_shards):
+    shards = [[] for _ in range(num_shards)]
+    for host in host_list:
+        shards[shard_for_host(host, num_shards)].append(host)
+    return shards
+
+# Function to close whatever a poll left behind in a host's state
+def close_host_state(state):
+    client = state.pop('client', None)
+    if client is not None:
+        client.close()
+
+# Polls hosts in this process with up to 'concurrency' hosts in flight
+class ThreadPoller:
+    def __init__(self, poll_fn, concurrency=1):
+        self.poll_fn = poll_fn
+        self.concurrency = max(1, concurrency)
+        self.states = {}
+        self.health = []
+        self._executor = None
+
+    def _poll_one(self, host, config):
+        state = self.states.setdefault(host, {})
+        start = time.monotonic()
+        try:
+            result = self.poll_fn(host, config, state)
+        except Exception as e:
+            result = {"device_status": None, "phy_rates": None, "error": f"An error occurred: {e}", "timing": None,
+                      "validity": None}
+        result["duration"] = round(time.monotonic() - start, 3)
+        return result
+
+    # Poll a batch of (host, config) jobs, yielding (host, result) as they complete
+    def poll(self, jobs):
+        if self.concurrency == 1 or len(jobs) <= 1:
+            for host, config in jobs:
+                yield host, self._poll_one(host, config)
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        futures = {self._executor.submit(self._poll_one, host, config): host for host, config in jobs}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    # Drop a host's session and other state
+    def forget(self, host):
+        state = self.states.pop(host, None)
+        if state:
+            close_host_state(state)
+
+    def close(self):
+        for host in list(self.states):
+            self.forget(host)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+# Worker process entry point: poll batches for one shard until told to stop
+def _shard_worker(shard_index, poll_fn, concurrency, job_queue, result_queue):
+    # Ctrl-C is handled by the parent, which stops the workers in an orderly way
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    poller = ThreadPoller(poll_fn, concurrency)
+    while True:
+        message = job_queue.get()
+        if message is None:
+            break
+        kind, payload = message
+        if kind == 'forget':
+            poller.forget(payload)
+            continue
+
+        start = time.monotonic()
+        ok = 0
+        failed = 0
+        for host, result in poller.poll(payload):
+            if result.get('error'):
+                failed += 1
+            else:
+                ok += 1
+            result_queue.put(('result', shard_index, host, result))
+
+        duration = time.monotonic() - start
+        result_queue.put(('health', shard_index, {
+            'shard': shard_index,
+            'pid': os.getpid(),
+            'hosts': len(payload),
+            'ok': ok,
+            'failed': failed,
+            'duration': round(duration, 3),
+            'hosts_per_second': round(len(payload) / duration, 2) if duration > 0 else 0.0,
+        }))
+    poller.close()
+
+# Polls hosts across 'num_shards' persistent worker processes.
+# poll_fn must be picklable (a module-level function or a functools.partial of one).
+class ShardedPoller:
+    def __init__(self, poll_fn, num_shards, concurrency=1):
+        self.poll_fn = poll_fn
+        self.num_shards = num_shards
+        self.concurrency = concurrency
+        self.health = []
+        # 'spawn' keeps workers from inheriting the parent's MQTT socket and network thread
+        self._ctx = multiprocessing.get_context('spawn')
+        self._result_queue = self._ctx.Queue()
+        self._workers = {}
+
+    # Start the worker for a shard, or restart it if it died
+    def _worker(self, shard_index):
+        worker = self._workers.get(shard_index)
+        if worker is not None and worker[0].is_alive():
+            return worker
+        job_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_shard_worker,
+            args=(shard_index, self.poll_fn, self.concurrency, job_queue, self._result_queue),
+            name=f"moca-shard-{shard_index}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[shard_index] = (process, job_queue)
+        return self._workers[shard_index]
+
+    # Poll a batch of (host, config) jobs, yielding (host, result) as they arrive
+    def poll(self, jobs):
+        self.health = []
+        batches = {}
+        for host, config in jobs:
+            batches.setdefault(shard_for_host(host, self.num_shards), []).append((host, config))
+        for shard_index, batch in batches.items():
+            self._worker(shard_index)[1].put(('poll', batch))
+
+        pending = set(batches)
+        outstanding = {shard_index: {host for host, _ in batch} for shard_index, batch in batches.items()}
+        while pending:
+            try:
+                kind, shard_index, *payload = self._result_queue.get(timeout=QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                # A worker that died mid-batch would otherwise block us forever
+                for shard_index in list(pending):
+                    process = self._workers[shard_index][0]
+                    if process.is_alive() or not self._result_queue.empty():
+                        continue
+                    pending.discard(shard_index)
+                    lost = outstanding[shard_index]
+                    for host in lost:
+                        yield host, {"device_status": None, "phy_rates": None,
+                                     "error": f"Shard worker exited with code {process.exitcode}", "timing": None,
+                                     "validity": None}
+                    self.health.append({
+                        'shard': shard_index,
+                        'pid': process.pid,
+                        'hosts': len(batches[shard_index]),
+                        'ok': len(batches[shard_index]) - len(lost),
+                        'failed': len(lost),
+                        'duration': 0.0,
+                        'hosts_per_second': 0.0,
+                        'exitcode': process.exitcode,
+                    })
+                continue
+
+            if kind == 'result':
+                host, result = payload
+                outstanding[shard_index].discard(host)
+                yield host, result
+            elif kind == 'health':
+                pending.discard(shard_index)
+                self.health.append(payload[0])
+
+    # Drop a host's session in the worker that owns it
+    def forget(self, host):
+        worker = self._workers.get(shard_for_host(host, self.num_shards))
+        if worker is not None and worker[0].is_alive():
+            worker[1].put(('forget', host))
+
+    def close(self):
+        for process, job_queue in self._workers.values():
+            if process.is_alive():
+                job_queue.put(None)
+        for process, _ in self._workers.values():
+            process.join()
+        self._workers = {}
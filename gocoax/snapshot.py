@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+# Local JSON API serving the collector's latest results.
+#
+# Tools that want the adapters' data can read it from a running collector instead of
+# polling the adapters themselves, so every adapter is still polled once per cycle no
+# matter how many readers there are. The collector keeps the latest result per host in
+# a SnapshotStore, serialized once when it arrives; SnapshotServer serves it over HTTP
+# on a TCP port or a Unix socket:
+#
+#   GET /snapshot                  all hosts, as {"<host>": {...}, ...}
+#   GET /snapshot?host=a&host=b    only the given hosts (also host=a,b)
+#   GET /snapshot/<host>           one host
+#   GET /hosts                     the host list with each host's age and last error
+#
+# A host's entry carries its device_status, phy_rates (with the PHY matrix and GCD
+# rates), timing, validity (which fields are fresh, partial, stale or missing), labels, 'time' (when the data was captured), 'age' (seconds since
+# then) and 'error' (the last poll's error, or null). After a failed poll the last good
+# data is kept, so readers can tell stale data by its age and error. Responses have a
+# weak ETag that changes with every new result; send it back in If-None-Match to get a
+# 304 until there is something new.
+
+import os
+import json
+import time
+import hashlib
+import threading
+import socketserver
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class SnapshotStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}   # host -> (version, captured, error, JSON of the entry without age)
+        self._version = 0
+
+    # Function to store a poll result from the collector
+    def update(self, host, result):
+        timing = result.get("timing")
+        captured = timing["time"] if timing else time.time()
+        with self._lock:
+            previous = self._entries.get(host)
+            if result["error"] and previous:
+                # Keep the last good data; only the error is new
+                entry = json.loads(previous[3])
+                entry["error"] = result["error"]
+                captured = previous[1]
+            else:
+                entry = {
+                    "host": host,
+                    "time": round(captured, 3),
+                    "error": result["error"],
+                    "device_status": result["device_status"],
+                    "phy_rates": result["phy_rates"],
+                    "timing": timing,
+                    "validity": result.get("validity"),
+                    "labels": result.get("labels", {}),
+                }
+            self._version += 1
+            self._entries[host] = (self._version, captured, result["error"], json.dumps(entry))
+
+    # Function to drop a host that left the inventory
+    def forget(self, host):
+        with self._lock:
+            self._entries.pop(host, None)
+
+    # Function to look up hosts (all if 'hosts' is None); returns (ETag, [(host, age, error, json), ...])
+    def select(self, hosts=None):
+        now = time.time()
+        with self._lock:
+            names = sorted(self._entries) if hosts is None else [host for host in hosts if host in self._entries]
+            entries = [(host,) + self._entries[host] for host in names]
+        tag = hashlib.sha1(','.join(f"{host}:{version}" for host, version, *_ in entries).encode()).hexdigest()[:16]
+        return f'W/"{tag}"', [(host, round(max(0.0, now - captured), 3), error, body)
+                             for host, version, captured, error, body in entries]
+
+class _SnapshotHandler(BaseHTTPRequestHandler):
+    server_version = 'gocoax-snapshot'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        store = self.server.store
+        if url.path == '/hosts':
+            etag, entries = store.select()
+            body = json.dumps([{"host": host, "age": age, "error": error} for host, age, error, _ in entries])
+        elif url.path.startswith('/snapshot/'):
+            etag, entries = store.select([unquote(url.path[len('/snapshot/'):])])
+            if not entries:
+                return self._send(404, None, '{"error": "unknown host"}')
+            host, age, _, entry = entries[0]
+            body = self._with_age(entry, age)
+        elif url.path in ('/snapshot', '/snapshot/'):
+            selected = parse_qs(url.query).get('host')
+            hosts = [host for value in selected for host in value.split(',') if host] if selected else None
+            etag, entries = store.select(hosts)
+            body = '{' + ', '.join(f"{json.dumps(host)}: {self._with_age(entry, age)}"
+                                   for host, age, _, entry in entries) + '}'
+        else:
+            return self._send(404, None, '{"error": "not found"}')
+
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            return self._send(304, etag, None)
+        self._send(200, etag, body)
+
+    # Function to add the age to a stored entry without decoding it
+    @staticmethod
+    def _with_age(entry, age):
+        return f'{{"age": {age}, {entry[1:]}'
+
+    def _send(self, status, etag, body):
+        data = body.encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # Readers poll often; don't log every request
+    def log_message(self, format, *args):
+        pass
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+class SnapshotServer:
+    # 'listen' is host:port or :port (127.0.0.1) for TCP, or unix:<path> or a path
+    # starting with / for a Unix socket
+    def __init__(self, store, listen):
+        self.store = store
+        self.socket_path = None
+        if listen.startswith('unix:') or listen.startswith('/'):
+            self.socket_path = listen[len('unix:'):] if listen.startswith('unix:') else listen
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)   # left over from a previous run
+            self.server = _UnixHTTPServer(self.socket_path, _SnapshotHandler)
+        else:
+            host, _, port = listen.rpartition(':')
+            self.server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), _SnapshotHandler)
+            self.server.daemon_threads = True
+        self.server.store = store
+        self._thread = threading.Thread(target=self.server.serve_forever, name='snapshot-api', daemon=True)
+
+    @property
+    def address(self):
+        return self.socket_path or '%s:%d' % self.server.server_address[:2]
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
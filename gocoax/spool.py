@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+
+# Disk-backed store-and-forward spool for MQTT.
+#
+# Without it, a broker that is down when a run starts costs that run's data, and so does
+# one that goes away while a resident collector runs: paho's publish() gives up on a
+# client that isn't connected, and QoS 0 messages still queued in the client are dropped
+# when it reconnects. With a spool, publishing goes through a SpoolingPublisher:
+#
+#   - while the broker is connected and keeps up, messages are published directly
+#   - while it is unreachable or slow (a message handed to the client wasn't sent
+#     within 'slow_after' seconds), messages are appended to the spool instead, and so
+#     is everything after them until the spool has been replayed, which keeps the
+#     order; messages the client lost with the connection go back into the spool too
+#   - a background thread replays the spool in order once the broker is back, at most
+#     'rate' messages per second so a long backlog doesn't flood it; the spool only
+#     moves past a message once the client has sent it (at least once, not exactly once)
+#
+# MqttSpool is an append-only log in a directory, split into segment files of up to
+# 'segment_bytes'. A segment is deleted once it has been replayed, and when the spool
+# would grow beyond 'max_bytes' its oldest segment is dropped. The replay position is
+# kept in a cursor file, so the spool carries over from one cron run to the next.
+# Appending is a short write to the current segment, so polling never waits for the
+# broker.
+
+import os
+import json
+import time
+import struct
+import threading
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+# Record header: payload length, topic length, flags (bit 0 retain, bits 1-2 QoS); the
+# UTF-8 topic and the payload follow
+_HEADER = struct.Struct('>IHB')
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+CURSOR_FILE = 'cursor.json'
+
+# Seconds a message may wait in the client before the broker counts as slow
+SLOW_AFTER = 5.0
+
+# Messages handed to the client and not sent yet, at most
+MAX_PENDING = 10000
+
+# Seconds between replay steps
+REPLAY_TICK = 0.1
+
+# Seconds close() keeps replaying
+DRAIN_TIMEOUT = 5.0
+
+# Function to convert a payload to the bytes paho would send
+def payload_bytes(payload):
+    if payload is None:
+        return b''
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return payload.encode('utf-8')
+    if isinstance(payload, (int, float)):
+        return str(payload).encode('ascii')
+    raise TypeError(f"Payload must be a string, bytes, int, float or None, not {type(payload).__name__}")
+
+def _record(topic, payload, qos=0, retain=False):
+    topic_bytes = topic.encode('utf-8')
+    return _HEADER.pack(len(payload), len(topic_bytes), (qos << 1) | bool(retain)) + topic_bytes + payload
+
+class MqttSpool:
+    # Positions in the spool are (segment number, offset) tuples; when the spool is empty,
+    # they point at the start of the segment that will be written next
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, segment_bytes=1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = max(1024, min(segment_bytes, max_bytes // 4))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sizes = {}       # segment number -> bytes, oldest first
+        numbers = []
+        for name in os.listdir(directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        for number in sorted(numbers):
+            self._sizes[number] = os.path.getsize(self._path(number))
+        self._writer = None    # (number, file) of the segment this process appends to
+        self._reader = None    # (number, file)
+        self._saved = 0.0
+        self.committed = self._load_cursor()   # replayed and sent up to here
+        self.position = self.committed         # read up to here
+        # Counters for the collector metrics
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+
+    def _path(self, number):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:08d}{SEGMENT_SUFFIX}")
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE), 'r') as f:
+                cursor = json.load(f)
+            number, offset = int(cursor['segment']), int(cursor['offset'])
+        except (OSError, ValueError, KeyError, TypeError):
+            number, offset = 1, 0
+        if number in self._sizes:
+            return number, min(offset, self._sizes[number])
+        if self._sizes:
+            # The cursor is older than the segments; replay them all
+            return next(iter(self._sizes)), 0
+        return number, 0
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'segment': self.committed[0], 'offset': self.committed[1]}, f)
+        os.replace(path + '.tmp', path)
+        self._saved = time.monotonic()
+
+    # Function to tell whether there is anything after 'position'
+    def _after(self, position):
+        if not self._sizes:
+            return False
+        last = next(reversed(self._sizes))
+        return last > position[0] or (last == position[0] and self._sizes[last] > position[1])
+
+    # True while the spool holds messages that were not replayed yet
+    def pending(self):
+        with self._lock:
+            return self._after(self.committed)
+
+    # Bytes on disk
+    def size(self):
+        with self._lock:
+            return sum(self._sizes.values())
+
+    # Function to append a message; False if it didn't fit and was dropped
+    def append(self, topic, payload, qos=0, retain=False):
+        with self._lock:
+            return self._write(_record(topic, payload, qos, retain))
+
+    def _write(self, record):
+        written = self._sizes[self._writer[0]] if self._writer else None
+        if written is None or (written and written + len(record) > self.segment_bytes):
+            self._rotate()
+        # Make room by dropping the oldest segments, but never the one being written
+        while sum(self._sizes.values()) + len(record) > self.max_bytes and len(self._sizes) > 1:
+            self._drop_oldest()
+        if sum(self._sizes.values()) + len(record) > self.max_bytes:
+            self.dropped += 1
+            return False
+        number, f = self._writer
+        f.write(record)
+        f.flush()
+        self._sizes[number] += len(record)
+        self.spooled += 1
+        return True
+
+    # Function to put messages back in front of everything not replayed yet, as a segment
+    # of their own ahead of the replay position; for messages the client lost, which are
+    # older than anything in the spool
+    def prepend(self, messages):
+        if not messages:
+            return
+        with self._lock:
+            if not self._after(self.committed):
+                for message in messages:
+                    self._write(_record(*message))
+                return
+            data = b''.join(_record(*message) for message in messages)
+            if sum(self._sizes.values()) + len(data) > self.max_bytes:
+                self.dropped += len(messages)
+                return
+            # Everything before the replay position has been deleted, so this number is free
+            number = self.committed[0] - 1
+            with open(self._path(number), 'wb') as f:
+                f.write(data)
+            self._sizes = dict([(number, len(data))] + list(self._sizes.items()))
+            self.committed = self.position = (number, 0)
+            self.spooled += len(messages)
+
+    def _rotate(self):
+        if self._writer:
+            self._writer[1].close()
+        number = next(reversed(self._sizes)) + 1 if self._sizes else self.committed[0]
+        self._writer = (number, open(self._path(number), 'ab'))
+        self._sizes[number] = 0
+
+    def _drop_oldest(self):
+        number = next(iter(self._sizes))
+        self.dropped += self._count(number, self.committed[1] if self.committed[0] == number else 0)
+        self._delete(number)
+        following = (next(iter(self._sizes)), 0)
+        self.committed = max(self.committed, following)
+        self.position = max(self.position, following)
+        print(f"MQTT spool {self.directory} is full; dropped its oldest segment.")
+
+    # Function to count the records of a segment from 'offset' on
+    def _count(self, number, offset):
+        count = 0
+        with open(self._path(number), 'rb') as f:
+            f.seek(offset)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return count
+                payload_length, topic_length, _ = _HEADER.unpack(header)
+                f.seek(topic_length + payload_length, os.SEEK_CUR)
+                count += 1
+
+    def _delete(self, number):
+        for handle in (self._writer, self._reader):
+            if handle and handle[0] == number:
+                handle[1].close()
+        if self._writer and self._writer[0] == number:
+            self._writer = None
+        if self._reader and self._reader[0] == number:
+            self._reader = None
+        try:
+            os.remove(self._path(number))
+        except FileNotFoundError:
+            pass
+        del self._sizes[number]
+
+    # Function to read up to 'count' messages after the read position, as (topic, payload,
+    # qos, retain, position after the message) tuples
+    def read(self, count):
+        records = []
+        with self._lock:
+            while len(records) < count and self._after(self.position):
+                number, offset = self.position
+                if number not in self._sizes or offset >= self._sizes[number]:
+                    self.position = (next(n for n in self._sizes if n > number), 0)
+                    continue
+                if self._reader is None or self._reader[0] != number:
+                    if self._reader:
+                        self._reader[1].close()
+                    self._reader = (number, open(self._path(number), 'rb'))
+                f = self._reader[1]
+                if f.tell() != offset:
+                    f.seek(offset)
+                header = f.read(_HEADER.size)
+                body = b''
+                if len(header) == _HEADER.size:
+                    payload_length, topic_length, flags = _HEADER.unpack(header)
+                    body = f.read(topic_length + payload_length)
+                if len(header) < _HEADER.size or len(body) < topic_length + payload_length:
+                    # Cut off by a crash; skip the rest of the segment
+                    self.position = (number, self._sizes[number])
+                    continue
+                self.position = (number, offset + _HEADER.size + len(body))
+                records.append((body[:topic_length].decode('utf-8'), body[topic_length:], flags >> 1,
+                                bool(flags & 1), self.position))
+        return records
+
+    # Go back to reading from 'position' (default: the last message that was sent)
+    def seek(self, position=None):
+        with self._lock:
+            self.position = max(position or self.committed, self.committed)
+
+    # Function to mark everything up to 'position' as sent; replayed segments are deleted
+    def commit(self, position, count=0):
+        with self._lock:
+            self.replayed += count
+            if position <= self.committed:
+                return
+            self.committed = position
+            while self._sizes:
+                number = next(iter(self._sizes))
+                if (number, self._sizes[number]) > self.committed:
+                    break
+                self._delete(number)
+                if self.committed[0] <= number:
+                    self.committed = (next(iter(self._sizes), number + 1), 0)
+            self.position = max(self.position, self.committed)
+            if time.monotonic() - self._saved >= 1.0:
+                self._save_cursor()
+
+    def close(self):
+        with self._lock:
+            for handle in (self._writer, self._reader):
+                if handle:
+                    handle[1].close()
+            self._writer = self._reader = None
+            self._save_cursor()
+
+class SpoolingPublisher:
+    # 'client' is a connected, or connecting, paho client with its network loop running
+    def __init__(self, client, spool, rate=500.0, slow_after=SLOW_AFTER, max_pending=MAX_PENDING):
+        self.client = client
+        self.spool = spool
+        self.rate = rate
+        self.slow_after = slow_after
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._sent = deque()        # (info, time, message) published directly and not sent yet
+        self._replaying = deque()   # (info, time, position after it) replayed and not sent yet
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Function to publish like paho's publish(); returns the MQTTMessageInfo, or None
+    # when the message went to the spool
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        payload = payload_bytes(payload)
+        with self._lock:
+            self._settle()
+            if self.client.is_connected() and not self._slow() and not self.spool.pending():
+                info = self.client.publish(topic, payload, qos, retain)
+                if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self._sent.append((info, time.monotonic(), (topic, payload, qos, retain)))
+                    return info
+            self.spool.append(topic, payload, qos, retain)
+            return None
+
+    # True while the client is behind: a message is waiting longer than slow_after, or
+    # too many are waiting
+    def _slow(self):
+        waiting = len(self._sent) + len(self._replaying)
+        if waiting >= self.max_pending:
+            return True
+        oldest = min((queue[0][1] for queue in (self._sent, self._replaying) if queue), default=None)
+        return oldest is not None and time.monotonic() - oldest > self.slow_after
+
+    # Function to forget the messages the client has sent, and to take back the ones it lost
+    def _settle(self):
+        connected = self.client.is_connected()
+        position, count, rewind = None, 0, not connected and bool(self._replaying)
+        while self._replaying and self._replaying[0][0].is_published():
+            info, _, after = self._replaying.popleft()
+            if info.rc == mqtt.MQTT_ERR_CONN_LOST:
+                rewind = True
+                break
+            position, count = after, count + 1
+        if position:
+            self.spool.commit(position, count)
+
+        lost = []
+        while self._sent and (self._sent[0][0].is_published() or not connected):
+            info, _, message = self._sent.popleft()
+            if not info.is_published() or info.rc == mqtt.MQTT_ERR_CONN_LOST:
+                lost.append(message)
+        if lost:
+            # They go in front of the spool, and the replay starts over from there
+            self.spool.prepend(lost)
+            rewind = rewind or bool(self._replaying)
+        if rewind:
+            # Replay again from the last message that was sent
+            self._replaying.clear()
+            self.spool.seek()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._replay, name='mqtt-spool', daemon=True)
+        self._thread.start()
+
+    def _replay(self):
+        allowance, last = 0.0, time.monotonic()
+        while not self._stop.wait(REPLAY_TICK):
+            now = time.monotonic()
+            # Up to a second's worth of messages at once; a rate of 0 is unlimited
+            allowance = min(self.rate, allowance + (now - last) * self.rate) if self.rate > 0 else self.max_pending
+            last = now
+            with self._lock:
+                self._settle()
+                if allowance < 1 or not self.client.is_connected() or self._slow():
+                    continue
+                start = self.spool.position
+                for topic, payload, qos, retain, after in self.spool.read(int(allowance)):
+                    info = self.client.publish(topic, payload, qos, retain)
+                    if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                        self.spool.seek(start)
+                        break
+                    self._replaying.append((info, time.monotonic(), after))
+                    allowance -= 1
+                    start = after
+
+    # Function to stop replaying. While the broker is connected, it keeps replaying and
+    # waits for the client to send what it was handed for up to 'timeout' seconds, so
+    # short cron runs get through a backlog too; whatever is left stays spooled.
+    def close(self, timeout=DRAIN_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                self._settle()
+                if not self.client.is_connected() or not (self._sent or self._replaying or self.spool.pending()):
+                    break
+            time.sleep(REPLAY_TICK)
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        with self._lock:
+            self._settle()
+            self.spool.prepend([message for _, _, message in self._sent])
+            self._sent.clear()
+            self._replaying.clear()
+            self.spool.seek()
+            self.spool.close()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Network-wide PHY rate summary.
+#
+# Dashboards mostly want the worst link and the min/mean/max PHY rate rather than the
+# full N x N matrix, so the collector boils each get_phy_rates() sample down to one
+# small dictionary that is published as a single message per network.
+
+# Function to summarize the PHY rates and GCD rates of one MoCA network
+def summarize_phy_rates(phy_rates_data):
+    nodes = phy_rates_data["nodes"]
+    rates = phy_rates_data["rates"]
+    gcd_rates = phy_rates_data["gcd_rates"]
+    n = len(nodes)
+
+    worst_link = None
+    total = 0
+    count = 0
+    min_rate = None
+    max_rate = None
+    per_node = {}
+    for i, node_id in enumerate(nodes):
+        per_node[str(node_id)] = {"gcd": gcd_rates[i]}
+
+    for i, from_node in enumerate(nodes):
+        for j, to_node in enumerate(nodes):
+            # The diagonal is not a link
+            if i == j:
+                continue
+            rate = rates[i][j]
+            total += rate
+            count += 1
+            if min_rate is None or rate < min_rate:
+                min_rate = rate
+                worst_link = {"from": from_node, "to": to_node, "rate": rate}
+            if max_rate is None or rate > max_rate:
+                max_rate = rate
+
+            egress = per_node[str(from_node)]
+            egress["egress_min"] = min(egress.get("egress_min", rate), rate)
+            egress["egress_max"] = max(egress.get("egress_max", rate), rate)
+            ingress = per_node[str(to_node)]
+            ingress["ingress_min"] = min(ingress.get("ingress_min", rate), rate)
+            ingress["ingress_max"] = max(ingress.get("ingress_max", rate), rate)
+
+    return {
+        "network": phy_rates_data.get("nc_mac"),
+        "nodes": n,
+        "links": count,
+        "min": min_rate,
+        "mean": round(total / count, 1) if count else None,
+        "max": max_rate,
+        "worst_link": worst_link,
+        "gcd_min": min(gcd_rates[:n]) if n else None,
+        "gcd_max": max(gcd_rates[:n]) if n else None,
+        "per_node": per_node,
+    }
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+# Live terminal view for --watch.
+#
+# The collector keeps polling with the hosts' sessions open, and every result is drawn
+# into a fixed screen layout: per host the link state, the Ethernet counter deltas
+# since the previous poll, the node table and the PHY matrix. The screen is kept as a
+# grid of cells; a redraw only rewrites the cells whose text changed (cursor moves plus
+# the new text), and the whole screen is only cleared when the layout itself changes,
+# e.g. when a node joins. Links whose rate fell below degrade_fraction of the best rate
+# seen since the view started are shown in red, as is a link that is down. Each host
+# shows when its data was captured and how long the adapter took to answer.
+
+import sys
+import time
+
+# ANSI escape sequences
+_CLEAR = '\x1b[2J\x1b[H'
+_HIDE_CURSOR = '\x1b[?25l'
+_SHOW_CURSOR = '\x1b[?25h'
+_RED = '31'
+_BOLD = '1'
+_DIM = '2'
+
+# Column widths
+_LABEL_WIDTH = 10
+_NUMBER_WIDTH = 14
+_RATE_WIDTH = 7
+_MAC_WIDTH = 14
+
+class WatchView:
+    def __init__(self, out=None, degrade_fraction=0.8):
+        self.out = out or sys.stdout
+        self.degrade_fraction = degrade_fraction
+        self.samples = {}     # host -> (device_status, phy_rates_data, updated, latency)
+        self.deltas = {}      # host -> {"tx_good": delta, ...} since the previous poll
+        self.counters = {}    # host -> last Ethernet counters
+        self.best = {}        # (host, from_node, to_node) -> best rate seen
+        self.errors = {}      # host -> last error, until the host answers again
+        self.status = ''
+        self.screen = None    # rows of (column, text, style) cells currently on screen
+
+    # Renderer interface: called with every decoded result
+    def __call__(self, host, device_status, phy_rates_data, timing=None):
+        self.errors.pop(host, None)
+        self._update_deltas(host, device_status or {})
+        if phy_rates_data:
+            nodes = phy_rates_data["nodes"]
+            for i, from_node in enumerate(nodes):
+                for j, to_node in enumerate(nodes):
+                    key = (host, from_node, to_node)
+                    self.best[key] = max(self.best.get(key, 0), phy_rates_data["rates"][i][j])
+        if timing:
+            updated = time.strftime('%H:%M:%S', time.localtime(timing["time"]))
+            latency = f"{timing['latency'] * 1000:.0f} ms"
+        else:
+            updated, latency = time.strftime('%H:%M:%S'), ''
+        self.samples[host] = (device_status or {}, phy_rates_data, updated, latency)
+        self.redraw()
+
+    # Show a poll error in the host's block instead of printing over the screen
+    def error(self, host, message):
+        self.errors[host] = message.splitlines()[0]
+        self.samples.setdefault(host, ({}, None, time.strftime('%H:%M:%S'), ''))
+        self.redraw()
+
+    # Show a one-line message (cycle overruns, alerts) at the bottom of the screen
+    def message(self, text):
+        self.status = text.splitlines()[0] if text else ''
+        self.redraw()
+
+    # Leave the cursor below the view
+    def close(self):
+        if self.screen is not None:
+            self.out.write(f"\x1b[{len(self.screen) + 1};1H{_SHOW_CURSOR}\n")
+            self.out.flush()
+
+    def _update_deltas(self, host, device_status):
+        current = {}
+        current.update(device_status.get("ethernet_tx", {}))
+        current.update(device_status.get("ethernet_rx", {}))
+        previous = self.counters.get(host)
+        if current:
+            self.deltas[host] = {key: value - previous[key] for key, value in current.items()
+                                 if previous and key in previous}
+            self.counters[host] = current
+
+    # Function to lay out the whole screen as rows of cells
+    def _layout(self):
+        rows = []
+
+        def row(*cells):
+            # cells are (text, width, style); they are placed left to right
+            placed = []
+            column = 0
+            for text, width, style in cells:
+                placed.append((column, str(text)[:width].ljust(width), style))
+                column += width
+            rows.append(placed)
+
+        for host in sorted(self.samples):
+            device_status, phy_rates_data, updated, latency = self.samples[host]
+            link = device_status.get("link_status", '-')
+            row((f"Host: {host}", 32, _BOLD),
+                (f"Link: {link}", 12, _RED if link == "Down" else None),
+                (f"LOF: {device_status.get('lof', '-')}", 12, None),
+                (f"MoCA {device_status.get('network_moca_version', '-')}", 10, None),
+                (f"at {updated}", 12, _DIM),
+                (latency, 10, _DIM))
+            row((f"Error: {self.errors[host]}" if host in self.errors else '', 100, _RED))
+
+            deltas = self.deltas.get(host, {})
+            row(('Ethernet', _LABEL_WIDTH, _DIM), ('good/poll', _NUMBER_WIDTH, _DIM),
+                ('bad/poll', _NUMBER_WIDTH, _DIM), ('dropped/poll', _NUMBER_WIDTH, _DIM))
+            for direction in ('tx', 'rx'):
+                cells = [(direction.upper(), _LABEL_WIDTH, None)]
+                for kind in ('good', 'bad', 'dropped'):
+                    delta = deltas.get(f"{direction}_{kind}")
+                    text = '-' if delta is None else f"{delta:+d}"
+                    cells.append((text, _NUMBER_WIDTH, _RED if kind != 'good' and delta else None))
+                row(*cells)
+
+            if phy_rates_data:
+                nodes = phy_rates_data["nodes"]
+                rates = phy_rates_data["rates"]
+                row(('Node', _LABEL_WIDTH, _DIM), ('MAC', _MAC_WIDTH, _DIM),
+                    ('MoCA', _LABEL_WIDTH, _DIM), ('GCD', _RATE_WIDTH, _DIM))
+                for i, node_id in enumerate(nodes):
+                    nc = '*' if node_id == phy_rates_data["nc_node"] else ''
+                    row((f"{node_id}{nc}", _LABEL_WIDTH, None), (phy_rates_data["node_macs"][i], _MAC_WIDTH, None),
+                        (phy_rates_data["node_moca_versions"][i], _LABEL_WIDTH, None),
+                        (phy_rates_data["gcd_rates"][i], _RATE_WIDTH, None))
+                row(('From/To', _LABEL_WIDTH, _DIM), *[(node_id, _RATE_WIDTH, _DIM) for node_id in nodes])
+                for i, from_node in enumerate(nodes):
+                    cells = [(from_node, _LABEL_WIDTH, None)]
+                    for j, to_node in enumerate(nodes):
+                        rate = rates[i][j]
+                        best = self.best.get((host, from_node, to_node), 0)
+                        degraded = i != j and best > 0 and rate < best * self.degrade_fraction
+                        cells.append((rate, _RATE_WIDTH, _RED if degraded else None))
+                    row(*cells)
+            row(('', 1, None))
+
+        row((self.status, 100, _DIM))
+        return rows
+
+    # Function to bring the terminal up to date with the current layout
+    def redraw(self):
+        rows = self._layout()
+        same_layout = (self.screen is not None and len(rows) == len(self.screen) and
+                       all([cell[0] for cell in new] == [cell[0] for cell in old] for new, old in zip(rows, self.screen)))
+        parts = []
+        if not same_layout:
+            parts.append(_CLEAR + _HIDE_CURSOR)
+        for y, cells in enumerate(rows):
+            for x, cell in enumerate(cells):
+                if same_layout and self.screen[y][x] == cell:
+                    continue
+                column, text, style = cell
+                parts.append(f"\x1b[{y + 1};{column + 1}H")
+                parts.append(f"\x1b[{style}m{text}\x1b[0m" if style else text)
+        self.screen = rows
+        if parts:
+            self.out.write(''.join(parts))
+            self.out.flush()